@@ -36,6 +36,21 @@ class Settings(BaseSettings):
     rate_limit_messages: int = Field(default=5, env="RATE_LIMIT_MESSAGES")
     rate_limit_callbacks: int = Field(default=10, env="RATE_LIMIT_CALLBACKS")
     rate_limit_window: int = Field(default=60, env="RATE_LIMIT_WINDOW")
+    # Хранилище счетчиков: memory - в процессе, mongo - общее для нескольких процессов бота
+    rate_limit_backend: str = Field(default="memory", env="RATE_LIMIT_BACKEND")
+    
+    # Обработка апдейтов: апдейты одного пользователя - по очереди, разных - параллельно,
+    # не больше update_concurrency хэндлеров одновременно. update_max_pending - сколько
+    # принятых вебхуком, но не обработанных апдейтов допускается до ответа 503
+    update_concurrency: int = Field(default=64, env="UPDATE_CONCURRENCY")
+    update_max_pending: int = Field(default=10000, env="UPDATE_MAX_PENDING")
+    
+    # Webhook (если webhook_url не задан - бот работает через polling)
+    webhook_url: Optional[str] = Field(default=None, env="WEBHOOK_URL")
+    webhook_path: str = Field(default="/webhook", env="WEBHOOK_PATH")
+    webhook_secret: Optional[str] = Field(default=None, env="WEBHOOK_SECRET")
+    webhook_host: str = Field(default="0.0.0.0", env="WEBHOOK_HOST")
+    webhook_port: int = Field(default=8000, env="WEBHOOK_PORT")
     
     # Game Configuration
     daily_card_cooldown_hours: int = 2  # Кулдаун 2 часа
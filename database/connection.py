@@ -43,6 +43,10 @@ class MongoDB:
             await cls.database.users.create_index("experience")
             await cls.database.users.create_index("level")
             await cls.database.users.create_index("last_activity")
+            await cls.database.users.create_index("created_at")
+            # Индексы рейтингов: порядок (поле убыванию, telegram_id) совпадает с сортировкой снапшотов
+            for field in ("experience", "coins", "total_cards", "battle_progress.total_battles"):
+                await cls.database.users.create_index([(field, -1), ("telegram_id", 1)])
             
             # Индексы для карточек
             await cls.database.cards.create_index("name", unique=True)
@@ -50,6 +54,28 @@ class MongoDB:
             await cls.database.cards.create_index("is_active")
             await cls.database.cards.create_index("total_owned")
             
+            # Уникальный индекс для upsert стандартных достижений по имени: одновременно
+            # стартующие процессы не создадут одно достижение дважды
+            try:
+                await cls.database.achievements.create_index("name", unique=True)
+            except Exception as e:
+                logger.warning(f"Failed to create unique achievements.name index (duplicate names?): {e}")
+            
+            # Индексы для прогресса ивентов
+            await cls.database.user_event_progress.create_index([("user_id", 1), ("event_id", 1)])
+            await cls.database.user_event_progress.create_index(
+                [("event_id", 1), ("current_progress", -1), ("last_updated", 1)]
+            )
+            await cls.database.user_event_progress_archive.create_index([("user_id", 1), ("event_id", 1)])
+            await cls.database.events.create_index("is_archived")
+            
+            # Поиск фоновых заданий с истекшей арендой
+            await cls.database.broadcast_jobs.create_index([("status", 1), ("lease_until", 1)])
+            await cls.database.achievement_backfill_jobs.create_index([("status", 1), ("lease_until", 1)])
+            
+            # Окна общего rate limiter'а удаляются после expires_at
+            await cls.database.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+            
             logger.info("Database indexes created successfully")
             
         except Exception as e:
@@ -195,10 +195,13 @@ async def notify_new_achievements(user, new_achievements: list, bot):
 
 
 # Функция для проверки достижений после игровых действий
-async def check_and_notify_achievements(user, bot=None):
-    """Проверяет и уведомляет о новых достижениях"""
+async def check_and_notify_achievements(user, bot=None, events=None):
+    """
+    Проверяет и уведомляет о новых достижениях.
+    events - типы изменений (EVENT_* из services.achievement_rules); без них проверяются все достижения
+    """
     try:
-        new_achievements = await achievement_service.check_user_achievements(user)
+        new_achievements = await achievement_service.check_user_achievements(user, events)
         if new_achievements and bot:
             await notify_new_achievements(user, new_achievements, bot)
         return new_achievements
@@ -13,6 +13,8 @@ from models.user import User
 from models.card import Card
 from services.user_service import user_service
 from services.card_service import card_service
+from services.giveaway_service import giveaway_service
+from services.background_jobs import background_jobs
 from services.migration_service import migration_service
 from config import settings
 
@@ -60,6 +62,17 @@ def is_admin(user_id: int) -> bool:
     return user_id == settings.admin_user_id
 
 
+def _giveaway_progress(message: Message, title: str):
+    """Колбэк прогресса массовой раздачи - редактирует сообщение администратора"""
+    async def progress(processed: int, total: int) -> None:
+        try:
+            await message.edit_text(f"{title}\n\n⏳ Обработано {processed} из {total} игроков...")
+        except Exception as e:
+            logger.debug(f"Failed to update giveaway progress: {e}")
+    
+    return progress
+
+
 @router.message(Command("admin"))
 async def admin_panel(message: Message):
     """Главная панель администратора"""
@@ -581,29 +594,33 @@ async def admin_announce_send(message: Message, state: FSMContext):
     await state.clear()
     
     try:
-        # Получаем всех пользователей
-        users = await user_service.get_all_users()
-        sent_count = 0
-        failed_count = 0
-        
-        await message.answer(f"📢 Начинаю рассылку объявления {len(users)} пользователям...")
-        
-        for user in users:
-            try:
-                # Экранируем специальные символы для Markdown
-                safe_announcement = announcement_text.replace('*', '\\*').replace('_', '\\_').replace('[', '\\[').replace(']', '\\]').replace('(', '\\(').replace(')', '\\)').replace('~', '\\~').replace('`', '\\`').replace('>', '\\>').replace('#', '\\#').replace('+', '\\+').replace('-', '\\-').replace('=', '\\=').replace('|', '\\|').replace('{', '\\{').replace('}', '\\}').replace('.', '\\.').replace('!', '\\!')
-                full_text = f"📢 **Объявление от администрации:**\n\n{safe_announcement}"
-                await message.bot.send_message(user.telegram_id, full_text, parse_mode="Markdown")
-                sent_count += 1
-            except Exception as e:
-                failed_count += 1
-                logger.error(f"Failed to send announcement to {user.telegram_id}: {e}")
+        total_users = await (await user_service.get_collection()).count_documents({})
+        await message.answer(f"📢 Начинаю рассылку объявления {total_users} пользователям...")
+        
+        # Экранируем специальные символы для Markdown
+        safe_announcement = announcement_text.replace('*', '\\*').replace('_', '\\_').replace('[', '\\[').replace(']', '\\]').replace('(', '\\(').replace(')', '\\)').replace('~', '\\~').replace('`', '\\`').replace('>', '\\>').replace('#', '\\#').replace('+', '\\+').replace('-', '\\-').replace('=', '\\=').replace('|', '\\|').replace('{', '\\{').replace('}', '\\}').replace('.', '\\.').replace('!', '\\!')
+        full_text = f"📢 **Объявление от администрации:**\n\n{safe_announcement}"
+        
+        # Рассылка идет в фоне, итог придет отдельным сообщением
+        background_jobs.start("announcement", _send_announcement(message, full_text, total_users))
+        
+    except Exception as e:
+        logger.error(f"Error sending announcement: {e}")
+        await message.answer("❌ Ошибка при отправке объявления")
+
+
+async def _send_announcement(message: Message, full_text: str, total_users: int):
+    """Рассылка объявления и отчет администратору"""
+    try:
+        from services.broadcast_service import broadcast_service
+        
+        job = await broadcast_service.broadcast("announcement", full_text, parse_mode="Markdown", audience="all")
         
         result_text = (
             f"✅ **Рассылка завершена!**\n\n"
-            f"📤 Отправлено: {sent_count}\n"
-            f"❌ Не доставлено: {failed_count}\n"
-            f"👥 Всего пользователей: {len(users)}"
+            f"📤 Отправлено: {job['sent']}\n"
+            f"❌ Не доставлено: {job['failed'] + job['blocked']}\n"
+            f"👥 Всего пользователей: {total_users}"
         )
         
         await message.answer(result_text)
@@ -787,24 +804,17 @@ async def process_gift_coins(message: Message, state: FSMContext):
         
         await state.clear()
         
-        users = await user_service.get_all_users()
-        success_count = 0
+        total_users = await user_service.count_users()
         
-        await message.answer(f"🪙 Начинаю раздачу {coins_amount} монет {len(users)} игрокам...")
+        await message.answer(f"🪙 Начинаю раздачу {coins_amount} монет {total_users} игрокам...")
         
-        for user in users:
-            try:
-                user.coins += coins_amount
-                await user_service.update_user(user)
-                success_count += 1
-            except Exception as e:
-                logger.error(f"Error giving coins to user {user.telegram_id}: {e}")
+        success_count = await giveaway_service.grant_currency(coins=coins_amount)
         
         result_text = (
             f"✅ **Раздача монет завершена!**\n\n"
             f"🪙 Роздано: {coins_amount} монет\n"
             f"👥 Получили: {success_count} игроков\n"
-            f"📊 Всего игроков: {len(users)}"
+            f"📊 Всего игроков: {total_users}"
         )
         
         await message.answer(result_text)
@@ -830,26 +840,17 @@ async def process_gift_exp(message: Message, state: FSMContext):
         
         await state.clear()
         
-        users = await user_service.get_all_users()
-        success_count = 0
+        total_users = await user_service.count_users()
         
-        await message.answer(f"✨ Начинаю раздачу {exp_amount} опыта {len(users)} игрокам...")
+        await message.answer(f"✨ Начинаю раздачу {exp_amount} опыта {total_users} игрокам...")
         
-        for user in users:
-            try:
-                old_level = user.level
-                user.experience += exp_amount
-                user.level = user.calculate_level()
-                await user_service.update_user(user)
-                success_count += 1
-            except Exception as e:
-                logger.error(f"Error giving exp to user {user.telegram_id}: {e}")
+        success_count = await giveaway_service.grant_currency(experience=exp_amount)
         
         result_text = (
             f"✅ **Раздача опыта завершена!**\n\n"
             f"✨ Роздано: {exp_amount} опыта\n"
             f"👥 Получили: {success_count} игроков\n"
-            f"📊 Всего игроков: {len(users)}"
+            f"📊 Всего игроков: {total_users}"
         )
         
         await message.answer(result_text)
@@ -882,32 +883,45 @@ async def process_gift_card(message: Message, state: FSMContext):
         
         await state.clear()
         
-        users = await user_service.get_all_users()
-        success_count = 0
+        total_users = await user_service.count_users()
+        await message.answer(f"🎴 Начинаю раздачу карточки '{card_name}' {total_users} игрокам...")
         
-        await message.answer(f"🎴 Начинаю раздачу карточки '{card_name}' {len(users)} игрокам...")
+        # Раздача идет в фоне, итог придет отдельным сообщением
+        background_jobs.start("gift_card", _give_card_to_all(message, card, total_users))
         
-        for user in users:
-            try:
-                await user_service.add_card_to_user(user, str(card.id))
-                success_count += 1
-                
-                # Отправляем уведомление пользователю
+    except Exception as e:
+        logger.error(f"Error processing gift card: {e}")
+        await message.answer("❌ Ошибка при раздаче карточки")
+
+
+async def _give_card_to_all(message: Message, card: Card, total_users: int):
+    """Выдача карточки всем игрокам с уведомлениями и отчет администратору"""
+    try:
+        card_name = card.name
+        success_count = 0
+        
+        async for users in user_service.iter_users():
+            for user in users:
                 try:
-                    username = user.username if user.username else "Anonymous"
-                    notification_text = (
-                        f"🎁 **Подарок от администрации!**\n\n"
-                        f"🎴 Вы получили карточку:\n"
-                        f"{card.get_rarity_emoji()} **{card.name}**\n"
-                        f"📝 {card.description}\n\n"
-                        f"💝 Спасибо за участие в игре!"
-                    )
-                    await message.bot.send_message(user.telegram_id, notification_text, parse_mode="Markdown")
-                except Exception as notify_error:
-                    logger.error(f"Failed to notify user {user.telegram_id} about gift: {notify_error}")
+                    await user_service.add_card_to_user(user, str(card.id))
+                    success_count += 1
                     
-            except Exception as e:
-                logger.error(f"Error giving card to user {user.telegram_id}: {e}")
+                    # Отправляем уведомление пользователю
+                    try:
+                        username = user.username if user.username else "Anonymous"
+                        notification_text = (
+                            f"🎁 **Подарок от администрации!**\n\n"
+                            f"🎴 Вы получили карточку:\n"
+                            f"{card.get_rarity_emoji()} **{card.name}**\n"
+                            f"📝 {card.description}\n\n"
+                            f"💝 Спасибо за участие в игре!"
+                        )
+                        await message.bot.send_message(user.telegram_id, notification_text, parse_mode="Markdown")
+                    except Exception as notify_error:
+                        logger.error(f"Failed to notify user {user.telegram_id} about gift: {notify_error}")
+                        
+                except Exception as e:
+                    logger.error(f"Error giving card to user {user.telegram_id}: {e}")
         
         # Обновляем статистику карточки
         await card_service.update_card_stats(card_name, success_count, success_count)
@@ -916,7 +930,7 @@ async def process_gift_card(message: Message, state: FSMContext):
             f"✅ **Раздача карточки завершена!**\n\n"
             f"🎴 Роздано: '{card_name}'\n"
             f"👥 Получили: {success_count} игроков\n"
-            f"📊 Всего игроков: {len(users)}"
+            f"📊 Всего игроков: {total_users}"
         )
         
         await message.answer(result_text)
@@ -926,43 +940,40 @@ async def process_gift_card(message: Message, state: FSMContext):
         await message.answer("❌ Ошибка при раздаче карточки")
 
 
-# Обработчики особых раздач
-@router.callback_query(F.data.startswith("special_"))
-async def handle_special_giveaways(callback: CallbackQuery):
-    """Обработка особых раздач"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("❌ У вас нет прав администратора", show_alert=True)
-        return
-    
-    special_type = callback.data.split("_", 1)[1]
-    
+SPECIAL_GIVEAWAYS = ("random_card", "coins_exp", "rare_card", "mega")
+
+
+async def _run_special_giveaway(message: Message, special_type: str, total_users: int):
+    """Выполнение особой раздачи и отчет администратору"""
     try:
-        users = await user_service.get_all_users()
-        if not users:
-            await callback.answer("❌ Нет зарегистрированных пользователей", show_alert=True)
-            return
-        
-        await callback.message.edit_text(f"🎁 Начинаю особую раздачу для {len(users)} игроков...")
-        
-        from services.card_service import card_service
+        progress = _giveaway_progress(message, "🎁 Особая раздача")
         success_count = 0
         
         if special_type == "random_card":
             # Случайная карточка каждому игроку
-            for user in users:
-                try:
-                    card = await card_service.get_random_card()
-                    if card:
-                        await user_service.add_card_to_user(user, str(card.id))
-                        success_count += 1
-                except Exception as e:
-                    logger.error(f"Error giving random card to user {user.telegram_id}: {e}")
+            started_at = datetime.utcnow()
+            granted = await giveaway_service.grant_cards(1, "global", progress=progress)
+            success_count = granted["users"]
+            
+            if success_count:
+                # Уведомление получившим - одной фоновой рассылкой (карточки получили все,
+                # кто был зарегистрирован к началу раздачи)
+                from services.broadcast_service import broadcast_service
+                await broadcast_service.start_broadcast(
+                    "gift_random_card",
+                    "🎁 **Подарок от администрации!**\n\n"
+                    "🎴 Вы получили случайную карточку - загляните в свою коллекцию!\n\n"
+                    "💝 Спасибо за участие в игре!",
+                    parse_mode="Markdown",
+                    audience="all",
+                    filter={"created_at": {"$not": {"$gt": started_at}}}
+                )
             
             result_text = (
                 f"✅ **Раздача случайных карточек завершена!**\n\n"
                 f"🎰 Роздано: случайные карточки\n"
                 f"👥 Получили: {success_count} игроков\n"
-                f"📊 Всего игроков: {len(users)}"
+                f"📊 Всего игроков: {total_users}"
             )
             
         elif special_type == "coins_exp":
@@ -970,74 +981,37 @@ async def handle_special_giveaways(callback: CallbackQuery):
             coins_amount = 100
             exp_amount = 50
             
-            for user in users:
-                try:
-                    user.coins += coins_amount
-                    user.experience += exp_amount
-                    user.level = user.calculate_level()
-                    await user_service.update_user(user)
-                    success_count += 1
-                except Exception as e:
-                    logger.error(f"Error giving coins+exp to user {user.telegram_id}: {e}")
+            success_count = await giveaway_service.grant_currency(coins_amount, exp_amount)
             
             result_text = (
                 f"✅ **Комбо раздача завершена!**\n\n"
                 f"🪙 Роздано: {coins_amount} монет\n"
                 f"✨ Роздано: {exp_amount} опыта\n"
                 f"👥 Получили: {success_count} игроков\n"
-                f"📊 Всего игроков: {len(users)}"
+                f"📊 Всего игроков: {total_users}"
             )
             
         elif special_type == "rare_card":
             # Редкая карточка (Epic или выше)
-            for user in users:
-                try:
-                    import random
-                    rand = random.uniform(0, 100)
-                    if rand <= 50:  # 50% Epic
-                        rarity = "epic"
-                    elif rand <= 85:  # 35% Legendary
-                        rarity = "legendary"
-                    else:  # 15% Artifact
-                        rarity = "artifact"
-                    
-                    card = await card_service.get_random_card_by_rarity(rarity)
-                    if card:
-                        await user_service.add_card_to_user(user, str(card.id))
-                        success_count += 1
-                except Exception as e:
-                    logger.error(f"Error giving rare card to user {user.telegram_id}: {e}")
+            granted = await giveaway_service.grant_cards(1, "rare_giveaway", progress=progress)
+            success_count = granted["users"]
             
             result_text = (
                 f"✅ **Раздача редких карточек завершена!**\n\n"
                 f"🔥 Роздано: Epic/Legendary/Artifact карточки\n"
                 f"👥 Получили: {success_count} игроков\n"
-                f"📊 Всего игроков: {len(users)}"
+                f"📊 Всего игроков: {total_users}"
             )
             
-        elif special_type == "mega":
+        else:
             # Мега бонус: 3 случайные карточки + 200 монет + 100 опыта
             coins_amount = 200
             exp_amount = 100
             cards_count = 3
             
-            for user in users:
-                try:
-                    # Добавляем монеты и опыт
-                    user.coins += coins_amount
-                    user.experience += exp_amount
-                    user.level = user.calculate_level()
-                    await user_service.update_user(user)
-                    
-                    # Добавляем 3 случайные карточки
-                    for _ in range(cards_count):
-                        card = await card_service.get_random_card()
-                        if card:
-                            await user_service.add_card_to_user(user, str(card.id))
-                    
-                    success_count += 1
-                except Exception as e:
-                    logger.error(f"Error giving mega bonus to user {user.telegram_id}: {e}")
+            # Монеты и опыт одним запросом, затем 3 случайные карточки пачками
+            success_count = await giveaway_service.grant_currency(coins_amount, exp_amount)
+            await giveaway_service.grant_cards(cards_count, "global", progress=progress)
             
             result_text = (
                 f"✅ **Мега раздача завершена!**\n\n"
@@ -1045,20 +1019,48 @@ async def handle_special_giveaways(callback: CallbackQuery):
                 f"🪙 Роздано: {coins_amount} монет\n"
                 f"✨ Роздано: {exp_amount} опыта\n"
                 f"👥 Получили: {success_count} игроков\n"
-                f"📊 Всего игроков: {len(users)}"
+                f"📊 Всего игроков: {total_users}"
             )
         
-        else:
-            await callback.answer("❌ Неизвестный тип особой раздачи", show_alert=True)
-            return
-        
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🎁 К раздачам", callback_data="admin_gifts")]
         ])
         
-        await callback.message.edit_text(result_text, reply_markup=keyboard)
+        await message.edit_text(result_text, reply_markup=keyboard)
+        
+    except Exception as e:
+        logger.error(f"Error processing special giveaway: {e}")
+        await message.answer("❌ Ошибка при выполнении особой раздачи")
+
+
+# Обработчики особых раздач
+@router.callback_query(F.data.startswith("special_"))
+async def handle_special_giveaways(callback: CallbackQuery):
+    """Обработка особых раздач"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет прав администратора", show_alert=True)
+        return
+    
+    special_type = callback.data.split("_", 1)[1]
+    if special_type not in SPECIAL_GIVEAWAYS:
+        await callback.answer("❌ Неизвестный тип особой раздачи", show_alert=True)
+        return
+    
+    try:
+        total_users = await user_service.count_users()
+        if not total_users:
+            await callback.answer("❌ Нет зарегистрированных пользователей", show_alert=True)
+            return
+        
+        await callback.message.edit_text(f"🎁 Начинаю особую раздачу для {total_users} игроков...")
         await callback.answer()
         
+        # Раздача идет в фоне, итог появится в этом же сообщении
+        background_jobs.start(
+            f"special_{special_type}",
+            _run_special_giveaway(callback.message, special_type, total_users)
+        )
+        
     except Exception as e:
         logger.error(f"Error processing special giveaway: {e}")
         await callback.answer("❌ Ошибка при выполнении особой раздачи", show_alert=True)
@@ -1632,24 +1634,17 @@ async def process_gift_coins(message: Message, state: FSMContext):
         
         await state.clear()
         
-        users = await user_service.get_all_users()
-        success_count = 0
+        total_users = await user_service.count_users()
         
-        await message.answer(f"🪙 Начинаю раздачу {coins_amount} монет {len(users)} игрокам...")
+        await message.answer(f"🪙 Начинаю раздачу {coins_amount} монет {total_users} игрокам...")
         
-        for user in users:
-            try:
-                user.coins += coins_amount
-                await user_service.update_user(user)
-                success_count += 1
-            except Exception as e:
-                logger.error(f"Error giving coins to user {user.telegram_id}: {e}")
+        success_count = await giveaway_service.grant_currency(coins=coins_amount)
         
         result_text = (
             f"✅ **Раздача монет завершена!**\n\n"
             f"🪙 Роздано: {coins_amount} монет\n"
             f"👥 Получили: {success_count} игроков\n"
-            f"📊 Всего игроков: {len(users)}"
+            f"📊 Всего игроков: {total_users}"
         )
         
         await message.answer(result_text)
@@ -1675,26 +1670,17 @@ async def process_gift_exp(message: Message, state: FSMContext):
         
         await state.clear()
         
-        users = await user_service.get_all_users()
-        success_count = 0
+        total_users = await user_service.count_users()
         
-        await message.answer(f"✨ Начинаю раздачу {exp_amount} опыта {len(users)} игрокам...")
+        await message.answer(f"✨ Начинаю раздачу {exp_amount} опыта {total_users} игрокам...")
         
-        for user in users:
-            try:
-                old_level = user.level
-                user.experience += exp_amount
-                user.level = user.calculate_level()
-                await user_service.update_user(user)
-                success_count += 1
-            except Exception as e:
-                logger.error(f"Error giving exp to user {user.telegram_id}: {e}")
+        success_count = await giveaway_service.grant_currency(experience=exp_amount)
         
         result_text = (
             f"✅ **Раздача опыта завершена!**\n\n"
             f"✨ Роздано: {exp_amount} опыта\n"
             f"👥 Получили: {success_count} игроков\n"
-            f"📊 Всего игроков: {len(users)}"
+            f"📊 Всего игроков: {total_users}"
         )
         
         await message.answer(result_text)
@@ -1715,144 +1701,25 @@ async def handle_special_giveaways(callback: CallbackQuery):
         return
     
     special_type = callback.data.split("_", 1)[1]
+    if special_type not in SPECIAL_GIVEAWAYS:
+        await callback.answer("❌ Неизвестный тип особой раздачи", show_alert=True)
+        return
     
     try:
-        users = await user_service.get_all_users()
-        if not users:
+        total_users = await user_service.count_users()
+        if not total_users:
             await callback.answer("❌ Нет зарегистрированных пользователей", show_alert=True)
             return
         
-        await callback.message.edit_text(f"🎁 Начинаю особую раздачу для {len(users)} игроков...")
-        
-        from services.card_service import card_service
-        success_count = 0
-        
-        if special_type == "random_card":
-            # Случайная карточка каждому игроку
-            for user in users:
-                try:
-                    card = await card_service.get_random_card()
-                    if card:
-                        await user_service.add_card_to_user(user, str(card.id))
-                        success_count += 1
-                        
-                        # Отправляем уведомление пользователю
-                        try:
-                            notification_text = (
-                                f"🎁 **Подарок от администрации!**\n\n"
-                                f"🎴 Вы получили случайную карточку:\n"
-                                f"{card.get_rarity_emoji()} **{card.name}**\n"
-                                f"📝 {card.description}\n\n"
-                                f"💝 Спасибо за участие в игре!"
-                            )
-                            await callback.message.bot.send_message(user.telegram_id, notification_text, parse_mode="Markdown")
-                        except Exception as notify_error:
-                            logger.error(f"Failed to notify user {user.telegram_id} about random gift: {notify_error}")
-                            
-                except Exception as e:
-                    logger.error(f"Error giving random card to user {user.telegram_id}: {e}")
-            
-            result_text = (
-                f"✅ **Раздача случайных карточек завершена!**\n\n"
-                f"🎰 Роздано: случайные карточки\n"
-                f"👥 Получили: {success_count} игроков\n"
-                f"📊 Всего игроков: {len(users)}"
-            )
-            
-        elif special_type == "coins_exp":
-            # Монеты + опыт
-            coins_amount = 100
-            exp_amount = 50
-            
-            for user in users:
-                try:
-                    user.coins += coins_amount
-                    user.experience += exp_amount
-                    user.level = user.calculate_level()
-                    await user_service.update_user(user)
-                    success_count += 1
-                except Exception as e:
-                    logger.error(f"Error giving coins+exp to user {user.telegram_id}: {e}")
-            
-            result_text = (
-                f"✅ **Комбо раздача завершена!**\n\n"
-                f"🪙 Роздано: {coins_amount} монет\n"
-                f"✨ Роздано: {exp_amount} опыта\n"
-                f"👥 Получили: {success_count} игроков\n"
-                f"📊 Всего игроков: {len(users)}"
-            )
-            
-        elif special_type == "rare_card":
-            # Редкая карточка (Epic или выше)
-            for user in users:
-                try:
-                    import random
-                    rand = random.uniform(0, 100)
-                    if rand <= 50:  # 50% Epic
-                        rarity = "epic"
-                    elif rand <= 85:  # 35% Legendary
-                        rarity = "legendary"
-                    else:  # 15% Artifact
-                        rarity = "artifact"
-                    
-                    card = await card_service.get_random_card_by_rarity(rarity)
-                    if card:
-                        await user_service.add_card_to_user(user, str(card.id))
-                        success_count += 1
-                except Exception as e:
-                    logger.error(f"Error giving rare card to user {user.telegram_id}: {e}")
-            
-            result_text = (
-                f"✅ **Раздача редких карточек завершена!**\n\n"
-                f"🔥 Роздано: Epic/Legendary/Artifact карточки\n"
-                f"👥 Получили: {success_count} игроков\n"
-                f"📊 Всего игроков: {len(users)}"
-            )
-            
-        elif special_type == "mega":
-            # Мега бонус: 3 случайные карточки + 200 монет + 100 опыта
-            coins_amount = 200
-            exp_amount = 100
-            cards_count = 3
-            
-            for user in users:
-                try:
-                    # Добавляем монеты и опыт
-                    user.coins += coins_amount
-                    user.experience += exp_amount
-                    user.level = user.calculate_level()
-                    await user_service.update_user(user)
-                    
-                    # Добавляем 3 случайные карточки
-                    for _ in range(cards_count):
-                        card = await card_service.get_random_card()
-                        if card:
-                            await user_service.add_card_to_user(user, str(card.id))
-                    
-                    success_count += 1
-                except Exception as e:
-                    logger.error(f"Error giving mega bonus to user {user.telegram_id}: {e}")
-            
-            result_text = (
-                f"✅ **Мега раздача завершена!**\n\n"
-                f"🎴 Роздано: {cards_count} случайные карточки\n"
-                f"🪙 Роздано: {coins_amount} монет\n"
-                f"✨ Роздано: {exp_amount} опыта\n"
-                f"👥 Получили: {success_count} игроков\n"
-                f"📊 Всего игроков: {len(users)}"
-            )
-        
-        else:
-            await callback.answer("❌ Неизвестный тип особой раздачи", show_alert=True)
-            return
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🎁 К раздачам", callback_data="admin_gifts")]
-        ])
-        
-        await callback.message.edit_text(result_text, reply_markup=keyboard)
+        await callback.message.edit_text(f"🎁 Начинаю особую раздачу для {total_users} игроков...")
         await callback.answer()
         
+        # Раздача идет в фоне, итог появится в этом же сообщении
+        background_jobs.start(
+            f"special_{special_type}",
+            _run_special_giveaway(callback.message, special_type, total_users)
+        )
+        
     except Exception as e:
         logger.error(f"Error processing special giveaway: {e}")
         await callback.answer("❌ Ошибка при выполнении особой раздачи", show_alert=True)
@@ -130,17 +130,13 @@ async def battle_deck_manage(callback: CallbackQuery):
             return
         
         # Получаем карты пользователя
-        user_cards = []
-        for user_card in user.cards:
-            try:
-                card_info = await card_service.get_card_by_id(user_card.card_id)
-                if card_info:
-                    user_cards.append({
-                        "card": card_info,
-                        "quantity": user_card.quantity
-                    })
-            except:
-                continue
+        cards = await card_service.get_cards_by_ids(
+            [user_card.card_id for user_card in user.cards] + user.battle_deck.card_ids
+        )
+        user_cards = [
+            {"card": cards[user_card.card_id], "quantity": user_card.quantity}
+            for user_card in user.cards if user_card.card_id in cards
+        ]
         
         # Сортируем по редкости (от сильных к слабым)
         rarity_order = {"artifact": 5, "legendary": 4, "epic": 3, "rare": 2, "common": 1}
@@ -151,11 +147,10 @@ async def battle_deck_manage(callback: CallbackQuery):
         if user.battle_deck.card_ids:
             text += "**Текущая колода:**\n"
             for i, card_id in enumerate(user.battle_deck.card_ids, 1):
-                try:
-                    card_info = await card_service.get_card_by_id(card_id)
-                    if card_info:
-                        text += f"{i}. {card_info.get_rarity_emoji()} {card_info.name}\n"
-                except:
+                card_info = cards.get(card_id)
+                if card_info:
+                    text += f"{i}. {card_info.get_rarity_emoji()} {card_info.name}\n"
+                else:
                     text += f"{i}. ❓ Неизвестная карта\n"
             text += "\n"
         
@@ -271,21 +266,16 @@ async def deck_auto_fill(callback: CallbackQuery):
             return
         
         # Получаем все карты пользователя
-        user_cards = []
-        for user_card in user.cards:
-            try:
-                card_info = await card_service.get_card_by_id(user_card.card_id)
-                if card_info:
-                    user_cards.append({
-                        "card": card_info,
-                        "quantity": user_card.quantity
-                    })
-            except:
-                continue
-        
-        # Сортируем по редкости и выбираем лучшие
-        rarity_order = {"artifact": 5, "legendary": 4, "epic": 3, "rare": 2, "common": 1}
-        user_cards.sort(key=lambda x: rarity_order.get(x["card"].rarity, 0), reverse=True)
+        cards = await card_service.get_cards_by_ids([
+            user_card.card_id for user_card in user.cards if user_card.quantity > 0
+        ])
+        user_cards = [
+            {"card": cards[user_card.card_id], "quantity": user_card.quantity}
+            for user_card in user.cards if user_card.card_id in cards
+        ]
+        
+        # Сортируем по боевой силе и выбираем лучшие
+        user_cards.sort(key=lambda x: x["card"].get_base_power(), reverse=True)
         
         # Заполняем колоду лучшими картами
         user.battle_deck.card_ids = [str(card_data["card"].id) for card_data in user_cards[:5]]
@@ -373,12 +363,12 @@ async def battle_stats(callback: CallbackQuery):
         
         if user.battle_deck.card_ids:
             text += "**Текущая колода:**\n"
+            cards = await card_service.get_cards_by_ids(user.battle_deck.card_ids)
             for i, card_id in enumerate(user.battle_deck.card_ids, 1):
-                try:
-                    card_info = await card_service.get_card_by_id(card_id)
-                    if card_info:
-                        text += f"{i}. {card_info.get_rarity_emoji()} {card_info.name}\n"
-                except:
+                card_info = cards.get(card_id)
+                if card_info:
+                    text += f"{i}. {card_info.get_rarity_emoji()} {card_info.name}\n"
+                else:
                     text += f"{i}. ❓ Неизвестная карта\n"
         
         keyboard = [
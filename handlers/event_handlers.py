@@ -564,6 +564,8 @@ async def finalize_event_creation(message: Message, state: FSMContext):
         }
         
         event = await event_service.create_event(event_data)
+        # Прогресс уже накопленных карточек, уровня и монет засчитывается сразу
+        participants = await event_service.backfill_event_progress(event)
         
         success_text = (
             f"✅ **Ивент создан успешно!**\n\n"
@@ -571,6 +573,7 @@ async def finalize_event_creation(message: Message, state: FSMContext):
             f"📝 {event.description}\n\n"
             f"📅 Длительность: {data['duration_days']} дней\n"
             f"🎯 Цель: {event.target_value} {event.target_type.replace('_', ' ')}\n"
+            f"👥 Участников с прогрессом: {participants}\n"
         )
         
         if data.get("reward_coins", 0) > 0 or data.get("reward_experience", 0) > 0:
@@ -689,13 +692,16 @@ async def create_event_from_template(callback: CallbackQuery):
         }
         
         event = await event_service.create_event(event_data)
+        # Прогресс уже накопленных карточек, уровня и монет засчитывается сразу
+        participants = await event_service.backfill_event_progress(event)
         
         success_text = (
             f"✅ **Ивент создан из шаблона!**\n\n"
             f"{event.icon} **{event.name}**\n"
             f"📝 {event.description}\n\n"
             f"📅 Длительность: {template['duration_days']} дней\n"
-            f"🎯 Цель: {event.target_value} {event.target_type.replace('_', ' ')}\n\n"
+            f"🎯 Цель: {event.target_value} {event.target_type.replace('_', ' ')}\n"
+            f"👥 Участников с прогрессом: {participants}\n\n"
             f"🎁 **Награды:**\n"
             f"🪙 {template['rewards']['coins']} монет\n"
             f"✨ {template['rewards']['experience']} опыта"
@@ -376,17 +376,23 @@ async def nft_stats(callback: CallbackQuery):
     try:
         # Получаем статистику
         available_nfts = await nft_service.get_available_nft_cards()
-        all_users = await user_service.get_all_users()
         
         total_nfts_owned = 0
-        for user in all_users:
-            total_nfts_owned += len([nft for nft in user.nfts if nft.is_active])
+        nft_owners = 0
+        async for batch in user_service.iter_users(
+            {"nfts.is_active": True}, {"_id": 0, "nfts.is_active": 1}
+        ):
+            for user_data in batch:
+                active_count = sum(1 for nft in user_data.get("nfts", []) if nft.get("is_active"))
+                total_nfts_owned += active_count
+                if active_count:
+                    nft_owners += 1
         
         stats_text = (
             "📊 **Статистика NFT системы**\n\n"
             f"🛒 Доступно для покупки: {len(available_nfts)}\n"
             f"💎 Всего присвоено NFT: {total_nfts_owned}\n"
-            f"👥 Игроков с NFT: {len([u for u in all_users if any(nft.is_active for nft in u.nfts)])}\n\n"
+            f"👥 Игроков с NFT: {nft_owners}\n\n"
         )
         
         if available_nfts:
@@ -6,6 +6,8 @@ from aiogram.fsm.state import State, StatesGroup
 from loguru import logger
 
 from config import settings
+from models.card import Card
+from services.background_jobs import background_jobs
 
 router = Router()
 
@@ -62,11 +64,23 @@ async def notify_card_process(message: Message, state: FSMContext):
         
         await state.clear()
         
-        # Отправляем уведомления
-        from services.notification_service import notification_service
-        
         await message.answer(f"📢 Отправляю уведомления о карточке '{card_name}'...")
         
+        # Рассылка идет в фоне, итог придет отдельным сообщением
+        background_jobs.start("notify_card", _notify_card(message, card))
+        
+    except Exception as e:
+        logger.error(f"Error processing card notification: {e}")
+        await message.answer("❌ Ошибка при отправке уведомлений")
+        await state.clear()
+
+
+async def _notify_card(message: Message, card: Card):
+    """Рассылка уведомления о карточке и отчет администратору"""
+    try:
+        from services.notification_service import notification_service
+        
+        card_name = card.name
         notification_count = await notification_service.notify_new_card(card)
         
         result_text = (
@@ -81,7 +95,6 @@ async def notify_card_process(message: Message, state: FSMContext):
     except Exception as e:
         logger.error(f"Error processing card notification: {e}")
         await message.answer("❌ Ошибка при отправке уведомлений")
-        await state.clear()
 
 
 # Улучшенная раздача карточек с уведомлениями
@@ -119,7 +132,6 @@ async def enhanced_giveaway_process(message: Message, state: FSMContext):
         
         # Проверяем существование карточки
         from services.card_service import card_service
-        from services.user_service import user_service
         
         card = await card_service.get_card_by_name(card_name)
         if not card:
@@ -130,17 +142,35 @@ async def enhanced_giveaway_process(message: Message, state: FSMContext):
         
         await message.answer(f"🎁 Начинаю раздачу карточки '{card_name}' + уведомления...")
         
-        # Получаем всех пользователей
-        users = await user_service.get_all_users()
+        # Раздача идет в фоне, итог придет отдельным сообщением
+        background_jobs.start("enhanced_giveaway", _enhanced_giveaway(message, card))
+        
+    except Exception as e:
+        logger.error(f"Error processing enhanced giveaway: {e}")
+        await message.answer("❌ Ошибка при раздаче карточки")
+        await state.clear()
+
+
+async def _enhanced_giveaway(message: Message, card: Card):
+    """Выдача карточки всем игрокам, уведомление и отчет администратору"""
+    try:
+        from services.card_service import card_service
+        from services.user_service import user_service
+        
+        card_name = card.name
+        
+        # Пользователи обрабатываются пачками, без загрузки всей коллекции
+        total_users = await user_service.count_users()
         success_count = 0
         
         # Раздаем карточки
-        for user in users:
-            try:
-                await user_service.add_card_to_user(user, str(card.id))
-                success_count += 1
-            except Exception as e:
-                logger.error(f"Error giving card to user {user.telegram_id}: {e}")
+        async for users in user_service.iter_users():
+            for user in users:
+                try:
+                    await user_service.add_card_to_user(user, str(card.id))
+                    success_count += 1
+                except Exception as e:
+                    logger.error(f"Error giving card to user {user.telegram_id}: {e}")
         
         # Обновляем статистику карточки
         await card_service.update_card_stats(card_name, success_count, success_count)
@@ -154,7 +184,7 @@ async def enhanced_giveaway_process(message: Message, state: FSMContext):
             f"🎴 Карточка: '{card_name}'\n"
             f"👥 Получили карточку: {success_count} игроков\n"
             f"📨 Получили уведомление: {notification_count} игроков\n"
-            f"📊 Всего игроков: {len(users)}\n\n"
+            f"📊 Всего игроков: {total_users}\n\n"
             f"🎉 Карточка успешно добавлена в коллекции и все уведомлены!"
         )
         
@@ -163,7 +193,6 @@ async def enhanced_giveaway_process(message: Message, state: FSMContext):
     except Exception as e:
         logger.error(f"Error processing enhanced giveaway: {e}")
         await message.answer("❌ Ошибка при раздаче карточки")
-        await state.clear()
 
 
 # Массовая рассылка сообщений
@@ -201,11 +230,22 @@ async def broadcast_process(message: Message, state: FSMContext):
         
         await state.clear()
         
-        # Отправляем рассылку
-        from services.notification_service import notification_service
-        
         await message.answer(f"📢 Отправляю рассылку...")
         
+        # Рассылка идет в фоне, итог придет отдельным сообщением
+        background_jobs.start("broadcast_message", _broadcast_message(message, broadcast_text))
+        
+    except Exception as e:
+        logger.error(f"Error processing broadcast: {e}")
+        await message.answer("❌ Ошибка при отправке рассылки")
+        await state.clear()
+
+
+async def _broadcast_message(message: Message, broadcast_text: str):
+    """Массовая рассылка и отчет администратору"""
+    try:
+        from services.notification_service import notification_service
+        
         sent_count = await notification_service.broadcast_message(broadcast_text)
         
         result_text = (
@@ -220,7 +260,6 @@ async def broadcast_process(message: Message, state: FSMContext):
     except Exception as e:
         logger.error(f"Error processing broadcast: {e}")
         await message.answer("❌ Ошибка при отправке рассылки")
-        await state.clear()
 
 
 # Сброс rate limits
@@ -233,7 +272,7 @@ async def reset_limits_handler(callback: CallbackQuery):
     
     try:
         from middleware.rate_limiter import rate_limiter
-        rate_limiter.reset_all_limits()
+        await rate_limiter.reset_all_limits()
         
         await callback.answer("✅ Все rate limits сброшены!", show_alert=True)
         logger.info(f"Admin {callback.from_user.id} reset all rate limits")
@@ -2,15 +2,22 @@ from aiogram import F, Router
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
 from loguru import logger
-import random
 
 from models.user import User
 from services.user_service import user_service
 from services.card_service import card_service
 from services.game_service import game_service
+from services.unit_of_work import UnitOfWork
+from services.achievement_rules import (
+    EVENT_CARDS, EVENT_COINS, EVENT_EXPERIENCE, EVENT_SALE, EVENT_SHOP
+)
+from handlers.achievement_handlers import check_and_notify_achievements
 
 router = Router()
 
+# Изменения пользователя при продаже карточек - для перепроверки достижений
+SALE_EVENTS = [EVENT_SALE, EVENT_CARDS, EVENT_COINS]
+
 
 async def safe_edit_message(callback, text: str, reply_markup=None, success_message: str = None):
     """Безопасное редактирование сообщения с обработкой ошибок"""
@@ -170,79 +177,50 @@ async def buy_pack(callback: CallbackQuery):
             )
             return
         
-        # Списываем монеты и устанавливаем кулдаун
-        user.coins -= config["cost"]
-        user.pack_cooldowns[pack_type] = now
-        await user_service.update_user(user)
-        
-        # Открываем пак
-        opened_cards = []
-        
-        # Добавляем гарантированную карточку
-        if config["guaranteed"]:
-            guaranteed_card = await card_service.get_random_card_by_rarity(config["guaranteed"])
-            if guaranteed_card:
-                opened_cards.append(guaranteed_card)
-                await user_service.add_card_to_user(user, str(guaranteed_card.id))
-                await card_service.update_card_stats(guaranteed_card.name, 1, 1)
-        
-        # Добавляем дополнительную legendary для ультра пака
-        if config.get("extra_legendary"):
-            extra_leg = await card_service.get_random_card_by_rarity("legendary")
-            if extra_leg:
-                opened_cards.append(extra_leg)
-                await user_service.add_card_to_user(user, str(extra_leg.id))
-                await card_service.update_card_stats(extra_leg.name, 1, 1)
-        
-        # Добавляем остальные карточки
-        remaining_cards = config["cards"] - (1 if config["guaranteed"] else 0) - (1 if config.get("extra_legendary") else 0)
-        
-        for _ in range(remaining_cards):
+        # Все изменения пака сохраняются одной операцией
+        async with UnitOfWork():
+            # Списываем монеты и устанавливаем кулдаун
+            user.coins -= config["cost"]
+            user.pack_cooldowns[pack_type] = now
+            await user_service.update_user(user)
+            
+            # Открываем пак
+            opened_cards = []
+            
+            # Добавляем гарантированную карточку
+            if config["guaranteed"]:
+                opened_cards += await card_service.draw_cards(1, {config["guaranteed"]: 1})
+            
+            # Добавляем дополнительную legendary для ультра пака
+            if config.get("extra_legendary"):
+                opened_cards += await card_service.draw_cards(1, {"legendary": 1})
+            
+            # Добавляем остальные карточки
+            remaining_cards = config["cards"] - (1 if config["guaranteed"] else 0) - (1 if config.get("extra_legendary") else 0)
+            
             if config["boost"]:
-                # Повышенный шанс на редкие карточки
-                rand = random.uniform(0, 100)
-                if pack_type == "ultra":
-                    # Ультра пак - еще больше шансов на редкие
-                    if rand <= 20:  # 20% Common
-                        rarity = "common"
-                    elif rand <= 45:  # 25% Rare
-                        rarity = "rare"
-                    elif rand <= 75:  # 30% Epic
-                        rarity = "epic"
-                    elif rand <= 98:  # 23% Legendary
-                        rarity = "legendary"
-                    else:  # 2% Artifact
-                        rarity = "artifact"
-                else:
-                    # Обычные усиленные паки
-                    if rand <= 40:  # 40% вместо 69.89%
-                        rarity = "common"
-                    elif rand <= 65:  # 25% вместо 20%
-                        rarity = "rare"
-                    elif rand <= 85:  # 20% вместо 8%
-                        rarity = "epic"
-                    elif rand <= 98:  # 13% вместо 2%
-                        rarity = "legendary"
-                    else:  # 2% вместо 0.1%
-                        rarity = "artifact"
-                
-                card = await card_service.get_random_card_by_rarity(rarity)
-            else:
+                # Повышенный шанс на редкие карточки (ультра пак - еще больше)
+                distribution = "ultra" if pack_type == "ultra" else "boosted"
+            elif pack_type == "basic":
                 # Ограничиваем базовый пак только Common-Rare
-                if pack_type == "basic":
-                    rand = random.uniform(0, 100)
-                    if rand <= 80:
-                        rarity = "common"
-                    else:
-                        rarity = "rare"
-                    card = await card_service.get_random_card_by_rarity(rarity)
-                else:
-                    card = await card_service.get_random_card()
+                distribution = "basic"
+            else:
+                distribution = "global"
             
-            if card:
-                opened_cards.append(card)
+            opened_cards += await card_service.draw_cards(remaining_cards, distribution)
+            
+            for card in opened_cards:
                 await user_service.add_card_to_user(user, str(card.id))
-                await card_service.update_card_stats(card.name, 1, 1)
+                await card_service.update_card_stats(card.name, 1,
+                                                   1 if user.get_card_count(str(card.id)) == 1 else 0)
+            
+            # Бонусный опыт за покупку
+            bonus_exp = config["cost"] // 10
+            await user_service.add_experience(user, bonus_exp)
+        
+        await check_and_notify_achievements(
+            user, callback.bot, [EVENT_SHOP, EVENT_CARDS, EVENT_COINS, EVENT_EXPERIENCE]
+        )
         
         # Формируем сообщение о результатах
         result_text = f"🎉 **Пак '{pack_type.title()}' открыт!**\n\n"
@@ -252,9 +230,6 @@ async def buy_pack(callback: CallbackQuery):
         for i, card in enumerate(opened_cards, 1):
             result_text += f"{i}. {card.get_rarity_emoji()} **{card.name}**\n"
         
-        # Бонусный опыт за покупку
-        bonus_exp = config["cost"] // 10
-        await user_service.add_experience(user, bonus_exp)
         result_text += f"\n✨ Бонус опыта: +{bonus_exp} XP"
         result_text += f"\n🪙 Осталось монет: {user.coins}"
         
@@ -341,6 +316,7 @@ async def buy_rarity_card(callback: CallbackQuery):
         await user_service.update_user(user)
         await user_service.add_card_to_user(user, str(card.id))
         await card_service.update_card_stats(card.name, 1, 1)
+        await check_and_notify_achievements(user, callback.bot, [EVENT_SHOP, EVENT_CARDS, EVENT_EXPERIENCE])
         
         result_text = (
             f"🎉 **Карточка куплена!**\n\n"
@@ -435,6 +411,7 @@ async def sell_card_command(message: Message):
             user.coins += price
             await user_service.update_user(user)
             await card_service.update_card_stats(card.name, -1)
+            await check_and_notify_achievements(user, message.bot, SALE_EVENTS)
             
             await message.answer(
                 f"💰 **Карточка продана!**\n\n"
@@ -663,6 +640,7 @@ async def confirm_sell_card(callback: CallbackQuery):
             user.coins += total_price
             await user_service.update_user(user)
             await card_service.update_card_stats(card.name, -quantity_to_sell)
+            await check_and_notify_achievements(user, callback.bot, SALE_EVENTS)
             
             result_text = (
                 f"✅ **Продажа завершена!**\n\n"
@@ -768,6 +746,7 @@ async def confirm_sell_all_cards(callback: CallbackQuery):
         user.total_cards = 0
         user.coins += total_value
         await user_service.update_user(user)
+        await check_and_notify_achievements(user, callback.bot, SALE_EVENTS)
         
         result_text = (
             f"✅ **ВСЯ КОЛЛЕКЦИЯ ПРОДАНА!**\n\n"
@@ -827,6 +806,7 @@ async def sell_all_common_cards(callback: CallbackQuery):
         
         user.coins += total_value
         await user_service.update_user(user)
+        await check_and_notify_achievements(user, callback.bot, SALE_EVENTS)
         
         result_text = (
             f"✅ **Common карточки проданы!**\n\n"
@@ -884,6 +864,7 @@ async def sell_duplicate_cards(callback: CallbackQuery):
         
         user.coins += total_value
         await user_service.update_user(user)
+        await check_and_notify_achievements(user, callback.bot, SALE_EVENTS)
         
         result_text = (
             f"✅ **Дубли проданы!**\n\n"
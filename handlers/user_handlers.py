@@ -7,7 +7,8 @@ from loguru import logger
 from models.user import User
 from services.user_service import user_service
 from services.card_service import card_service
-from services.game_service import game_service
+from services.game_service import game_service, DAILY_CARD_EVENTS
+from services.leaderboard_service import leaderboard_service
 from config import settings
 
 router = Router()
@@ -197,7 +198,7 @@ async def daily_card_handler(update):
         # Проверяем достижения после получения карточки
         try:
             from handlers.achievement_handlers import check_and_notify_achievements
-            await check_and_notify_achievements(user, message.bot)
+            await check_and_notify_achievements(user, message.bot, DAILY_CARD_EVENTS)
         except Exception as achievement_error:
             logger.error(f"Error checking achievements after daily card: {achievement_error}")
         
@@ -622,12 +623,20 @@ async def leaderboard_handler(update):
         await message.answer("❌ Произошла ошибка при загрузке меню лидерборда")
 
 
+async def _user_rank_text(board: str, telegram_id: int) -> str:
+    """Строка с местом пользователя в рейтинге"""
+    rank = await leaderboard_service.get_user_rank(board, telegram_id)
+    if not rank:
+        return ""
+    return f"📍 **Ваше место:** {rank[0]}\n"
+
+
 @router.callback_query(F.data == "leaderboard_experience")
 async def leaderboard_experience(callback: CallbackQuery):
     """Лидерборд по уровню и опыту"""
     try:
         # Получаем топ игроков по опыту
-        top_users = await user_service.get_leaderboard(limit=10, sort_by="experience")
+        top_users = await leaderboard_service.get_top("experience", limit=10)
         
         if not top_users:
             await callback.message.edit_text("📊 Пока нет данных для таблицы лидеров")
@@ -645,11 +654,13 @@ async def leaderboard_experience(callback: CallbackQuery):
             else:
                 medal = f"{i}."
             
-            name = user.first_name or user.username or f"User{user.telegram_id}"
+            name = user.display_name
             text += f"{medal} **{name}**\n"
             text += f"   🎯 Уровень: {user.level} | ✨ Опыт: {user.experience:,}\n"
             text += f"   🃏 Карточек: {user.total_cards} | 💰 Монет: {user.coins:,}\n\n"
         
+        text += await _user_rank_text("experience", callback.from_user.id)
+        
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🔄 Обновить", callback_data="leaderboard_experience")],
             [InlineKeyboardButton(text="◀️ К лидерборду", callback_data="leaderboard")]
@@ -668,7 +679,7 @@ async def leaderboard_coins(callback: CallbackQuery):
     """Лидерборд по монетам"""
     try:
         # Получаем топ игроков по монетам
-        top_users = await user_service.get_leaderboard(limit=10, sort_by="coins")
+        top_users = await leaderboard_service.get_top("coins", limit=10)
         
         if not top_users:
             await callback.message.edit_text("📊 Пока нет данных для таблицы лидеров")
@@ -686,11 +697,13 @@ async def leaderboard_coins(callback: CallbackQuery):
             else:
                 medal = f"{i}."
             
-            name = user.first_name or user.username or f"User{user.telegram_id}"
+            name = user.display_name
             text += f"{medal} **{name}**\n"
             text += f"   💰 Монет: {user.coins:,} | 🎯 Уровень: {user.level}\n"
             text += f"   ✨ Опыт: {user.experience:,} | 🃏 Карточек: {user.total_cards}\n\n"
         
+        text += await _user_rank_text("coins", callback.from_user.id)
+        
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🔄 Обновить", callback_data="leaderboard_coins")],
             [InlineKeyboardButton(text="◀️ К лидерборду", callback_data="leaderboard")]
@@ -709,7 +722,7 @@ async def leaderboard_cards(callback: CallbackQuery):
     """Лидерборд по карточкам"""
     try:
         # Получаем топ игроков по карточкам
-        top_users = await user_service.get_leaderboard(limit=10, sort_by="total_cards")
+        top_users = await leaderboard_service.get_top("total_cards", limit=10)
         
         if not top_users:
             await callback.message.edit_text("📊 Пока нет данных для таблицы лидеров")
@@ -727,11 +740,13 @@ async def leaderboard_cards(callback: CallbackQuery):
             else:
                 medal = f"{i}."
             
-            name = user.first_name or user.username or f"User{user.telegram_id}"
+            name = user.display_name
             text += f"{medal} **{name}**\n"
             text += f"   🃏 Карточек: {user.total_cards} | 🎯 Уровень: {user.level}\n"
             text += f"   ✨ Опыт: {user.experience:,} | 💰 Монет: {user.coins:,}\n\n"
         
+        text += await _user_rank_text("total_cards", callback.from_user.id)
+        
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🔄 Обновить", callback_data="leaderboard_cards")],
             [InlineKeyboardButton(text="◀️ К лидерборду", callback_data="leaderboard")]
@@ -750,7 +765,7 @@ async def leaderboard_battles(callback: CallbackQuery):
     """Лидерборд по боям"""
     try:
         # Получаем топ игроков по боям
-        top_users = await user_service.get_battle_leaderboard(limit=10)
+        top_users = await leaderboard_service.get_top("battles", limit=10)
         
         if not top_users:
             await callback.message.edit_text("⚔️ Пока нет данных о боях")
@@ -768,26 +783,28 @@ async def leaderboard_battles(callback: CallbackQuery):
             else:
                 medal = f"{i}."
             
-            name = user.first_name or user.username or f"User{user.telegram_id}"
-            battle_progress = user.battle_progress
+            name = user.display_name
+            total_battles = user.total_battles
             
             # Определяем стадию в боях
             stage_text = "🔰 Новичок"
-            if battle_progress.total_battles >= 100:
+            if total_battles >= 100:
                 stage_text = "🏆 Чемпион"
-            elif battle_progress.total_battles >= 50:
+            elif total_battles >= 50:
                 stage_text = "⚔️ Воин"
-            elif battle_progress.total_battles >= 20:
+            elif total_battles >= 20:
                 stage_text = "🛡️ Защитник"
-            elif battle_progress.total_battles >= 10:
+            elif total_battles >= 10:
                 stage_text = "⚡ Боец"
-            elif battle_progress.total_battles >= 5:
+            elif total_battles >= 5:
                 stage_text = "🎯 Стрелок"
             
             text += f"{medal} **{name}**\n"
-            text += f"   ⚔️ Боев: {battle_progress.total_battles} | {stage_text}\n"
+            text += f"   ⚔️ Боев: {total_battles} | {stage_text}\n"
             text += f"   🎯 Уровень: {user.level} | 🃏 Карточек: {user.total_cards}\n\n"
         
+        text += await _user_rank_text("battles", callback.from_user.id)
+        
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🔄 Обновить", callback_data="leaderboard_battles")],
             [InlineKeyboardButton(text="◀️ К лидерборду", callback_data="leaderboard")]
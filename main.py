@@ -21,6 +21,7 @@ from handlers import (
     easter_egg_handlers
 )
 from middleware.rate_limiter import rate_limiter
+from middleware.update_scheduler import update_scheduler
 
 
 async def on_startup():
@@ -30,15 +31,35 @@ async def on_startup():
     # Подключаемся к MongoDB
     await db.connect()
     
-    # Сбрасываем rate limits при запуске
-    from middleware.rate_limiter import rate_limiter
-    rate_limiter.reset_all_limits()
-    logger.info("Rate limits reset on startup")
+    # Запускаем хранилище rate limits (общие лимиты не сбрасываются при перезапуске одного процесса)
+    await rate_limiter.start(settings.rate_limit_backend)
+    
+    # Загружаем каталог карточек в память и подписываемся на его изменения
+    from services.card_service import card_service
+    await card_service.load_catalog()
+    card_service.start_catalog_watch()
+    card_service.stats.start()
+    
+    # Продолжаем рассылки, прерванные перезапуском
+    from services.broadcast_service import broadcast_service
+    await broadcast_service.resume_pending()
+    
+    # Загружаем общую для всех процессов таблицу мобов
+    from services.battle_service import battle_service
+    await battle_service.load_mob_table()
     
     # Создаем стандартные достижения
     from services.achievement_service import achievement_service
     await achievement_service.create_default_achievements()
     
+    # Продолжаем пересчет достижений, прерванный перезапуском
+    from services.achievement_backfill import achievement_backfill_service
+    await achievement_backfill_service.resume_pending()
+    
+    # Запускаем планировщик начала, окончания и архивации ивентов
+    from services.event_scheduler import event_scheduler
+    event_scheduler.start()
+    
     logger.info("Bot startup completed")
 
 
@@ -46,6 +67,30 @@ async def on_shutdown():
     """Действия при остановке бота"""
     logger.info("Shutting down Pratki Card Bot...")
     
+    # Дообрабатываем принятые апдейты, пока сервисы и БД еще доступны
+    await update_scheduler.stop()
+    
+    # Фоновые задачи администратора (раздачи, ожидание рассылок)
+    from services.background_jobs import background_jobs
+    await background_jobs.stop()
+    
+    from services.event_scheduler import event_scheduler
+    await event_scheduler.stop()
+    
+    # Останавливаем рассылки и пересчеты достижений, освобождая их задания для других процессов
+    from services.broadcast_service import broadcast_service
+    await broadcast_service.stop()
+    from services.achievement_backfill import achievement_backfill_service
+    await achievement_backfill_service.stop()
+    
+    await rate_limiter.stop()
+    
+    from services.card_service import card_service
+    await card_service.stop_catalog_watch()
+    
+    # Записываем накопленную статистику карточек
+    await card_service.stats.stop()
+    
     # Отключаемся от MongoDB
     await db.disconnect()
     logger.info("Bot shutdown completed")
@@ -69,7 +114,9 @@ async def main():
     # Создаем бота и диспетчер
     bot = Bot(token=settings.bot_token, default=DefaultBotProperties(parse_mode="Markdown"))
     
-    dp = Dispatcher()
+    # Апдейты одного пользователя обрабатываются по очереди, разных - параллельно
+    update_scheduler.configure(settings.update_concurrency, settings.update_max_pending)
+    dp = Dispatcher(events_isolation=update_scheduler)
     
     # Инициализируем сервис уведомлений
     from services.notification_service import notification_service
@@ -100,8 +147,13 @@ async def main():
     
     try:
         # Запускаем бота
-        logger.info("Starting bot polling...")
-        await dp.start_polling(bot)
+        if settings.webhook_url:
+            from webhook import run_webhook
+            logger.info("Starting bot webhook...")
+            await run_webhook(dp, bot)
+        else:
+            logger.info("Starting bot polling...")
+            await dp.start_polling(bot)
         
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
@@ -0,0 +1,324 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Tuple, Optional, Iterable
+from pymongo import UpdateOne
+from motor.motor_asyncio import AsyncIOMotorCollection
+from loguru import logger
+
+
+def sliding_estimate(previous: int, current: int, elapsed: float, window: float) -> float:
+    """Оценка числа запросов за последние window секунд по счетчикам двух фиксированных окон"""
+    return previous * (1 - elapsed / window) + current
+
+
+class LimiterStorage(ABC):
+    """
+    Хранилище счетчиков rate limiter'а.
+    hit вызывается на каждом запросе, поэтому реализации должны отвечать
+    без обращения к сети (общие счетчики синхронизируются в фоне)
+    """
+    
+    async def start(self) -> None:
+        pass
+    
+    async def stop(self) -> None:
+        pass
+    
+    @abstractmethod
+    async def hit(self, user_id: int, request_type: str, limit: int, window: float) -> bool:
+        """Учитывает запрос, если он укладывается в лимит"""
+    
+    @abstractmethod
+    async def reset_user(self, user_id: int, request_types: Iterable[str]) -> bool:
+        """Сброс счетчиков пользователя; True, если что-то было сброшено"""
+    
+    @abstractmethod
+    async def reset_all(self) -> None:
+        """Сброс всех счетчиков"""
+    
+    @abstractmethod
+    def user_stats(self, user_id: int, request_types: Iterable[str]) -> dict:
+        """Статистика запросов пользователя по данным этого процесса"""
+
+
+class SlidingWindowCounter:
+    """
+    Счетчик скользящего окна для одной пары (пользователь, тип запроса).
+    Хранятся только счетчики текущего и предыдущего фиксированных окон:
+    число запросов за последние window секунд оценивается как
+    previous * (доля предыдущего окна, попадающая в скользящее) + current
+    """
+    
+    __slots__ = ("window_start", "current", "previous", "last_request")
+    
+    def __init__(self, now: float):
+        self.window_start = now
+        self.current = 0
+        self.previous = 0
+        self.last_request = now
+    
+    def hit(self, now: float, limit: int, window: float) -> bool:
+        """Учитывает запрос, если он укладывается в лимит"""
+        elapsed = now - self.window_start
+        if elapsed >= window:
+            # Сдвигаем окна; если прошло больше двух окон - предыдущее пустое
+            windows_passed = int(elapsed // window)
+            self.previous = self.current if windows_passed == 1 else 0
+            self.current = 0
+            self.window_start += windows_passed * window
+            elapsed = now - self.window_start
+        
+        if sliding_estimate(self.previous, self.current, elapsed, window) >= limit:
+            return False
+        
+        self.current += 1
+        self.last_request = now
+        return True
+
+
+class MemoryLimiterStorage(LimiterStorage):
+    """
+    Счетчики в памяти процесса (по умолчанию).
+    Счетчики лежат в OrderedDict в порядке последнего обращения: сверх
+    MAX_ENTRIES вытесняется самый давний, а периодическая чистка удаляет
+    простаивающие дольше idle_ttl, начиная с самых давних
+    """
+    
+    MAX_ENTRIES = 200_000  # Предел числа счетчиков в памяти
+    SWEEP_INTERVAL = 60.0  # Как часто удалять простаивающие счетчики
+    
+    def __init__(self, idle_ttl: float = 120.0):
+        # (user_id, тип запроса) -> счетчик; порядок - от давно до недавно использованных (LRU)
+        self.counters: "OrderedDict[Tuple[int, str], SlidingWindowCounter]" = OrderedDict()
+        self.idle_ttl = idle_ttl
+        self._next_sweep = time.monotonic() + self.SWEEP_INTERVAL
+    
+    async def hit(self, user_id: int, request_type: str, limit: int, window: float) -> bool:
+        now = time.monotonic()
+        key = (user_id, request_type)
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = SlidingWindowCounter(now)
+            self.counters[key] = counter
+            if len(self.counters) > self.MAX_ENTRIES:
+                self.counters.popitem(last=False)
+        else:
+            self.counters.move_to_end(key)
+        
+        allowed = counter.hit(now, limit, window)
+        
+        if now >= self._next_sweep:
+            self.sweep(now)
+        return allowed
+    
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Удаляет счетчики, простаивающие дольше idle_ttl; обход останавливается на первом активном"""
+        now = now if now is not None else time.monotonic()
+        self._next_sweep = now + self.SWEEP_INTERVAL
+        
+        removed = 0
+        while self.counters:
+            key, counter = next(iter(self.counters.items()))
+            if now - counter.last_request < self.idle_ttl:
+                break
+            del self.counters[key]
+            removed += 1
+        
+        if removed:
+            logger.debug(f"Rate limiter evicted {removed} idle counters, {len(self.counters)} left")
+        return removed
+    
+    async def reset_user(self, user_id: int, request_types: Iterable[str]) -> bool:
+        removed = False
+        for request_type in request_types:
+            removed = self.counters.pop((user_id, request_type), None) is not None or removed
+        return removed
+    
+    async def reset_all(self) -> None:
+        self.counters.clear()
+    
+    def user_stats(self, user_id: int, request_types: Iterable[str]) -> dict:
+        counters = [
+            self.counters[(user_id, request_type)]
+            for request_type in request_types if (user_id, request_type) in self.counters
+        ]
+        if not counters:
+            return {'requests': 0, 'last_request': 0}
+        
+        time_since_last = time.monotonic() - max(counter.last_request for counter in counters)
+        return {
+            'requests': sum(counter.current for counter in counters),
+            'last_request': time.time() - time_since_last,
+            'time_since_last': time_since_last
+        }
+
+
+class MongoLimiterStorage(LimiterStorage):
+    """
+    Общие для всех процессов бота счетчики в MongoDB.
+    Документ - фиксированное окно пары (пользователь, тип запроса):
+    {_id: "user:тип:номер окна", count, expires_at}, устаревшие окна удаляет TTL-индекс.
+    Решение по запросу принимается локально: известный общий счетчик плюс
+    еще не записанные запросы этого процесса. Раз в FLUSH_INTERVAL накопленные
+    запросы пишутся одним bulk_write с $inc, и перечитываются все окна (текущие
+    и предыдущие), к которым этот процесс обращался за интервал, в том числе
+    записанные только другими процессами. Сетевой запрос не попадает в обработку
+    апдейта, а каждый процесс может превысить общий лимит лишь запросами за один
+    интервал синхронизации. Окна, которых больше нет в БД (сброс администратором
+    в любом процессе), при перечитывании обнуляются - сброс доходит до всех
+    процессов за тот же интервал
+    """
+    
+    FLUSH_INTERVAL = 1.0
+    
+    def __init__(self):
+        self.collection: AsyncIOMotorCollection = None
+        # Запросы этого процесса, еще не записанные в БД: _id окна -> количество
+        self._pending: Dict[str, int] = {}
+        # Окна, известные из БД: _id окна -> (общий счетчик, конец жизни окна по time.time)
+        self._shared: Dict[str, Tuple[int, float]] = {}
+        self._expires: Dict[str, float] = {}
+        # Окна, к которым обращались с прошлой синхронизации: _id окна -> конец жизни
+        self._watched: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+    
+    async def get_collection(self) -> AsyncIOMotorCollection:
+        if self.collection is None:
+            from database.connection import db
+            self.collection = db.get_collection("rate_limits")
+        return self.collection
+    
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self.flush()
+    
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            await self.flush()
+    
+    @staticmethod
+    def _window_id(user_id: int, request_type: str, index: int) -> str:
+        return f"{user_id}:{request_type}:{index}"
+    
+    def _count(self, window_id: str) -> int:
+        return self._shared.get(window_id, (0, 0.0))[0] + self._pending.get(window_id, 0)
+    
+    async def hit(self, user_id: int, request_type: str, limit: int, window: float) -> bool:
+        now = time.time()
+        index = int(now // window)
+        current_id = self._window_id(user_id, request_type, index)
+        previous_id = self._window_id(user_id, request_type, index - 1)
+        # Оба окна перечитываются при синхронизации, даже если этот процесс в них не писал
+        self._watched[current_id] = (index + 2) * window
+        self._watched[previous_id] = (index + 1) * window
+        
+        estimated = sliding_estimate(
+            self._count(previous_id), self._count(current_id), now - index * window, window
+        )
+        if estimated >= limit:
+            return False
+        
+        self._pending[current_id] = self._pending.get(current_id, 0) + 1
+        # Окно нужно, пока оно может быть предыдущим для следующего
+        self._expires[current_id] = (index + 2) * window
+        return True
+    
+    async def flush(self) -> int:
+        """Запись накопленных запросов и обновление общих счетчиков. Возвращает число записанных окон"""
+        async with self._lock:
+            self._prune()
+            if not self._pending and not self._watched:
+                return 0
+            
+            pending, self._pending = self._pending, {}
+            expires, self._expires = self._expires, {}
+            watched, self._watched = self._watched, {}
+            watched.update(expires)
+            # Пока идет запись, отправленные запросы учитываются в общем счетчике
+            for window_id, count in pending.items():
+                self._shared[window_id] = (self._count(window_id) + count, expires[window_id])
+            
+            try:
+                collection = await self.get_collection()
+                if pending:
+                    await collection.bulk_write([
+                        UpdateOne(
+                            {"_id": window_id},
+                            {
+                                "$inc": {"count": count},
+                                "$setOnInsert": {"expires_at": datetime.utcfromtimestamp(expires[window_id])}
+                            },
+                            upsert=True
+                        )
+                        for window_id, count in pending.items()
+                    ], ordered=False)
+                
+                found = set()
+                async for document in collection.find({"_id": {"$in": list(watched)}}):
+                    self._shared[document["_id"]] = (document["count"], watched[document["_id"]])
+                    found.add(document["_id"])
+                
+                # Окна, которых нет в БД, пусты (еще не созданы или сброшены)
+                for window_id in watched.keys() - found:
+                    self._shared.pop(window_id, None)
+                return len(pending)
+            
+            except Exception as e:
+                # Возвращаем запросы обратно, чтобы учесть их при следующей записи
+                for window_id, count in pending.items():
+                    shared_count, expires_at = self._shared[window_id]
+                    self._shared[window_id] = (shared_count - count, expires_at)
+                    self._pending[window_id] = self._pending.get(window_id, 0) + count
+                    self._expires.setdefault(window_id, expires[window_id])
+                for window_id, expires_at in watched.items():
+                    self._watched.setdefault(window_id, expires_at)
+                logger.error(f"Error flushing rate limits: {e}")
+                return 0
+    
+    def _prune(self) -> None:
+        """Удаление из локального кэша окон, которые уже не влияют на лимиты"""
+        now = time.time()
+        expired = [window_id for window_id, (_, expires_at) in self._shared.items() if expires_at <= now]
+        for window_id in expired:
+            del self._shared[window_id]
+    
+    async def reset_user(self, user_id: int, request_types: Iterable[str]) -> bool:
+        prefixes = tuple(f"{user_id}:{request_type}:" for request_type in request_types)
+        for cache in (self._pending, self._shared, self._expires, self._watched):
+            for window_id in [window_id for window_id in cache if window_id.startswith(prefixes)]:
+                del cache[window_id]
+        
+        collection = await self.get_collection()
+        result = await collection.delete_many({"_id": {"$regex": f"^{user_id}:"}})
+        return result.deleted_count > 0
+    
+    async def reset_all(self) -> None:
+        self._pending.clear()
+        self._shared.clear()
+        self._expires.clear()
+        self._watched.clear()
+        collection = await self.get_collection()
+        await collection.delete_many({})
+    
+    def user_stats(self, user_id: int, request_types: Iterable[str]) -> dict:
+        prefixes = tuple(f"{user_id}:{request_type}:" for request_type in request_types)
+        requests = sum(
+            self._count(window_id) for window_id in set(self._shared) | set(self._pending)
+            if window_id.startswith(prefixes)
+        )
+        return {'requests': requests, 'last_request': 0}
@@ -1,19 +1,15 @@
-import time
-from collections import defaultdict
-from typing import Dict, Tuple
+from typing import Optional
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, CallbackQuery, Message
 from loguru import logger
 
+from middleware.limiter_storage import LimiterStorage, MemoryLimiterStorage, MongoLimiterStorage
+
 
 class RateLimiterMiddleware(BaseMiddleware):
     """Middleware для ограничения частоты запросов"""
     
-    def __init__(self):
-        # Словарь для хранения времени последних запросов
-        # user_id -> (last_request_time, request_count_in_window)
-        self.user_requests: Dict[int, Tuple[float, int]] = defaultdict(lambda: (0.0, 0))
-        
+    def __init__(self, storage: Optional[LimiterStorage] = None):
         # Настройки лимитов (увеличены для большей свободы)
         self.rate_limits = {
             'default': {'requests': 30, 'window': 10},      # 30 запросов за 10 секунд (было 10)
@@ -22,6 +18,21 @@ class RateLimiterMiddleware(BaseMiddleware):
             'daily_card': {'requests': 5, 'window': 10},    # 5 попыток за 10 секунд (было 2)
             'suggestion': {'requests': 5, 'window': 60},    # 5 предложений в минуту (было 3)
         }
+        
+        # Счетчик без запросов дольше двух окон самого длинного лимита пуст и может быть удален
+        idle_ttl = 2 * max(limits['window'] for limits in self.rate_limits.values())
+        self.storage: LimiterStorage = storage or MemoryLimiterStorage(idle_ttl)
+    
+    async def start(self, backend: str = "memory"):
+        """Выбор хранилища счетчиков и запуск его фоновой синхронизации"""
+        if backend == "mongo" and not isinstance(self.storage, MongoLimiterStorage):
+            self.storage = MongoLimiterStorage()
+        await self.storage.start()
+        logger.info(f"Rate limiter uses {type(self.storage).__name__}")
+    
+    async def stop(self):
+        """Остановка хранилища с записью накопленных счетчиков"""
+        await self.storage.stop()
     
     async def __call__(self, handler, event: TelegramObject, data: dict):
         """Основная логика middleware"""
@@ -46,7 +57,7 @@ class RateLimiterMiddleware(BaseMiddleware):
         
         # Проверяем лимиты только для обычных пользователей
         if user_id and not self.is_admin(user_id):
-            if not self.check_rate_limit(user_id, request_type):
+            if not await self.check_rate_limit(user_id, request_type):
                 # Превышен лимит - блокируем запрос
                 if isinstance(event, CallbackQuery):
                     await event.answer("⏰ Слишком много запросов! Подождите немного.", show_alert=True)
@@ -59,54 +70,31 @@ class RateLimiterMiddleware(BaseMiddleware):
         # Пропускаем запрос дальше
         return await handler(event, data)
     
-    def check_rate_limit(self, user_id: int, request_type: str) -> bool:
+    async def check_rate_limit(self, user_id: int, request_type: str) -> bool:
         """Проверяет, не превышен ли лимит запросов"""
-        current_time = time.time()
-        limits = self.rate_limits.get(request_type, self.rate_limits['default'])
-        
-        last_time, count = self.user_requests[user_id]
-        
-        # Если прошло больше времени чем окно - сбрасываем счетчик
-        if current_time - last_time > limits['window']:
-            self.user_requests[user_id] = (current_time, 1)
-            return True
-        
-        # Если в пределах окна - проверяем лимит
-        if count >= limits['requests']:
-            return False
-        
-        # Увеличиваем счетчик
-        self.user_requests[user_id] = (last_time, count + 1)
-        return True
+        if request_type not in self.rate_limits:
+            request_type = 'default'
+        limits = self.rate_limits[request_type]
+        return await self.storage.hit(user_id, request_type, limits['requests'], limits['window'])
     
     def is_admin(self, user_id: int) -> bool:
         """Проверяет, является ли пользователь администратором"""
         from config import settings
         return user_id == settings.admin_user_id
     
-    def reset_user_limits(self, user_id: int):
+    async def reset_user_limits(self, user_id: int):
         """Сбрасывает лимиты для пользователя (для админских команд)"""
-        if user_id in self.user_requests:
-            del self.user_requests[user_id]
+        if await self.storage.reset_user(user_id, self.rate_limits):
             logger.info(f"Reset rate limits for user {user_id}")
     
-    def reset_all_limits(self):
-        """Сбрасывает все лимиты (для перезапуска бота)"""
-        self.user_requests.clear()
+    async def reset_all_limits(self):
+        """Сбрасывает все лимиты"""
+        await self.storage.reset_all()
         logger.info("Reset all rate limits")
     
     def get_user_stats(self, user_id: int) -> dict:
         """Возвращает статистику запросов пользователя"""
-        if user_id not in self.user_requests:
-            return {'requests': 0, 'last_request': 0}
-        
-        last_time, count = self.user_requests[user_id]
-        return {
-            'requests': count,
-            'last_request': last_time,
-            'time_since_last': time.time() - last_time
-        }
-
+        return self.storage.user_stats(user_id, self.rate_limits)
 
 # Глобальный экземпляр middleware
 rate_limiter = RateLimiterMiddleware()
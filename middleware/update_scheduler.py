@@ -0,0 +1,125 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Dict, Set, Tuple
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+from aiogram.types import Update
+from loguru import logger
+
+
+class UpdateScheduler(BaseEventIsolation):
+    """
+    Планировщик обработки апдейтов (events_isolation диспетчера).
+    FSMContextMiddleware берет lock(key) вокруг вызова хэндлера и читает
+    состояние FSM уже под ним, поэтому:
+    - апдейты одного пользователя (key.user_id) обрабатываются строго по очереди
+      в порядке поступления (asyncio.Lock будит ожидающих по FIFO) - два быстрых
+      нажатия buy_pack_* или daily_card не гоняются за один документ User,
+      а следующий апдейт видит состояние, выставленное предыдущим;
+    - разные пользователи обрабатываются параллельно, но не больше concurrency
+      хэндлеров одновременно (слот берется уже после очереди пользователя,
+      чтобы ожидающие не занимали его);
+    - ошибки хэндлеров проходят через ErrorsMiddleware и dp.errors как обычно.
+    Очередь пользователя и слот заняты на все время хэндлера, поэтому долгие
+    действия (рассылки, массовые раздачи) хэндлеры запускают через background_jobs.
+    В режиме вебхука прием ограничен max_pending принятыми, но не обработанными
+    апдейтами (submit); polling получает апдейты пачками getUpdates и создает
+    по задаче на апдейт средствами aiogram
+    """
+    
+    PUT_TIMEOUT = 5.0  # Сколько ждать места при приеме апдейта перед отказом
+    DRAIN_TIMEOUT = 30.0  # Сколько дожидаться обработки принятых апдейтов при остановке
+    
+    def __init__(self, concurrency: int = 64, max_pending: int = 10000):
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self._running = asyncio.Semaphore(concurrency)
+        self._pending = asyncio.Semaphore(max_pending)
+        # user_id -> (замок, число держащих и ожидающих); удаляется, когда никто не ждет
+        self._locks: Dict[int, Tuple[asyncio.Lock, int]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+    
+    def configure(self, concurrency: int, max_pending: int):
+        """Настройка лимитов до начала приема апдейтов"""
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self._running = asyncio.Semaphore(concurrency)
+        self._pending = asyncio.Semaphore(max_pending)
+        logger.info(f"Update scheduler: concurrency {concurrency}, max pending {max_pending}")
+    
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        lock, users = self._locks.get(key.user_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[key.user_id] = (lock, users + 1)
+        
+        try:
+            async with lock:
+                async with self._running:
+                    yield
+        finally:
+            lock, users = self._locks[key.user_id]
+            if users == 1:
+                del self._locks[key.user_id]
+            else:
+                self._locks[key.user_id] = (lock, users - 1)
+    
+    async def submit(self, dispatcher: Dispatcher, bot: Bot, update: Update) -> bool:
+        """
+        Прием апдейта на обработку в фоне.
+        False - если за PUT_TIMEOUT не освободилось место (обратное давление)
+        """
+        try:
+            await asyncio.wait_for(self._pending.acquire(), timeout=self.PUT_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+        
+        task = asyncio.create_task(self._process(dispatcher, bot, update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+    
+    async def _process(self, dispatcher: Dispatcher, bot: Bot, update: Update):
+        try:
+            # Ошибки хэндлеров обрабатывает диспетчер; здесь - только сбои вне его
+            await dispatcher.feed_update(bot, update)
+        except Exception as e:
+            logger.error(f"Error processing update {update.update_id}: {e}")
+        finally:
+            self._pending.release()
+    
+    async def stop(self):
+        """Дожидается обработки уже принятых апдейтов"""
+        deadline = time.monotonic() + self.DRAIN_TIMEOUT
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=self.DRAIN_TIMEOUT)
+        
+        # Апдейты polling'а, еще ожидающие своей очереди
+        while self._locks and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        
+        if self._tasks or self._locks:
+            logger.warning(
+                f"Update scheduler stopped with {len(self._tasks)} accepted updates "
+                f"and {len(self._locks)} busy users"
+            )
+    
+    async def close(self) -> None:
+        # Замки удаляются сами, когда у пользователя не остается апдейтов
+        pass
+    
+    def get_stats(self) -> dict:
+        """Состояние планировщика"""
+        return {
+            'busy_users': len(self._locks),
+            'queued': sum(users for _, users in self._locks.values()),
+            'accepted': len(self._tasks),
+            'concurrency': self.concurrency,
+            'max_pending': self.max_pending
+        }
+
+
+# Глобальный экземпляр планировщика
+update_scheduler = UpdateScheduler()
@@ -1,10 +1,21 @@
+import random
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from pydantic import BaseModel, Field
 from bson import ObjectId
 from models.user import PyObjectId
 
 
+# Диапазоны боевой силы карточек по редкостям
+RARITY_POWER_RANGES: Dict[str, Tuple[int, int]] = {
+    "common": (100, 300),
+    "rare": (400, 800),
+    "epic": (1000, 2000),
+    "legendary": (2500, 5000),
+    "artifact": (6000, 12000)
+}
+
+
 class Card(BaseModel):
     id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
     name: str = Field(..., unique=True)
@@ -20,6 +31,9 @@ class Card(BaseModel):
     tags: List[str] = []
     is_active: bool = True
     
+    # Battle
+    base_power: Optional[int] = None  # Сила в бою; None - по редкости
+    
     # Stats
     total_owned: int = 0  # Общее количество у всех игроков
     unique_owners: int = 0  # Количество уникальных владельцев
@@ -52,6 +66,16 @@ class Card(BaseModel):
         }
         return rarity_emojis.get(self.rarity, "❓")
     
+    def get_base_power(self) -> int:
+        """
+        Боевая сила карточки: заданная вручную или выбранная из диапазона редкости.
+        Выбор детерминирован по ID, поэтому одинаков во всех процессах
+        """
+        if self.base_power is not None:
+            return self.base_power
+        low, high = RARITY_POWER_RANGES.get(self.rarity, (200, 200))
+        return random.Random(str(self.id)).randint(low, high)
+    
     def get_media_url(self) -> Optional[str]:
         """Возвращает URL медиафайла (приоритет: video > gif > image)"""
         if self.video_url:
@@ -54,6 +54,11 @@ class Event(BaseModel):
     is_hidden: bool = Field(default=False, description="Скрытый ивент до старта")
     max_participants: Optional[int] = Field(default=None, description="Максимум участников")
     
+    # Состояние, которое выставляет планировщик ивентов
+    is_announced: bool = Field(default=False, description="Старт ивента обработан")
+    is_archived: bool = Field(default=False, description="Прогресс перенесен в архив")
+    archived_at: Optional[datetime] = None
+    
     # Системные поля
     created_at: datetime = Field(default_factory=datetime.utcnow)
     created_by: int = Field(..., description="ID админа создавшего ивент")
@@ -1,7 +1,8 @@
 from datetime import datetime
 from typing import Optional, List, Dict, Any, Annotated, Union
-from pydantic import BaseModel, Field, BeforeValidator
+from pydantic import BaseModel, Field, BeforeValidator, PrivateAttr
 from bson import ObjectId
+from pymongo import UpdateOne
 
 
 def validate_object_id(v):
@@ -33,6 +34,47 @@ PyObjectId = Annotated[ObjectId, BeforeValidator(validate_object_id)]
 PyDateTime = Annotated[datetime, BeforeValidator(validate_datetime)]
 
 
+# Счетчики, которые сохраняются через $inc (изменения из параллельных хэндлеров складываются)
+COUNTER_FIELDS = frozenset({
+    "experience", "coins", "total_cards", "achievement_points",
+    "shop_purchases_count", "total_coins_spent", "cards_sold_count", "selling_profit",
+    "suggestions_made", "accepted_suggestions", "giveaway_participation", "giveaway_wins",
+    "artifact_cards_received", "night_cards_count", "morning_cards_count",
+    "events_completed", "total_days_played",
+    "battle_progress.battles_won", "battle_progress.total_battles",
+})
+
+# Рекорды, которые сохраняются через $max
+MAX_FIELDS = frozenset({
+    "max_daily_streak", "max_legendary_streak", "max_card_streak",
+})
+
+
+def _diff_document(old: Any, new: Any, path: str, update: Dict[str, Dict[str, Any]]) -> None:
+    """Рекурсивное сравнение снимка документа с текущим состоянием и сбор операторов обновления"""
+    if old == new:
+        return
+    
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in new.items():
+            _diff_document(old.get(key), value, f"{path}.{key}" if path else key, update)
+        for key in old.keys() - new.keys():
+            update.setdefault("$unset", {})[f"{path}.{key}" if path else key] = ""
+        return
+    
+    if isinstance(old, list) and isinstance(new, list) and len(new) > len(old) and new[:len(old)] == old:
+        # В список только добавили элементы
+        update.setdefault("$push", {})[path] = {"$each": new[len(old):]}
+        return
+    
+    if path in COUNTER_FIELDS and type(old) is int and type(new) is int:
+        update.setdefault("$inc", {})[path] = new - old
+    elif path in MAX_FIELDS and type(old) is int and type(new) is int and new > old:
+        update.setdefault("$max", {})[path] = new
+    else:
+        update.setdefault("$set", {})[path] = new
+
+
 class UserCard(BaseModel):
     card_id: str
     quantity: int = 1
@@ -61,6 +103,15 @@ class BattleDeck(BaseModel):
     """Боевая колода пользователя"""
     card_ids: List[str] = Field(default_factory=list, max_length=5)
     last_used: Optional[datetime] = None
+    # Кэш силы колоды и карты, по которым она посчитана
+    power: Optional[int] = None
+    power_card_ids: List[str] = Field(default_factory=list)
+    
+    def get_cached_power(self, owned_card_ids: List[str]) -> Optional[int]:
+        """Сила колоды из кэша, если набор карт не изменился"""
+        if self.power is not None and self.power_card_ids == owned_card_ids:
+            return self.power
+        return None
 
 
 class BattleProgress(BaseModel):
@@ -158,11 +209,79 @@ class User(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     last_activity: datetime = Field(default_factory=datetime.utcnow)
     
+    # Снимок документа на момент загрузки/последнего сохранения
+    _snapshot: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+    
     class Config:
         populate_by_name = True
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
+    
+    def model_post_init(self, __context: Any) -> None:
+        # Поля, которых не было в документе, получат $set при первом сохранении
+        document = self.to_document()
+        self._snapshot = {key: value for key, value in document.items() if key in self.model_fields_set}
+    
+    def to_document(self) -> Dict[str, Any]:
+        """Документ пользователя для MongoDB"""
+        return self.model_dump(by_alias=True, exclude={"id"})
+    
+    def mark_clean(self) -> None:
+        """Запоминает текущее состояние как сохраненное в БД"""
+        self._snapshot = self.to_document()
+    
+    def get_update_operations(self) -> List[UpdateOne]:
+        """
+        Превращает изменения с момента последнего сохранения в точечные операции обновления.
+        Возвращает пустой список, если ничего не изменилось.
+        """
+        current = self.to_document()
+        snapshot = self._snapshot or {}
         
+        old_cards = snapshot.get("cards", [])
+        new_cards = current.get("cards", [])
+        update: Dict[str, Dict[str, Any]] = {}
+        array_filters: List[Dict[str, Any]] = []
+        card_updates: List[Dict[str, Any]] = []
+        
+        old_quantities = {card["card_id"]: card["quantity"] for card in old_cards}
+        new_quantities = {card["card_id"]: card["quantity"] for card in new_cards}
+        
+        if len(old_quantities) != len(old_cards) or len(new_quantities) != len(new_cards) or "cards" not in snapshot:
+            # Дубликаты card_id в старых данных - сохраняем массив целиком
+            if old_cards != new_cards or "cards" not in snapshot:
+                update.setdefault("$set", {})["cards"] = new_cards
+        elif old_cards != new_cards:
+            for card_id, old_quantity in old_quantities.items():
+                delta = new_quantities.get(card_id, 0) - old_quantity
+                if delta:
+                    name = f"c{len(array_filters)}"
+                    update.setdefault("$inc", {})[f"cards.$[{name}].quantity"] = delta
+                    array_filters.append({f"{name}.card_id": card_id})
+            
+            # $push/$pull по массиву cards конфликтуют с $inc по его элементам - отдельные операции
+            added = [card for card in new_cards if card["card_id"] not in old_quantities]
+            if added:
+                card_updates.append({"$push": {"cards": {"$each": added}}})
+            if any(card_id not in new_quantities for card_id in old_quantities):
+                card_updates.append({"$pull": {"cards": {"quantity": {"$lte": 0}}}})
+        
+        for key, value in current.items():
+            if key in ("cards", "updated_at"):
+                continue
+            _diff_document(snapshot.get(key), value, key, update)
+        
+        if not update and not card_updates:
+            return []
+        
+        self.updated_at = datetime.utcnow()
+        update.setdefault("$set", {})["updated_at"] = self.updated_at
+        
+        user_filter = {"telegram_id": self.telegram_id}
+        operations = [UpdateOne(user_filter, update, array_filters=array_filters or None)]
+        operations += [UpdateOne(user_filter, card_update) for card_update in card_updates]
+        return operations
+    
     def calculate_level(self) -> int:
         """Вычисляет уровень пользователя на основе опыта"""
         # Прогрессивная формула: каждый уровень требует больше опыта
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Скрипт для выдачи достижений задним числом всем пользователям,
+уже выполнившим их условия.
+Использование: python scripts/backfill_achievements.py [название достижения ...]
+Без аргументов пересчитываются все активные достижения
+"""
+
+import asyncio
+import sys
+import os
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import db
+from services.card_service import card_service
+from services.achievement_service import achievement_service
+from services.achievement_backfill import achievement_backfill_service
+
+async def backfill_achievements(names):
+    """Пересчитывает достижения по всем пользователям"""
+    print("🔧 Пересчет достижений...")
+    
+    try:
+        # Подключаемся к базе данных
+        await db.connect()
+        print("✅ Подключение к базе данных успешно")
+        
+        await card_service.load_catalog()
+        
+        achievements = await achievement_service.get_all_achievements()
+        if names:
+            achievements = [achievement for achievement in achievements if achievement.name in names]
+        
+        if not achievements:
+            print("❌ Достижения не найдены")
+            return
+        
+        print(f"✅ Достижений для пересчета: {len(achievements)}")
+        job = await achievement_backfill_service.start(
+            [str(achievement.id) for achievement in achievements], wait=True
+        )
+        
+        print(f"\n✅ Пересчет завершен! Проверено {job['processed']} пользователей")
+        for achievement in achievements:
+            print(f"   {achievement.icon} {achievement.name}: выдано {job['awarded'].get(str(achievement.id), 0)}")
+    
+    except Exception as e:
+        print(f"❌ Ошибка при пересчете: {e}")
+        import traceback
+        traceback.print_exc()
+    
+    finally:
+        # Отключаемся от базы данных
+        await db.disconnect()
+        print("🔌 Отключение от базы данных")
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill_achievements(sys.argv[1:]))
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Скрипт для пересчета статистики карточек (total_owned / unique_owners)
+по коллекции пользователей
+"""
+
+import asyncio
+import sys
+import os
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import db
+from services.card_service import card_service
+
+async def reconcile_card_stats():
+    """Пересчитывает счетчики карточек агрегацией по пользователям"""
+    print("🔧 Пересчет статистики карточек...")
+    
+    try:
+        # Подключаемся к базе данных
+        await db.connect()
+        print("✅ Подключение к базе данных успешно")
+        
+        updated_count = await card_service.reconcile_card_stats()
+        print(f"\n✅ Пересчет завершен! Обновлено {updated_count} карточек")
+        
+    except Exception as e:
+        print(f"❌ Ошибка при пересчете: {e}")
+        import traceback
+        traceback.print_exc()
+    
+    finally:
+        # Отключаемся от базы данных
+        await db.disconnect()
+        print("🔌 Отключение от базы данных")
+
+
+if __name__ == "__main__":
+    asyncio.run(reconcile_card_stats())
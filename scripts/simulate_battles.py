@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Скрипт для расчета баланса боев методом Монте-Карло.
+Использование: python scripts/simulate_battles.py [боев на пару состав/моб] [папка для CSV]
+Печатает вероятности побед, доход в час и кривые прогресса для типовых колод,
+в папку CSV сохраняются полные таблицы по всем составам колод
+"""
+
+import sys
+import os
+import time
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.battle_service import battle_service
+from services.battle_simulator import BattleSimulator, RARITIES
+
+REPORT_LEVELS = [1, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50]
+SWEEP_SCALES = [0.5, 0.75, 1.0, 1.25, 1.5]
+SWEEP_HOURS = 24 * 7  # Прогресс за неделю
+
+
+def save_table(path, simulator, table, fmt):
+    """Сохраняет таблицу (составы x уровни мобов) в CSV"""
+    header = "deck," + ",".join(str(mob.level) for mob in simulator.mobs)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(header + "\n")
+        for index, row in enumerate(table):
+            values = ",".join(fmt.format(value) for value in row)
+            file.write(f"{simulator.composition_label(index)},{values}\n")
+
+
+def simulate_battles(samples, csv_dir):
+    """Расчет и вывод таблиц баланса"""
+    print("⚔️ Симуляция боев...")
+    
+    simulator = BattleSimulator(battle_service.mobs_data, samples=samples)
+    fights = len(simulator.compositions) * len(simulator.mobs) * samples
+    
+    started = time.monotonic()
+    win_probability = simulator.win_probabilities()
+    experience, coins = simulator.hourly_income(win_probability)
+    hours = simulator.progression_hours(win_probability)
+    print(f"✅ {fights:,} боев за {time.monotonic() - started:.1f} с")
+    
+    # Типовые колоды: 5 карт одной редкости
+    decks = [(rarity, simulator.find_composition([rarity] * 5)) for rarity in RARITIES]
+    columns = [level - 1 for level in REPORT_LEVELS]
+    
+    print("\n📊 Вероятность победы (%) по уровням мобов:")
+    print("колода".ljust(14) + "".join(f"{level:>7}" for level in REPORT_LEVELS))
+    for rarity, index in decks:
+        row = "".join(f"{win_probability[index, column] * 100:>7.1f}" for column in columns)
+        print(f"5 {rarity}".ljust(14) + row)
+    
+    print("\n💰 Доход в час на уровне прогресса (опыт / монеты):")
+    for rarity, index in decks:
+        row = "  ".join(
+            f"{level}: {experience[index, level - 1]:.1f}/{coins[index, level - 1]:.1f}"
+            for level in (10, 25, 50)
+        )
+        print(f"   5 {rarity}: {row}")
+    
+    print("\n📈 Ожидаемое время до уровня (часы):")
+    for rarity, index in decks:
+        row = "  ".join(f"{level}: {hours[index, level - 1]:.0f}" for level in (10, 25, 40, 50))
+        print(f"   5 {rarity}: {row}")
+    
+    print(f"\n🔧 Уровень за {SWEEP_HOURS} ч при множителе силы мобов:")
+    sweep = simulator.sweep_mob_power(SWEEP_SCALES, SWEEP_HOURS)
+    for scale, levels in zip(SWEEP_SCALES, sweep):
+        row = "  ".join(f"{rarity}: {levels[index]}" for rarity, index in decks)
+        print(f"   x{scale}: {row}")
+    
+    if csv_dir:
+        os.makedirs(csv_dir, exist_ok=True)
+        save_table(os.path.join(csv_dir, "win_probability.csv"), simulator, win_probability, "{:.4f}")
+        save_table(os.path.join(csv_dir, "experience_per_hour.csv"), simulator, experience, "{:.2f}")
+        save_table(os.path.join(csv_dir, "coins_per_hour.csv"), simulator, coins, "{:.2f}")
+        save_table(os.path.join(csv_dir, "progression_hours.csv"), simulator, hours, "{:.1f}")
+        print(f"\n💾 Таблицы сохранены в {csv_dir}")
+
+
+if __name__ == "__main__":
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    csv_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    simulate_battles(samples, csv_dir)
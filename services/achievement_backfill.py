@@ -0,0 +1,297 @@
+import asyncio
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+from bson import ObjectId
+from pymongo import UpdateOne
+from motor.motor_asyncio import AsyncIOMotorCollection
+from loguru import logger
+
+from database.connection import db
+from models.user import User, UserAchievement
+from services.achievement_rules import CompiledRule, RuleContext, UserFeatures, FIELD_CONDITIONS
+from services.achievement_service import achievement_service
+from services.job_lease import JobLease, LEASE_DURATION, claim_expired, lease_fields
+from services.user_service import user_service
+
+
+# Поля пользователя, нужные признакам любого правила
+BASE_PROJECTION = {
+    "telegram_id": 1,
+    "achievements.achievement_id": 1,
+    "achievements.is_completed": 1,
+    "cards.card_id": 1,
+    "cards.quantity": 1,
+    "cards_received_at_hours": 1,
+    "artifact_cards_received": 1,
+}
+
+
+class AchievementBackfillService:
+    """
+    Ретроактивная выдача новых или измененных достижений всем пользователям.
+    Пользователи читаются пачками с узкой проекцией, запись выданных достижений
+    нескольких пачек перекрывается по времени (проверка правил при этом идет в
+    одном потоке), результаты пишутся bulk_write на достижение. После каждой
+    волны пачек в задании сохраняется курсор (последний _id) - после перезапуска
+    обход продолжается с места остановки. Задание выполняет только процесс,
+    держащий его аренду (owner / lease_until).
+    """
+    
+    BATCH_SIZE = 500
+    WORKERS = 4  # Пачек в волне, чьи запросы к БД перекрываются
+    
+    def __init__(self):
+        self.collection: AsyncIOMotorCollection = None
+        self._tasks: Dict[Any, asyncio.Task] = {}
+        self._watch_task: Optional[asyncio.Task] = None
+    
+    async def get_collection(self) -> AsyncIOMotorCollection:
+        if self.collection is None:
+            self.collection = db.get_collection("achievement_backfill_jobs")
+        return self.collection
+    
+    async def start(self, achievement_ids: List[str], wait: bool = False) -> Dict[str, Any]:
+        """
+        Создает задание пересчета достижений для всех пользователей.
+        wait=False - задание выполняется в фоне, сразу возвращается его документ
+        """
+        now = datetime.utcnow()
+        job = {
+            "achievement_ids": [str(achievement_id) for achievement_id in achievement_ids],
+            "status": "running",
+            "cursor": None,
+            "processed": 0,
+            "awarded": {},
+            "created_at": now,
+            "updated_at": now,
+            **lease_fields()
+        }
+        
+        collection = await self.get_collection()
+        result = await collection.insert_one(job)
+        job["_id"] = result.inserted_id
+        
+        task = asyncio.create_task(self._run_job(job))
+        self._tasks[job["_id"]] = task
+        if wait:
+            return await task
+        return job
+    
+    async def resume_pending(self) -> int:
+        """
+        Возобновляет незавершенные задания с истекшей арендой и запускает
+        периодическую проверку заданий, брошенных другими процессами
+        """
+        resumed = await self._claim_expired()
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch_expired())
+        return resumed
+    
+    async def stop(self) -> None:
+        """Остановка заданий этого процесса; их аренда освобождается для других процессов"""
+        tasks = [task for task in (self._watch_task, *self._tasks.values()) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._watch_task = None
+    
+    async def _claim_expired(self) -> int:
+        try:
+            collection = await self.get_collection()
+            resumed = 0
+            while True:
+                job = await claim_expired(collection)
+                if job is None:
+                    return resumed
+                
+                logger.info(f"Resuming achievement backfill {job['_id']} after user {job.get('cursor')}")
+                self._tasks[job["_id"]] = asyncio.create_task(self._run_job(job))
+                resumed += 1
+        
+        except Exception as e:
+            logger.error(f"Error resuming achievement backfills: {e}")
+            return 0
+    
+    async def _watch_expired(self) -> None:
+        while True:
+            await asyncio.sleep(LEASE_DURATION)
+            await self._claim_expired()
+    
+    @staticmethod
+    def _projection(rules: List[CompiledRule]) -> Dict[str, int]:
+        """Узкая проекция: базовые поля и счетчики, которые читают правила"""
+        projection = dict(BASE_PROJECTION)
+        for rule in rules:
+            field = FIELD_CONDITIONS.get(rule.condition_type)
+            if field:
+                projection[field] = 1
+        return projection
+    
+    @staticmethod
+    def _query(achievement_ids: List[str], cursor: Optional[ObjectId]) -> Dict[str, Any]:
+        """Пользователи, у которых нет хотя бы одного из достижений, после курсора"""
+        missing = [
+            {"achievements": {"$not": {"$elemMatch": {"achievement_id": achievement_id, "is_completed": True}}}}
+            for achievement_id in achievement_ids
+        ]
+        query = {"$or": missing}
+        if cursor is not None:
+            query = {"$and": [query, {"_id": {"$gt": cursor}}]}
+        return query
+    
+    async def _process_batch(self, batch: List[Dict[str, Any]], rules: List[CompiledRule],
+                             context: RuleContext) -> Dict[str, int]:
+        """Проверка пачки пользователей и запись выданных достижений. Возвращает {achievement_id: выдано}"""
+        from services.card_service import card_service
+        
+        card_rarities = await card_service.get_card_rarities(list({
+            user_card["card_id"] for user_data in batch for user_card in user_data.get("cards", [])
+        }))
+        
+        now = datetime.utcnow()
+        # Операции выдачи по достижениям: modified_count bulk_write одного достижения -
+        # точное число выданных (уже выданные защита не изменяет)
+        operations: Dict[str, List[UpdateOne]] = {}
+        
+        for user_data in batch:
+            # Частичный документ используется только для чтения и никогда не сохраняется как User
+            user = User(**user_data)
+            earned_ids = {ua.achievement_id for ua in user.achievements if ua.is_completed}
+            features = UserFeatures(user, card_rarities)
+            
+            new_achievements = [
+                rule.achievement for rule in rules
+                if rule.achievement_id not in earned_ids and rule.predicate(features, context)
+            ]
+            if not new_achievements:
+                continue
+            
+            for achievement in new_achievements:
+                achievement_id = str(achievement.id)
+                user_achievement = UserAchievement(
+                    achievement_id=achievement_id,
+                    earned_at=now,
+                    is_completed=True,
+                    progress=achievement.condition_value
+                ).model_dump()
+                operations.setdefault(achievement_id, []).append(UpdateOne(
+                    {
+                        "_id": user_data["_id"],
+                        # Защита от повторной выдачи при пересчете той же пачки после перезапуска
+                        "achievements": {"$not": {"$elemMatch": {
+                            "achievement_id": achievement_id, "is_completed": True
+                        }}}
+                    },
+                    {
+                        "$push": {"achievements": user_achievement},
+                        "$inc": {
+                            "achievement_points": achievement.points,
+                            "coins": achievement.reward_coins,
+                            "experience": achievement.reward_experience
+                        },
+                        "$set": {"updated_at": now}
+                    }
+                ))
+        
+        awarded: Dict[str, int] = {}
+        if operations:
+            collection = await user_service.get_collection()
+            for achievement_id, achievement_operations in operations.items():
+                result = await collection.bulk_write(achievement_operations, ordered=False)
+                if result.modified_count:
+                    awarded[achievement_id] = result.modified_count
+        return awarded
+    
+    async def _checkpoint(self, job: Dict[str, Any], lease: JobLease, cursor: ObjectId, processed: int,
+                          awarded: Dict[str, int]) -> None:
+        """Сохранение курсора и счетчиков задания (только пока аренда у этого процесса)"""
+        job["cursor"] = cursor
+        job["processed"] += processed
+        inc = {"processed": processed}
+        for achievement_id, count in awarded.items():
+            job["awarded"][achievement_id] = job["awarded"].get(achievement_id, 0) + count
+            inc[f"awarded.{achievement_id}"] = count
+        
+        collection = await self.get_collection()
+        result = await collection.update_one(
+            lease.filter,
+            {"$set": {"cursor": cursor, "updated_at": datetime.utcnow()}, "$inc": inc}
+        )
+        if result.matched_count == 0:
+            lease.lost = True
+    
+    async def _run_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        collection = await self.get_collection()
+        lease = JobLease(collection, job["_id"])
+        lease.start()
+        try:
+            achievement_ids = job["achievement_ids"]
+            index = await achievement_service.get_rules()
+            rules = [rule for rule in index.rules if rule.achievement_id in achievement_ids]
+            
+            if rules:
+                context = await achievement_service.build_context({rule.condition_type for rule in rules})
+                query = self._query([rule.achievement_id for rule in rules], job.get("cursor"))
+                
+                wave = []
+                async for batch in user_service.iter_users(query, self._projection(rules), self.BATCH_SIZE):
+                    if lease.lost:
+                        break
+                    wave.append(batch)
+                    if len(wave) >= self.WORKERS:
+                        await self._run_wave(job, lease, wave, rules, context)
+                        wave = []
+                if wave and not lease.lost:
+                    await self._run_wave(job, lease, wave, rules, context)
+            
+            if lease.lost:
+                # Задание продолжит процесс, забравший аренду
+                logger.warning(f"Achievement backfill {job['_id']} was taken over by another process")
+                return job
+            
+            if any(job["awarded"].values()):
+                achievement_service.invalidate_rules()
+            
+            job["status"] = "completed"
+            await collection.update_one(
+                lease.filter,
+                {"$set": {"status": "completed", "updated_at": datetime.utcnow()}}
+            )
+            logger.info(
+                f"Achievement backfill {job['_id']} completed: {job['processed']} users checked, "
+                f"awarded {job['awarded']}"
+            )
+            return job
+        
+        except Exception as e:
+            logger.error(f"Error running achievement backfill {job.get('_id')}: {e}")
+            return job
+        
+        finally:
+            await lease.stop(release=True)
+            self._tasks.pop(job.get("_id"), None)
+    
+    async def _run_wave(self, job: Dict[str, Any], lease: JobLease, wave: List[List[Dict[str, Any]]],
+                        rules: List[CompiledRule], context: RuleContext) -> None:
+        """Обработка волны пачек с перекрытием запросов к БД и сохранение курсора после нее"""
+        results = await asyncio.gather(*(self._process_batch(batch, rules, context) for batch in wave))
+        
+        awarded: Dict[str, int] = {}
+        for batch_awarded in results:
+            for achievement_id, count in batch_awarded.items():
+                awarded[achievement_id] = awarded.get(achievement_id, 0) + count
+        
+        # total_earned растет на число фактически выданных достижений сразу после записи:
+        # повторная обработка волны после перезапуска ничего не выдаст и не добавит
+        if awarded:
+            achievements_collection = await achievement_service.get_collection()
+            await achievements_collection.bulk_write([
+                UpdateOne({"_id": ObjectId(achievement_id)}, {"$inc": {"total_earned": count}})
+                for achievement_id, count in awarded.items()
+            ], ordered=False)
+        
+        await self._checkpoint(job, lease, wave[-1][-1]["_id"], sum(len(batch) for batch in wave), awarded)
+
+
+# Глобальный экземпляр сервиса
+achievement_backfill_service = AchievementBackfillService()
@@ -0,0 +1,253 @@
+from datetime import datetime
+from typing import Optional, List, Dict, Callable, Set, FrozenSet, Iterable
+
+from models.achievement import Achievement
+from models.user import User
+
+
+# Условия вида "поле пользователя >= condition_value": condition_type -> поле User
+FIELD_CONDITIONS: Dict[str, str] = {
+    "cards_count": "total_cards",
+    "level": "level",
+    "coins_total": "coins",
+    "shop_purchase": "shop_purchases_count",
+    "shop_purchases": "shop_purchases_count",
+    "days_streak": "daily_streak",
+    "daily_streak": "daily_streak",
+    "suggestions_made": "suggestions_made",
+    "accepted_suggestions": "accepted_suggestions",
+    "artifact_random": "artifact_cards_received",
+    "early_bird": "morning_cards_count",
+    "legendary_streak": "legendary_streak",
+    "artifacts_per_month": "artifacts_this_month",
+    "complete_event": "events_completed",
+    "complete_events": "events_completed",
+    "cards_per_day": "cards_received_today",
+    "night_cards": "night_cards_count",
+    "morning_cards": "morning_cards_count",
+    "card_streak": "card_streak",
+    "total_days_played": "total_days_played",
+    "artifact_collection": "artifact_cards_received",
+    "coins_spent": "total_coins_spent",
+    "cards_sold": "cards_sold_count",
+    "selling_profit": "selling_profit",
+    "giveaway_participation": "giveaway_participation",
+    "giveaway_wins": "giveaway_wins",
+}
+
+# Типы изменений пользователя, которые передают игровые действия
+EVENT_CARDS = "cards"                # получение или потеря карточек
+EVENT_COINS = "coins"
+EVENT_EXPERIENCE = "experience"      # опыт и уровень
+EVENT_DAILY = "daily"                # ежедневная активность и серии дней
+EVENT_SHOP = "shop"                  # покупки в магазине
+EVENT_SALE = "sale"                  # продажа карточек
+EVENT_SUGGESTION = "suggestion"
+EVENT_GAME_EVENT = "game_event"      # участие в ивентах
+EVENT_GIVEAWAY = "giveaway"
+EVENT_ACHIEVEMENT = "achievement"    # получено другое достижение
+
+# Изменения, которые вызывает выдача достижения (награды и счетчик)
+REWARD_EVENTS = frozenset({EVENT_COINS, EVENT_EXPERIENCE, EVENT_ACHIEVEMENT})
+
+# От каких изменений зависит условие; неизвестные условия проверяются при любом изменении
+CONDITION_TRIGGERS: Dict[str, FrozenSet[str]] = {
+    "cards_count": frozenset({EVENT_CARDS}),
+    "level": frozenset({EVENT_EXPERIENCE}),
+    "coins_total": frozenset({EVENT_COINS}),
+    "rarity_card": frozenset({EVENT_CARDS}),
+    "shop_purchase": frozenset({EVENT_SHOP}),
+    "shop_purchases": frozenset({EVENT_SHOP}),
+    "coins_spent": frozenset({EVENT_SHOP}),
+    "days_streak": frozenset({EVENT_DAILY}),
+    "daily_streak": frozenset({EVENT_DAILY}),
+    "total_days_played": frozenset({EVENT_DAILY}),
+    "suggestions_made": frozenset({EVENT_SUGGESTION}),
+    "accepted_suggestions": frozenset({EVENT_SUGGESTION}),
+    "artifact_random": frozenset({EVENT_CARDS}),
+    "artifact_collection": frozenset({EVENT_CARDS}),
+    "artifacts_per_month": frozenset({EVENT_CARDS}),
+    "holiday_artifact": frozenset({EVENT_CARDS}),
+    "legendary_streak": frozenset({EVENT_CARDS}),
+    "early_bird": frozenset({EVENT_CARDS}),
+    "midnight_card": frozenset({EVENT_CARDS}),
+    "noon_card": frozenset({EVENT_CARDS}),
+    "night_cards": frozenset({EVENT_CARDS}),
+    "morning_cards": frozenset({EVENT_CARDS}),
+    "all_hours_cards": frozenset({EVENT_CARDS}),
+    "cards_per_day": frozenset({EVENT_CARDS}),
+    "card_streak": frozenset({EVENT_CARDS}),
+    "first_card_ever": frozenset({EVENT_CARDS}),
+    "duplicate_cards": frozenset({EVENT_CARDS}),
+    "all_rarities": frozenset({EVENT_CARDS}),
+    "complete_collection": frozenset({EVENT_CARDS}),
+    "cards_sold": frozenset({EVENT_SALE}),
+    "selling_profit": frozenset({EVENT_SALE}),
+    "complete_event": frozenset({EVENT_GAME_EVENT}),
+    "complete_events": frozenset({EVENT_GAME_EVENT}),
+    "giveaway_participation": frozenset({EVENT_GIVEAWAY}),
+    "giveaway_wins": frozenset({EVENT_GIVEAWAY}),
+    "perfect_category": frozenset({EVENT_ACHIEVEMENT}),
+    "achievements_count": frozenset({EVENT_ACHIEVEMENT}),
+    "all_achievements": frozenset({EVENT_ACHIEVEMENT}),
+}
+
+ALL_RARITIES = ("common", "rare", "epic", "legendary", "artifact")
+
+# Праздники для holiday_artifact: (месяц, день)
+HOLIDAYS = {(1, 1), (3, 8), (5, 9), (12, 31)}
+
+
+class UserFeatures:
+    """
+    Признаки пользователя для проверки достижений, собранные за один проход.
+    Простые счетчики читаются прямо из модели, поэтому награды, выданные
+    в ходе проверки, сразу учитываются следующими правилами.
+    """
+    
+    __slots__ = ("user", "rarity_quantities", "unique_card_count", "max_duplicates",
+                 "unique_hours", "completed_count")
+    
+    def __init__(self, user: User, card_rarities: Dict[str, str]):
+        self.user = user
+        self.rarity_quantities: Dict[str, int] = {}
+        self.max_duplicates = 0
+        owned_ids = set()
+        
+        for user_card in user.cards:
+            self.max_duplicates = max(self.max_duplicates, user_card.quantity)
+            if user_card.quantity <= 0:
+                continue
+            owned_ids.add(user_card.card_id)
+            rarity = card_rarities.get(user_card.card_id)
+            if rarity:
+                rarity = rarity.lower()
+                self.rarity_quantities[rarity] = self.rarity_quantities.get(rarity, 0) + user_card.quantity
+        
+        self.unique_card_count = len(owned_ids)
+        self.unique_hours: Set[int] = set(user.cards_received_at_hours)
+        self.completed_count = sum(1 for ua in user.achievements if ua.is_completed)
+
+
+class RuleContext:
+    """Общие для всех пользователей значения, нужные части правил"""
+    
+    __slots__ = ("total_achievements", "category_sizes", "catalog_size", "first_user_id")
+    
+    def __init__(self, total_achievements: int = 0, category_sizes: Dict[str, int] = None,
+                 catalog_size: int = 0, first_user_id: Optional[int] = None):
+        self.total_achievements = total_achievements
+        self.category_sizes = category_sizes or {}
+        self.catalog_size = catalog_size
+        self.first_user_id = first_user_id
+
+
+Predicate = Callable[[UserFeatures, RuleContext], bool]
+
+
+class CompiledRule:
+    """Достижение, скомпилированное в предикат"""
+    
+    __slots__ = ("achievement", "achievement_id", "condition_type", "predicate")
+    
+    def __init__(self, achievement: Achievement, predicate: Predicate):
+        self.achievement = achievement
+        self.achievement_id = str(achievement.id)
+        self.condition_type = achievement.condition_type
+        self.predicate = predicate
+
+
+def _never(features: UserFeatures, context: RuleContext) -> bool:
+    return False
+
+
+def compile_predicate(achievement: Achievement) -> Predicate:
+    """Превращает условие достижения в замыкание; разбор condition_type выполняется один раз"""
+    condition_type = achievement.condition_type
+    value = achievement.condition_value
+    data = achievement.condition_data or {}
+    
+    field = FIELD_CONDITIONS.get(condition_type)
+    if field:
+        return lambda features, context: getattr(features.user, field) >= value
+    
+    if condition_type == "rarity_card":
+        rarity = data.get("rarity", "common").lower()
+        return lambda features, context: features.rarity_quantities.get(rarity, 0) >= value
+    
+    if condition_type == "midnight_card":
+        return lambda features, context: 0 in features.unique_hours
+    
+    if condition_type == "noon_card":
+        return lambda features, context: 12 in features.unique_hours
+    
+    if condition_type == "all_hours_cards":
+        return lambda features, context: len(features.unique_hours) >= value
+    
+    if condition_type == "perfect_category":
+        # Сравнивается общее число полученных достижений с размером категории
+        category = data.get("category", "general")
+        return lambda features, context: features.completed_count >= context.category_sizes.get(category, 0)
+    
+    if condition_type == "achievements_count":
+        return lambda features, context: features.completed_count >= value
+    
+    if condition_type == "all_achievements":
+        return lambda features, context: features.completed_count >= context.total_achievements
+    
+    if condition_type == "holiday_artifact":
+        def holiday_artifact(features: UserFeatures, context: RuleContext) -> bool:
+            now = datetime.utcnow()
+            return (now.month, now.day) in HOLIDAYS and features.user.artifact_cards_received >= value
+        return holiday_artifact
+    
+    if condition_type == "first_card_ever":
+        return lambda features, context: (
+            context.first_user_id is not None and context.first_user_id == features.user.telegram_id
+        )
+    
+    if condition_type == "duplicate_cards":
+        return lambda features, context: features.max_duplicates >= value
+    
+    if condition_type == "all_rarities":
+        return lambda features, context: len(features.rarity_quantities) >= len(ALL_RARITIES)
+    
+    if condition_type == "complete_collection":
+        return lambda features, context: features.unique_card_count >= context.catalog_size
+    
+    # secret_card и неизвестные условия пока не выполняются
+    return _never
+
+
+def compile_rules(achievements: List[Achievement]) -> List[CompiledRule]:
+    """Компиляция набора достижений"""
+    return [CompiledRule(achievement, compile_predicate(achievement)) for achievement in achievements]
+
+
+class RuleIndex:
+    """Правила, сгруппированные по типам изменений, от которых они зависят"""
+    
+    def __init__(self, rules: List[CompiledRule]):
+        self.rules = rules
+        self.by_event: Dict[str, List[CompiledRule]] = {}
+        self.always: List[CompiledRule] = []
+        self._positions = {id(rule): position for position, rule in enumerate(rules)}
+        
+        for rule in rules:
+            triggers = CONDITION_TRIGGERS.get(rule.condition_type)
+            if triggers is None:
+                self.always.append(rule)
+                continue
+            for event in triggers:
+                self.by_event.setdefault(event, []).append(rule)
+    
+    def select(self, events: Optional[Iterable[str]] = None) -> List[CompiledRule]:
+        """Правила, затронутые изменениями (все правила, если изменения не указаны), в исходном порядке"""
+        if events is None:
+            return self.rules
+        
+        selected = {id(rule): rule for rule in self.always}
+        for event in events:
+            for rule in self.by_event.get(event, []):
+                selected[id(rule)] = rule
+        return sorted(selected.values(), key=lambda rule: self._positions[id(rule)])
@@ -1,26 +1,36 @@
+import hashlib
+import json
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set, Iterable
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from loguru import logger
 
 from database.connection import db
 from models.achievement import Achievement
 from models.user import User, UserAchievement
+from services.achievement_rules import REWARD_EVENTS, RuleContext, RuleIndex, UserFeatures, compile_rules
 
 
 class AchievementService:
     """Сервис для работы с достижениями"""
     
+    SEED_ID = "default_achievements"
+    
     def __init__(self):
         self.collection: AsyncIOMotorCollection = None
+        self._achievements: Optional[List[Achievement]] = None
+        self._rules: Optional[RuleIndex] = None
+        self._first_user_id: Optional[int] = None
     
     async def get_collection(self) -> AsyncIOMotorCollection:
         if self.collection is None:
             self.collection = db.get_collection("achievements")
         return self.collection
     
-    async def create_default_achievements(self):
-        """Создает стандартные достижения для бота"""
+    async def create_default_achievements(self, force: bool = False):
+        """Создает стандартные достижения для бота (force - игнорировать сохраненный хэш набора)"""
         default_achievements = [
             # Коллекционирование
             {
@@ -873,32 +883,152 @@ class AchievementService:
             }
         ]
         
+        await self._seed_achievements(default_achievements, force)
+    
+    async def _seed_achievements(self, definitions: List[Dict[str, Any]], force: bool = False) -> int:
+        """
+        Идемпотентное создание достижений из набора определений.
+        Хэш набора хранится в seed_versions: если набор не менялся, в БД идет один запрос.
+        Иначе все недостающие достижения создаются одним bulk_write с upsert по имени,
+        существующие (в том числе отредактированные администратором) не перезаписываются.
+        Возвращает количество созданных достижений
+        """
+        seed_hash = hashlib.sha256(
+            json.dumps(definitions, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        ).hexdigest()
+        
+        versions = db.get_collection("seed_versions")
+        stored = await versions.find_one({"_id": self.SEED_ID})
+        if stored and stored.get("hash") == seed_hash and not force:
+            logger.debug("Default achievements are up to date")
+            return 0
+        
+        operations = []
+        for achievement_data in definitions:
+            achievement = Achievement(**achievement_data)
+            operations.append(UpdateOne(
+                {"name": achievement.name},
+                {"$setOnInsert": achievement.dict(by_alias=True, exclude={"id"})},
+                upsert=True
+            ))
+        
         collection = await self.get_collection()
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+            upserted_ids = list(result.upserted_ids.values())
+        except BulkWriteError as e:
+            # Дубликат имени - достижение уже создал другой процесс, стартовавший одновременно
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+            upserted_ids = [upserted["_id"] for upserted in e.details.get("upserted", [])]
+        
+        await versions.update_one(
+            {"_id": self.SEED_ID},
+            {"$set": {"hash": seed_hash, "count": len(definitions), "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        
+        if upserted_ids:
+            logger.info(f"Created {len(upserted_ids)} default achievements")
+            self.invalidate_rules()
+            
+            # Новые достижения выдаются уже выполнившим условие игрокам в фоне
+            from services.achievement_backfill import achievement_backfill_service
+            await achievement_backfill_service.start([str(_id) for _id in upserted_ids])
+        return len(upserted_ids)
+    
+    def invalidate_rules(self) -> None:
+        """Сброс кэша достижений и скомпилированных правил (после изменения определений)"""
+        self._achievements = None
+        self._rules = None
+    
+    async def get_rules(self) -> RuleIndex:
+        """
+        Скомпилированные правила активных достижений, проиндексированные по типам изменений.
+        Загружаются один раз до изменения определений
+        """
+        if self._rules is None:
+            collection = await self.get_collection()
+            achievements_data = await collection.find({"is_active": True}).to_list(length=None)
+            achievements = [Achievement(**data) for data in achievements_data]
+            self._rules = RuleIndex(compile_rules(achievements))
+            self._achievements = achievements
+            logger.info(f"Compiled {len(achievements)} achievement rules")
+        return self._rules
+    
+    async def build_context(self, condition_types: Set[str]) -> RuleContext:
+        """Общие данные для правил; дорогие значения считаются только если нужны"""
+        context = RuleContext(total_achievements=len(self._achievements))
+        
+        if "perfect_category" in condition_types:
+            for achievement in self._achievements:
+                context.category_sizes[achievement.category] = context.category_sizes.get(achievement.category, 0) + 1
+        
+        if "complete_collection" in condition_types:
+            from services.card_service import card_service
+            if card_service.catalog.loaded:
+                context.catalog_size = len(card_service.catalog.by_id)
+            else:
+                context.catalog_size = len(await card_service.get_all_cards())
+        
+        if "first_card_ever" in condition_types:
+            context.first_user_id = await self._get_first_user_id()
         
-        for achievement_data in default_achievements:
-            # Проверяем, существует ли уже такое достижение
-            existing = await collection.find_one({"name": achievement_data["name"]})
-            if not existing:
-                achievement = Achievement(**achievement_data)
-                await collection.insert_one(achievement.dict(by_alias=True, exclude={"id"}))
-                logger.info(f"Created achievement: {achievement_data['name']}")
+        return context
+    
+    async def _get_first_user_id(self) -> Optional[int]:
+        """Telegram ID самого первого пользователя (кэшируется - он не меняется)"""
+        if self._first_user_id is None:
+            from services.user_service import user_service
+            collection = await user_service.get_collection()
+            # Первый по дате создания пользователь - через индекс created_at
+            first_users = await collection.find(
+                {}, {"_id": 0, "telegram_id": 1}
+            ).sort("created_at", 1).limit(1).to_list(1)
+            if first_users:
+                self._first_user_id = first_users[0]["telegram_id"]
+        return self._first_user_id
+    
+    async def build_features(self, user: User) -> UserFeatures:
+        """Признаки пользователя для правил: редкости всех карточек берутся одним запросом"""
+        from services.card_service import card_service
+        card_rarities = await card_service.get_card_rarities(
+            [user_card.card_id for user_card in user.cards if user_card.quantity > 0]
+        )
+        return UserFeatures(user, card_rarities)
     
-    async def check_user_achievements(self, user: User) -> List[Achievement]:
-        """Проверяет и выдает новые достижения пользователю"""
+    async def check_user_achievements(self, user: User,
+                                      events: Optional[Iterable[str]] = None) -> List[Achievement]:
+        """
+        Проверяет и выдает новые достижения пользователю.
+        events - типы изменений (EVENT_* из achievement_rules), после которых вызвана проверка:
+        перепроверяются только зависящие от них достижения. Без events проверяются все
+        """
         from services.user_service import user_service
         
+        index = await self.get_rules()
+        user_achievement_ids = {ua.achievement_id for ua in user.achievements if ua.is_completed}
+        features = None
         new_achievements = []
-        all_achievements = await self.get_all_achievements()
-        user_achievement_ids = [ua.achievement_id for ua in user.achievements if ua.is_completed]
         
-        for achievement in all_achievements:
-            if str(achievement.id) in user_achievement_ids:
-                continue  # Уже получено
+        while True:
+            pending = [rule for rule in index.select(events) if rule.achievement_id not in user_achievement_ids]
+            if not pending:
+                break
             
-            if await self._check_achievement_condition(user, achievement):
+            if features is None:
+                features = await self.build_features(user)
+            context = await self.build_context({rule.condition_type for rule in pending})
+            
+            awarded = False
+            for rule in pending:
+                if not rule.predicate(features, context):
+                    continue
+                
                 # Выдаем достижение
+                achievement = rule.achievement
                 user_achievement = UserAchievement(
-                    achievement_id=str(achievement.id),
+                    achievement_id=rule.achievement_id,
                     is_completed=True,
                     progress=achievement.condition_value
                 )
@@ -906,198 +1036,52 @@ class AchievementService:
                 user.achievement_points += achievement.points
                 user.coins += achievement.reward_coins
                 user.experience += achievement.reward_experience
-                
-                # Обновляем статистику достижения
-                achievement.total_earned += 1
-                if achievement.first_earned_by is None:
-                    achievement.first_earned_by = user.telegram_id
-                    achievement.first_earned_at = datetime.utcnow()
-                
-                await self.update_achievement(achievement)
+                features.completed_count += 1
+                user_achievement_ids.add(rule.achievement_id)
                 new_achievements.append(achievement)
+                awarded = True
+            
+            if not awarded:
+                break
+            # Награды меняют монеты, опыт и число достижений - перепроверяем зависящие от них правила
+            events = REWARD_EVENTS
         
         if new_achievements:
             await user_service.update_user(user)
+            await self._record_earned(new_achievements, user.telegram_id)
         
         return new_achievements
     
-    async def _check_achievement_condition(self, user: User, achievement: Achievement) -> bool:
-        """Проверяет условие получения достижения"""
-        condition_type = achievement.condition_type
-        condition_value = achievement.condition_value
-        condition_data = achievement.condition_data or {}
-        
-        if condition_type == "cards_count":
-            return user.total_cards >= condition_value
-        
-        elif condition_type == "level":
-            return user.level >= condition_value
-        
-        elif condition_type == "coins_total":
-            return user.coins >= condition_value
-        
-        elif condition_type == "rarity_card":
-            rarity = condition_data.get("rarity", "common")
-            from services.card_service import card_service
-            
-            count = 0
-            for user_card in user.cards:
-                if user_card.quantity > 0:
-                    card = await card_service.get_card_by_id(user_card.card_id)
-                    if card and card.rarity.lower() == rarity.lower():
-                        count += user_card.quantity
-            return count >= condition_value
-        
-        elif condition_type == "shop_purchase":
-            return user.shop_purchases_count >= condition_value
-        
-        elif condition_type == "shop_purchases":
-            return user.shop_purchases_count >= condition_value
-        
-        elif condition_type == "days_streak":
-            return user.daily_streak >= condition_value
-        
-        elif condition_type == "daily_streak":
-            return user.daily_streak >= condition_value
-        
-        elif condition_type == "suggestions_made":
-            return user.suggestions_made >= condition_value
-        
-        elif condition_type == "accepted_suggestions":
-            return user.accepted_suggestions >= condition_value
-        
-        elif condition_type == "artifact_random":
-            return user.artifact_cards_received >= condition_value
-        
-        elif condition_type == "early_bird":
-            return user.morning_cards_count >= condition_value
-        
-        elif condition_type == "midnight_card":
-            return user.has_received_card_at_hour(0)
-        
-        elif condition_type == "noon_card":
-            return user.has_received_card_at_hour(12)
-        
-        elif condition_type == "legendary_streak":
-            return user.legendary_streak >= condition_value
-        
-        elif condition_type == "artifacts_per_month":
-            return user.artifacts_this_month >= condition_value
-        
-        elif condition_type == "complete_event":
-            return user.events_completed >= condition_value
-        
-        elif condition_type == "complete_events":
-            return user.events_completed >= condition_value
-        
-        elif condition_type == "perfect_category":
-            # Проверяем 100% достижений в категории
-            category = condition_data.get("category", "general")
-            all_achievements = await self.get_all_achievements()
-            category_achievements = [a for a in all_achievements if a.category == category]
-            user_completed_in_category = len([ua for ua in user.achievements if ua.is_completed])
-            return user_completed_in_category >= len(category_achievements)
-        
-        elif condition_type == "achievements_count":
-            completed_count = len([ua for ua in user.achievements if ua.is_completed])
-            return completed_count >= condition_value
-        
-        elif condition_type == "all_achievements":
-            all_achievements = await self.get_all_achievements()
-            completed_count = len([ua for ua in user.achievements if ua.is_completed])
-            return completed_count >= len(all_achievements)
-        
-        elif condition_type == "holiday_artifact":
-            # Проверяем получение артефакта в праздничный день
-            from datetime import datetime
-            now = datetime.utcnow()
-            # Простая проверка на праздники (1 января, 8 марта, 9 мая и т.д.)
-            holidays = [(1, 1), (3, 8), (5, 9), (12, 31)]
-            is_holiday = (now.month, now.day) in holidays
-            return is_holiday and user.artifact_cards_received >= condition_value
-        
-        elif condition_type == "first_card_ever":
-            # Проверяем, получил ли пользователь первую карточку в системе
-            from services.user_service import user_service
-            all_users = await user_service.get_all_users()
-            # Сортируем по дате создания и проверяем, был ли этот пользователь первым
-            sorted_users = sorted(all_users, key=lambda u: u.created_at)
-            return sorted_users[0].telegram_id == user.telegram_id
-        
-        elif condition_type == "cards_per_day":
-            return user.cards_received_today >= condition_value
-        
-        elif condition_type == "night_cards":
-            return user.night_cards_count >= condition_value
-        
-        elif condition_type == "morning_cards":
-            return user.morning_cards_count >= condition_value
-        
-        elif condition_type == "all_hours_cards":
-            return user.get_unique_hours_count() >= condition_value
-        
-        elif condition_type == "card_streak":
-            return user.card_streak >= condition_value
-        
-        elif condition_type == "total_days_played":
-            return user.total_days_played >= condition_value
-        
-        elif condition_type == "artifact_collection":
-            return user.artifact_cards_received >= condition_value
-        
-        elif condition_type == "coins_spent":
-            return user.total_coins_spent >= condition_value
-        
-        elif condition_type == "cards_sold":
-            return user.cards_sold_count >= condition_value
-        
-        elif condition_type == "selling_profit":
-            return user.selling_profit >= condition_value
-        
-        elif condition_type == "duplicate_cards":
-            # Проверяем максимальное количество дубликатов одной карточки
-            max_duplicates = max([card.quantity for card in user.cards], default=0)
-            return max_duplicates >= condition_value
-        
-        elif condition_type == "all_rarities":
-            # Проверяем наличие карточек всех редкостей
-            from services.card_service import card_service
-            rarities = ["common", "rare", "epic", "legendary", "artifact"]
-            user_rarities = set()
-            
-            for user_card in user.cards:
-                if user_card.quantity > 0:
-                    card = await card_service.get_card_by_id(user_card.card_id)
-                    if card:
-                        user_rarities.add(card.rarity.lower())
+    async def _record_earned(self, achievements: List[Achievement], telegram_id: int) -> None:
+        """Обновление статистики полученных достижений одним bulk_write"""
+        now = datetime.utcnow()
+        operations = []
+        for achievement in achievements:
+            operations.append(UpdateOne(
+                {"_id": achievement.id},
+                {"$inc": {"total_earned": 1}, "$set": {"updated_at": now}}
+            ))
+            operations.append(UpdateOne(
+                {"_id": achievement.id, "first_earned_by": None},
+                {"$set": {"first_earned_by": telegram_id, "first_earned_at": now}}
+            ))
             
-            return len(user_rarities) >= len(rarities)
-        
-        elif condition_type == "complete_collection":
-            # Проверяем полную коллекцию
-            from services.card_service import card_service
-            all_cards = await card_service.get_all_cards()
-            user_card_ids = {card.card_id for card in user.cards if card.quantity > 0}
-            return len(user_card_ids) >= len(all_cards)
-        
-        elif condition_type == "giveaway_participation":
-            return user.giveaway_participation >= condition_value
+            # Статистика в кэше, чтобы не перечитывать достижения
+            achievement.total_earned += 1
+            if achievement.first_earned_by is None:
+                achievement.first_earned_by = telegram_id
+                achievement.first_earned_at = now
         
-        elif condition_type == "giveaway_wins":
-            return user.giveaway_wins >= condition_value
-        
-        elif condition_type == "secret_card":
-            # Проверяем получение скрытой карточки (пока заглушка)
-            return False
-        
-        # Дополнительные условия можно добавить здесь
-        return False
+        try:
+            collection = await self.get_collection()
+            await collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Error updating achievement stats: {e}")
     
     async def get_all_achievements(self) -> List[Achievement]:
         """Получает все активные достижения"""
-        collection = await self.get_collection()
-        achievements_data = await collection.find({"is_active": True}).to_list(length=None)
-        return [Achievement(**data) for data in achievements_data]
+        await self.get_rules()
+        return [achievement.model_copy() for achievement in self._achievements]
     
     async def get_achievement_by_id(self, achievement_id: str) -> Optional[Achievement]:
         """Получает достижение по ID"""
@@ -1116,11 +1100,27 @@ class AchievementService:
             collection = await self.get_collection()
             achievement.updated_at = datetime.utcnow()
             
-            result = await collection.update_one(
+            previous = await collection.find_one_and_update(
                 {"_id": achievement.id},
-                {"$set": achievement.dict(by_alias=True, exclude={"id"})}
+                {"$set": achievement.dict(by_alias=True, exclude={"id"})},
+                projection={"condition_type": 1, "condition_value": 1, "condition_data": 1, "is_active": 1}
+            )
+            # Определение могло измениться - правила перекомпилируются при следующей проверке
+            self.invalidate_rules()
+            if previous is None:
+                return False
+            
+            # Новое условие могло выполниться у уже существующих игроков - выдаем задним числом
+            condition_changed = (
+                previous.get("condition_type") != achievement.condition_type
+                or previous.get("condition_value") != achievement.condition_value
+                or (previous.get("condition_data") or {}) != (achievement.condition_data or {})
+                or not previous.get("is_active", True)
             )
-            return result.modified_count > 0
+            if achievement.is_active and condition_changed:
+                from services.achievement_backfill import achievement_backfill_service
+                await achievement_backfill_service.start([str(achievement.id)])
+            return True
         except Exception as e:
             logger.error(f"Error updating achievement: {e}")
             return False
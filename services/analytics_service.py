@@ -19,68 +19,83 @@ class AnalyticsService:
             self.stats_collection = db.get_collection("analytics_stats")
         return self.stats_collection
     
+    @staticmethod
+    def _display_name(row: Dict[str, Any]) -> str:
+        return row.get("first_name") or f"User{row.get('telegram_id')}"
+    
     async def get_general_stats(self) -> Dict[str, Any]:
         """Получает общую статистику бота"""
         try:
-            # Получаем всех пользователей
-            all_users = await user_service.get_all_users()
-            total_users = len(all_users)
+            collection = await user_service.get_collection()
+            week_ago = datetime.utcnow() - timedelta(days=7)
             
-            if total_users == 0:
+            def top(field: str) -> Dict[str, Any]:
+                return {"$topN": {
+                    "n": 5,
+                    "sortBy": {field: -1},
+                    "output": {"telegram_id": "$telegram_id", "first_name": "$first_name", "value": f"${field}"}
+                }}
+            
+            pipeline = [
+                # Только нужные поля, без массивов карточек и достижений
+                {"$project": {
+                    "_id": 0,
+                    "telegram_id": 1,
+                    "first_name": 1,
+                    "last_activity": 1,
+                    "created_at": 1,
+                    "level": {"$ifNull": ["$level", 1]},
+                    "coins": {"$ifNull": ["$coins", 600]},
+                    "experience": {"$ifNull": ["$experience", 0]},
+                    "total_cards": {"$ifNull": ["$total_cards", 0]}
+                }},
+                {"$facet": {
+                    "totals": [{"$group": {
+                        "_id": None,
+                        "total": {"$sum": 1},
+                        "active_7d": {"$sum": {"$cond": [{"$gt": ["$last_activity", week_ago]}, 1, 0]}},
+                        "new_7d": {"$sum": {"$cond": [{"$gt": ["$created_at", week_ago]}, 1, 0]}},
+                        "total_coins": {"$sum": "$coins"},
+                        "total_experience": {"$sum": "$experience"},
+                        "total_cards": {"$sum": "$total_cards"},
+                        "by_cards": top("total_cards"),
+                        "by_level": top("level"),
+                        "by_coins": top("coins")
+                    }}],
+                    "levels": [{"$group": {"_id": "$level", "count": {"$sum": 1}}}]
+                }}
+            ]
+            
+            result = await collection.aggregate(pipeline, allowDiskUse=True).to_list(1)
+            totals = result[0]["totals"] if result else []
+            if not totals:
                 return self._empty_stats()
             
-            # Активные пользователи (заходили за последние 7 дней)
-            week_ago = datetime.utcnow() - timedelta(days=7)
-            active_users = [u for u in all_users if u.last_activity and u.last_activity > week_ago]
-            active_count = len(active_users)
-            
-            # Новые пользователи (зарегистрированы за последние 7 дней)
-            new_users = [u for u in all_users if u.created_at > week_ago]
-            new_count = len(new_users)
-            
-            # Статистика по уровням
-            level_stats = {}
-            for user in all_users:
-                level = user.level
-                level_stats[level] = level_stats.get(level, 0) + 1
-            
-            # Экономическая статистика
-            total_coins = sum(u.coins for u in all_users)
-            total_experience = sum(u.experience for u in all_users)
-            avg_coins = total_coins / total_users if total_users > 0 else 0
-            avg_experience = total_experience / total_users if total_users > 0 else 0
-            
-            # Статистика карточек
-            total_cards_owned = sum(u.total_cards for u in all_users)
-            avg_cards = total_cards_owned / total_users if total_users > 0 else 0
-            
-            # Топ пользователи
-            top_by_cards = sorted(all_users, key=lambda x: x.total_cards, reverse=True)[:5]
-            top_by_level = sorted(all_users, key=lambda x: x.level, reverse=True)[:5]
-            top_by_coins = sorted(all_users, key=lambda x: x.coins, reverse=True)[:5]
+            totals = totals[0]
+            total_users = totals["total"]
+            level_stats = {item["_id"]: item["count"] for item in result[0]["levels"]}
             
             return {
                 "users": {
                     "total": total_users,
-                    "active_7d": active_count,
-                    "new_7d": new_count,
-                    "active_percentage": round((active_count / total_users) * 100, 1),
+                    "active_7d": totals["active_7d"],
+                    "new_7d": totals["new_7d"],
+                    "active_percentage": round((totals["active_7d"] / total_users) * 100, 1),
                     "level_distribution": level_stats
                 },
                 "economy": {
-                    "total_coins": total_coins,
-                    "total_experience": total_experience,
-                    "avg_coins": round(avg_coins, 1),
-                    "avg_experience": round(avg_experience, 1)
+                    "total_coins": totals["total_coins"],
+                    "total_experience": totals["total_experience"],
+                    "avg_coins": round(totals["total_coins"] / total_users, 1),
+                    "avg_experience": round(totals["total_experience"] / total_users, 1)
                 },
                 "cards": {
-                    "total_owned": total_cards_owned,
-                    "avg_per_user": round(avg_cards, 1)
+                    "total_owned": totals["total_cards"],
+                    "avg_per_user": round(totals["total_cards"] / total_users, 1)
                 },
                 "top_users": {
-                    "by_cards": [{"name": u.first_name or f"User{u.telegram_id}", "value": u.total_cards} for u in top_by_cards],
-                    "by_level": [{"name": u.first_name or f"User{u.telegram_id}", "value": u.level} for u in top_by_level],
-                    "by_coins": [{"name": u.first_name or f"User{u.telegram_id}", "value": u.coins} for u in top_by_coins]
+                    key: [{"name": self._display_name(row), "value": row["value"]} for row in totals[key]]
+                    for key in ("by_cards", "by_level", "by_coins")
                 }
             }
             
@@ -139,46 +154,54 @@ class AnalyticsService:
     async def get_activity_stats(self, days: int = 30) -> Dict[str, Any]:
         """Получает статистику активности за период"""
         try:
-            all_users = await user_service.get_all_users()
+            collection = await user_service.get_collection()
+            now = datetime.utcnow()
+            window_start = (now - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            
+            def per_day(field: str) -> List[Dict[str, Any]]:
+                return [
+                    {"$match": {field: {"$gte": window_start}}},
+                    {"$group": {
+                        "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": f"${field}"}},
+                        "count": {"$sum": 1}
+                    }}
+                ]
             
-            if not all_users:
+            pipeline = [
+                {"$project": {"_id": 0, "last_activity": 1, "created_at": 1}},
+                {"$facet": {
+                    "daily_active": per_day("last_activity"),
+                    "registrations": per_day("created_at"),
+                    "retention": [{"$group": {
+                        "_id": None,
+                        "total": {"$sum": 1},
+                        "7d": {"$sum": {"$cond": [{"$gt": ["$last_activity", now - timedelta(days=7)]}, 1, 0]}},
+                        "30d": {"$sum": {"$cond": [{"$gt": ["$last_activity", now - timedelta(days=30)]}, 1, 0]}}
+                    }}]
+                }}
+            ]
+            
+            result = await collection.aggregate(pipeline, allowDiskUse=True).to_list(1)
+            if not result or not result[0]["retention"]:
                 return {"daily_active": [], "registrations": [], "retention": {}}
             
-            # Статистика по дням за последние N дней
-            daily_stats = {}
-            registration_stats = {}
-            
-            for i in range(days):
-                date = datetime.utcnow() - timedelta(days=i)
-                date_key = date.strftime("%Y-%m-%d")
-                daily_stats[date_key] = 0
-                registration_stats[date_key] = 0
-            
-            # Считаем активных пользователей по дням
-            for user in all_users:
-                if user.last_activity:
-                    activity_date = user.last_activity.strftime("%Y-%m-%d")
-                    if activity_date in daily_stats:
-                        daily_stats[activity_date] += 1
-                
-                reg_date = user.created_at.strftime("%Y-%m-%d")
-                if reg_date in registration_stats:
-                    registration_stats[reg_date] += 1
+            facets = result[0]
+            retention = facets["retention"][0]
+            total_users = retention["total"]
             
-            # Retention анализ
-            retention_7d = len([u for u in all_users if u.last_activity and 
-                               u.last_activity > datetime.utcnow() - timedelta(days=7)])
-            retention_30d = len([u for u in all_users if u.last_activity and 
-                                u.last_activity > datetime.utcnow() - timedelta(days=30)])
+            # Статистика по дням за последние N дней (включая дни без активности)
+            date_keys = [(now - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+            daily_stats = {item["_id"]: item["count"] for item in facets["daily_active"]}
+            registration_stats = {item["_id"]: item["count"] for item in facets["registrations"]}
             
             return {
-                "daily_active": [{"date": date, "count": count} for date, count in daily_stats.items()],
-                "registrations": [{"date": date, "count": count} for date, count in registration_stats.items()],
+                "daily_active": [{"date": date, "count": daily_stats.get(date, 0)} for date in date_keys],
+                "registrations": [{"date": date, "count": registration_stats.get(date, 0)} for date in date_keys],
                 "retention": {
-                    "7d": retention_7d,
-                    "30d": retention_30d,
-                    "7d_percentage": round((retention_7d / len(all_users)) * 100, 1) if all_users else 0,
-                    "30d_percentage": round((retention_30d / len(all_users)) * 100, 1) if all_users else 0
+                    "7d": retention["7d"],
+                    "30d": retention["30d"],
+                    "7d_percentage": round((retention["7d"] / total_users) * 100, 1),
+                    "30d_percentage": round((retention["30d"] / total_users) * 100, 1)
                 }
             }
             
@@ -192,41 +215,73 @@ class AnalyticsService:
             from services.achievement_service import achievement_service
             
             all_achievements = await achievement_service.get_all_achievements()
-            all_users = await user_service.get_all_users()
+            collection = await user_service.get_collection()
+            
+            pipeline = [
+                # Только поля, нужные обеим веткам: сортировка топа не тянет карточки
+                {"$project": {
+                    "_id": 0,
+                    "telegram_id": 1,
+                    "first_name": 1,
+                    "achievement_points": 1,
+                    "achievements.is_completed": 1
+                }},
+                {"$facet": {
+                    "totals": [{"$group": {
+                        "_id": None,
+                        "total": {"$sum": 1},
+                        "total_points": {"$sum": {"$ifNull": ["$achievement_points", 0]}}
+                    }}],
+                    # Топ по очкам достижений
+                    "top_achievers": [
+                        {"$sort": {"achievement_points": -1}},
+                        {"$limit": 10},
+                        {"$project": {
+                            "_id": 0,
+                            "telegram_id": 1,
+                            "first_name": 1,
+                            "points": {"$ifNull": ["$achievement_points", 0]},
+                            "completed": {"$size": {"$filter": {
+                                "input": {"$ifNull": ["$achievements", []]},
+                                "cond": "$$this.is_completed"
+                            }}}
+                        }}
+                    ]
+                }}
+            ]
+            
+            result = await collection.aggregate(pipeline, allowDiskUse=True).to_list(1)
+            totals = result[0]["totals"] if result else []
             
-            if not all_achievements or not all_users:
+            if not all_achievements or not totals:
                 return {"total_achievements": 0, "completion_stats": {}}
             
+            total_users = totals[0]["total"]
+            total_points = totals[0]["total_points"]
+            
             # Статистика по достижениям
             achievement_stats = {}
             for achievement in all_achievements:
                 achievement_stats[achievement.name] = {
                     "total_earned": achievement.total_earned,
-                    "completion_rate": round((achievement.total_earned / len(all_users)) * 100, 1),
+                    "completion_rate": round((achievement.total_earned / total_users) * 100, 1),
                     "category": achievement.category,
                     "difficulty": achievement.difficulty,
                     "points": achievement.points
                 }
             
-            # Статистика по пользователям
-            total_points = sum(u.achievement_points for u in all_users)
-            avg_points = total_points / len(all_users) if all_users else 0
-            
-            # Топ по очкам достижений
-            top_achievers = sorted(all_users, key=lambda x: x.achievement_points, reverse=True)[:10]
-            
             return {
                 "total_achievements": len(all_achievements),
                 "achievements": achievement_stats,
                 "user_stats": {
                     "total_points": total_points,
-                    "avg_points": round(avg_points, 1),
+                    "avg_points": round(total_points / total_users, 1),
                     "top_achievers": [
                         {
-                            "name": u.first_name or f"User{u.telegram_id}",
-                            "points": u.achievement_points,
-                            "completed": len([a for a in u.achievements if a.is_completed])
-                        } for u in top_achievers
+                            "name": self._display_name(row),
+                            "points": row["points"],
+                            "completed": row["completed"]
+                        } for row in result[0]["top_achievers"]
                     ]
                 }
             }
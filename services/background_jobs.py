@@ -0,0 +1,42 @@
+import asyncio
+from typing import Awaitable, Set
+from loguru import logger
+
+
+class BackgroundJobs:
+    """
+    Долгие действия администратора (рассылки, массовые раздачи) в фоне.
+    Хэндлер только запускает задачу и сразу отвечает: апдейты одного пользователя
+    обрабатываются по очереди (UpdateScheduler), и рассылка на десятки тысяч
+    игроков внутри хэндлера держала бы очередь администратора и слот обработки
+    до своего завершения. Итог задача сообщает администратору сама
+    """
+    
+    def __init__(self):
+        self._tasks: Set[asyncio.Task] = set()
+    
+    def start(self, name: str, job: Awaitable) -> None:
+        """Запуск задачи в фоне; ошибки логируются"""
+        task = asyncio.create_task(self._run(name, job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, name: str, job: Awaitable) -> None:
+        try:
+            await job
+        except asyncio.CancelledError:
+            logger.warning(f"Background job {name} was cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Error in background job {name}: {e}")
+    
+    async def stop(self) -> None:
+        """Отмена незавершенных задач (рассылки продолжатся по своим заданиям в БД)"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Глобальный экземпляр фоновых задач
+background_jobs = BackgroundJobs()
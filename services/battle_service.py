@@ -4,109 +4,82 @@ from typing import List, Optional, Tuple
 from loguru import logger
 
 from models.user import User, BattleDeck
-from models.card import Mob
-from database.connection import db
+from models.card import Mob, RARITY_POWER_RANGES
+from services.mob_table import MobTable
 
 
 class BattleService:
     """Сервис для управления боями с мобами"""
     
     def __init__(self):
-        self.mobs_data = self._generate_mobs()
+        # До загрузки из БД используется сгенерированная таблица той же версии
+        self.mob_table = MobTable.generate()
     
-    def _generate_mobs(self) -> List[Mob]:
-        """Генерирует список мобов для всех 50 уровней"""
-        mobs = []
-        
-        # Список имен мобов
-        mob_names = [
-            "Гоблин", "Орк", "Тролль", "Дракон", "Демон", "Вампир", "Оборотень", "Зомби",
-            "Скелет", "Призрак", "Элементаль", "Гигант", "Циклоп", "Минотавр", "Химера",
-            "Гарпия", "Кентавр", "Пегас", "Единорог", "Феникс", "Грифон", "Василиск",
-            "Кракен", "Левиафан", "Бегемот", "Кракен", "Медуза", "Сирена", "Русалка",
-            "Тритон", "Нереида", "Океанид", "Наяда", "Дриада", "Нимфа", "Фея", "Эльф",
-            "Дварф", "Халфлинг", "Гном", "Кобольд", "Гнолл", "Бугай", "Огр", "Эттин",
-            "Фомор", "Титан", "Бог", "Архидемон", "Древний", "Примитив"
-        ]
-        
-        for level in range(1, 51):
-            # Вычисляем силу моба на основе уровня (экспоненциальный рост)
-            if level <= 30:
-                base_power = int(level * 80 + (level ** 1.5) * 10) + random.randint(-30, 30)
-            else:
-                # Увеличиваем силу для уровней 30-50
-                base_power = int(level * 120 + (level ** 2) * 15) + random.randint(-50, 50)
-            
-            # Определяем сложность
-            if level <= 10:
-                difficulty = "easy"
-                power_multiplier = 0.7
-            elif level <= 25:
-                difficulty = "normal"
-                power_multiplier = 1.0
-            elif level <= 40:
-                difficulty = "hard"
-                power_multiplier = 1.6
-            else:
-                difficulty = "boss"
-                power_multiplier = 2.5
-            
-            power = int(base_power * power_multiplier)
-            health = power * 2
-            
-            # Награды
-            exp_reward = level * 2 + random.randint(5, 15)
-            coin_reward = level + random.randint(1, 5)
-            
-            mob = Mob(
-                name=f"{mob_names[level-1]} Уровня {level}",
-                description=f"Могучий {mob_names[level-1].lower()} {level} уровня",
-                level=level,
-                power=power,
-                health=health,
-                experience_reward=exp_reward,
-                coin_reward=coin_reward,
-                difficulty=difficulty
+    @property
+    def mobs_data(self) -> List[Mob]:
+        """Все мобы таблицы по уровням"""
+        return [self.mob_table.get(level) for level in range(1, len(self.mob_table) + 1)]
+    
+    async def load_mob_table(self) -> None:
+        """
+        Загрузка таблицы мобов текущей версии из БД.
+        Если ее еще нет, сохраняется сгенерированная - все процессы используют одну таблицу
+        """
+        try:
+            from database.connection import db
+            collection = db.get_collection("mob_tables")
+            generated = MobTable.generate()
+            await collection.update_one(
+                {"_id": generated.version},
+                {"$setOnInsert": generated.to_document()},
+                upsert=True
             )
-            mobs.append(mob)
-        
-        return mobs
+            document = await collection.find_one({"_id": generated.version})
+            self.mob_table = MobTable.from_document(document)
+            logger.info(f"Mob table v{self.mob_table.version} loaded: {len(self.mob_table)} mobs")
+            
+        except Exception as e:
+            logger.error(f"Error loading mob table, using generated one: {e}")
     
     async def get_mob_by_level(self, level: int) -> Optional[Mob]:
         """Получает моба по уровню"""
-        if 1 <= level <= 50:
-            return self.mobs_data[level - 1]
-        return None
+        return self.mob_table.get(level)
     
     def calculate_card_power(self, card_rarity: str) -> int:
-        """Вычисляет силу карточки по её редкости"""
-        power_map = {
-            "common": random.randint(100, 300),
-            "rare": random.randint(400, 800),
-            "epic": random.randint(1000, 2000),
-            "legendary": random.randint(2500, 5000),
-            "artifact": random.randint(6000, 12000)
-        }
-        return power_map.get(card_rarity, 200)
+        """Случайная сила карточки из диапазона её редкости"""
+        if card_rarity not in RARITY_POWER_RANGES:
+            return 200
+        return random.randint(*RARITY_POWER_RANGES[card_rarity])
     
     async def get_user_deck_power(self, user: User) -> int:
-        """Вычисляет общую силу колоды пользователя"""
-        total_power = 0
-        
-        for card_id in user.battle_deck.card_ids:
-            # Находим карточку в коллекции пользователя
-            user_card = next((c for c in user.cards if c.card_id == card_id), None)
-            if user_card:
-                # Получаем информацию о карточке из базы
-                from bson import ObjectId
-                try:
-                    card_info = await db.cards.find_one({"_id": ObjectId(card_id)})
-                    if card_info:
-                        rarity = card_info.get("rarity", "common")
-                        total_power += self.calculate_card_power(rarity)
-                except:
-                    # Если не удалось найти карточку, используем базовую силу
-                    total_power += self.calculate_card_power("common")
+        """
+        Вычисляет общую силу колоды пользователя.
+        Сила хранится в колоде и пересчитывается только при изменении набора карт
+        """
+        deck = user.battle_deck
+        owned_card_ids = [card_id for card_id in deck.card_ids if user.get_card_count(card_id) > 0]
+        
+        cached_power = deck.get_cached_power(owned_card_ids)
+        if cached_power is not None:
+            return cached_power
+        
+        from services.card_service import card_service
+        cards = await card_service.get_cards_by_ids(owned_card_ids)
+        total_power = sum(cards[card_id].get_base_power() for card_id in owned_card_ids if card_id in cards)
+        
+        deck.power = total_power
+        deck.power_card_ids = owned_card_ids
+        
+        try:
+            # Сохраняем кэш, только если колода не поменялась параллельно
+            from services.user_service import user_service
+            collection = await user_service.get_collection()
+            await collection.update_one(
+                {"telegram_id": user.telegram_id, "battle_deck.card_ids": deck.card_ids},
+                {"$set": {"battle_deck.power": total_power, "battle_deck.power_card_ids": owned_card_ids}}
+            )
+        except Exception as e:
+            logger.error(f"Error saving deck power for user {user.telegram_id}: {e}")
         
         return total_power
     
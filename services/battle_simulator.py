@@ -0,0 +1,106 @@
+import itertools
+from typing import Optional, List, Tuple, Sequence
+
+import numpy as np
+
+from models.card import Mob, RARITY_POWER_RANGES
+
+
+RARITIES = ("common", "rare", "epic", "legendary", "artifact")
+DECK_SIZE = 5
+BATTLES_PER_HOUR = 1  # Кулдаун боя - 1 час (User.can_battle)
+
+
+class BattleSimulator:
+    """
+    Векторный Монте-Карло симулятор боев для балансировки мобов.
+    Повторяет BattleService: сила карты берется из диапазона ее редкости
+    (как calculate_card_power / Card.get_base_power), бой - сравнение бросков
+    в пределах ±20% силы колоды и моба (_simulate_battle).
+    Все бои одного моба против всех составов колод считаются одним массивом.
+    """
+    
+    def __init__(self, mobs: List[Mob], samples: int = 20000, seed: Optional[int] = None):
+        self.mobs = mobs
+        self.samples = samples
+        self.rng = np.random.default_rng(seed)
+        
+        self.mob_power = np.array([mob.power for mob in mobs], dtype=np.int64)
+        self.mob_experience = np.array([mob.experience_reward for mob in mobs], dtype=np.float64)
+        self.mob_coins = np.array([mob.coin_reward for mob in mobs], dtype=np.float64)
+        
+        # Все составы колоды по редкостям: индексы редкостей карт, (составы, DECK_SIZE)
+        self.compositions = np.array(
+            list(itertools.combinations_with_replacement(range(len(RARITIES)), DECK_SIZE)),
+            dtype=np.int64
+        )
+        self._power_low = np.array([RARITY_POWER_RANGES[rarity][0] for rarity in RARITIES], dtype=np.int64)
+        self._power_high = np.array([RARITY_POWER_RANGES[rarity][1] for rarity in RARITIES], dtype=np.int64)
+    
+    def composition_label(self, index: int) -> str:
+        """Подпись состава, например '3 common + 2 epic'"""
+        counts = np.bincount(self.compositions[index], minlength=len(RARITIES))
+        return " + ".join(f"{count} {RARITIES[r]}" for r, count in enumerate(counts) if count)
+    
+    def find_composition(self, rarities: Sequence[str]) -> int:
+        """Индекс состава по списку редкостей карт"""
+        target = sorted(RARITIES.index(rarity) for rarity in rarities)
+        matches = np.where((self.compositions == target).all(axis=1))[0]
+        return int(matches[0])
+    
+    def _roll(self, power: np.ndarray) -> np.ndarray:
+        """Бросок randint(int(power * 0.8), int(power * 1.2)) для массива сил"""
+        low = np.floor(power * 0.8).astype(np.int64)
+        high = np.floor(power * 1.2).astype(np.int64)
+        return self.rng.integers(low, high + 1)
+    
+    def sample_deck_power(self) -> np.ndarray:
+        """Силы колод: (составы, samples), каждая карта - случайная карта своей редкости"""
+        low = self._power_low[self.compositions][:, :, None]
+        high = self._power_high[self.compositions][:, :, None]
+        card_power = self.rng.integers(
+            low, high + 1, size=(len(self.compositions), DECK_SIZE, self.samples)
+        )
+        return card_power.sum(axis=1)
+    
+    def win_probabilities(self, mob_power_scale: float = 1.0) -> np.ndarray:
+        """Вероятность победы: (составы, мобы)"""
+        result = np.empty((len(self.compositions), len(self.mobs)))
+        
+        for mob_index, power in enumerate(self.mob_power * mob_power_scale):
+            deck_roll = self._roll(self.sample_deck_power())
+            mob_roll = self._roll(np.full(deck_roll.shape, int(power), dtype=np.int64))
+            result[:, mob_index] = (deck_roll >= mob_roll).mean(axis=1)
+        
+        return result
+    
+    def hourly_income(self, win_probability: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ожидаемые опыт и монеты в час: (составы, уровень прогресса).
+        На уровне L игрок выбирает самого выгодного моба из уровней 1..L
+        """
+        experience = np.maximum.accumulate(win_probability * self.mob_experience, axis=1)
+        coins = np.maximum.accumulate(win_probability * self.mob_coins, axis=1)
+        return experience * BATTLES_PER_HOUR, coins * BATTLES_PER_HOUR
+    
+    def progression_hours(self, win_probability: np.ndarray) -> np.ndarray:
+        """
+        Ожидаемое время (часы) до открытия каждого уровня: (составы, мобы).
+        Победа над мобом текущего уровня открывает следующий, число попыток
+        геометрическое - в среднем 1 / p
+        """
+        with np.errstate(divide="ignore"):
+            attempts = np.where(win_probability > 0, 1.0 / win_probability, np.inf)
+        hours = np.zeros_like(attempts)
+        hours[:, 1:] = np.cumsum(attempts[:, :-1], axis=1) / BATTLES_PER_HOUR
+        return hours
+    
+    def levels_reached(self, win_probability: np.ndarray, hours: float) -> np.ndarray:
+        """Уровень прогресса, ожидаемо достигнутый за hours часов: (составы,)"""
+        return (self.progression_hours(win_probability) <= hours).sum(axis=1)
+    
+    def sweep_mob_power(self, scales: Sequence[float], hours: float) -> np.ndarray:
+        """Достигнутый за hours часов уровень для каждого множителя силы мобов: (множители, составы)"""
+        return np.stack([
+            self.levels_reached(self.win_probabilities(scale), hours) for scale in scales
+        ])
@@ -0,0 +1,331 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError
+from aiogram.types import InlineKeyboardMarkup
+from motor.motor_asyncio import AsyncIOMotorCollection
+from loguru import logger
+
+from database.connection import db
+from services.user_service import user_service
+from services.job_lease import JobLease, LEASE_DURATION, claim_expired, lease_fields
+from config import settings
+
+
+class TokenBucket:
+    """Ведро токенов: не больше rate отправок в секунду с запасом capacity"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    def pause(self, seconds: float) -> None:
+        """Остановка всех отправок (после RetryAfter от Telegram)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+    
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ChatRateLimiter:
+    """Минимальный интервал между сообщениями в один чат"""
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_allowed: Dict[int, float] = {}
+    
+    async def wait(self, chat_id: int) -> None:
+        now = time.monotonic()
+        next_allowed = self._next_allowed.get(chat_id, 0.0)
+        if next_allowed > now:
+            await asyncio.sleep(next_allowed - now)
+            now = next_allowed
+        self._next_allowed[chat_id] = now + self.interval
+        
+        # Не держим в памяти чаты, интервал которых уже истек
+        if len(self._next_allowed) > 10000:
+            self._next_allowed = {cid: t for cid, t in self._next_allowed.items() if t > now}
+
+
+class BroadcastService:
+    """
+    Массовые рассылки с ограничением скорости под лимиты Telegram.
+    Задание рассылки хранится в БД вместе с курсором (последний обработанный
+    telegram_id), поэтому после перезапуска бота рассылка продолжается с места остановки.
+    Задание выполняет только процесс, держащий его аренду (owner / lease_until):
+    другие процессы подхватывают его, лишь когда аренда истекла.
+    """
+    
+    # Telegram: ~30 сообщений в секунду всего и ~1 в секунду в один чат
+    GLOBAL_RATE = 25
+    CHAT_INTERVAL = 1.0
+    MAX_CONCURRENCY = 10
+    BATCH_SIZE = 500
+    MAX_RETRIES = 3
+    
+    def __init__(self):
+        self.bot: Optional[Bot] = None
+        self.collection: AsyncIOMotorCollection = None
+        self._bucket = TokenBucket(self.GLOBAL_RATE, self.GLOBAL_RATE)
+        self._chat_limiter = ChatRateLimiter(self.CHAT_INTERVAL)
+        self._semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+        self._tasks: Dict[Any, asyncio.Task] = {}
+        self._watch_task: Optional[asyncio.Task] = None
+    
+    def set_bot(self, bot: Bot):
+        """Устанавливает экземпляр бота"""
+        self.bot = bot
+    
+    async def get_collection(self) -> AsyncIOMotorCollection:
+        if self.collection is None:
+            self.collection = db.get_collection("broadcast_jobs")
+        return self.collection
+    
+    async def broadcast(self, kind: str, text: str, reply_markup: InlineKeyboardMarkup = None,
+                        parse_mode: str = None, audience: str = "subscribed",
+                        mark_card_notification: bool = False,
+                        filter: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Создает задание рассылки и дожидается его завершения.
+        audience: "subscribed" - с включенными уведомлениями, "all" - все, "admins" - администраторы;
+        filter - дополнительное условие на получателей (запрос к коллекции пользователей).
+        Возвращает итоговое задание со счетчиками sent / failed / blocked
+        """
+        job = await self._create_job(kind, text, reply_markup, parse_mode, audience, mark_card_notification, filter)
+        # shield: отмена хэндлера не должна прерывать саму рассылку
+        return await asyncio.shield(self._start(job))
+    
+    async def start_broadcast(self, kind: str, text: str, reply_markup: InlineKeyboardMarkup = None,
+                              parse_mode: str = None, audience: str = "subscribed",
+                              mark_card_notification: bool = False,
+                              filter: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Как broadcast, но не дожидается завершения рассылки. Возвращает созданное задание"""
+        job = await self._create_job(kind, text, reply_markup, parse_mode, audience, mark_card_notification, filter)
+        self._start(job)
+        return job
+    
+    async def _create_job(self, kind: str, text: str, reply_markup: Optional[InlineKeyboardMarkup],
+                          parse_mode: Optional[str], audience: str, mark_card_notification: bool,
+                          filter: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        job = {
+            "kind": kind,
+            "text": text,
+            "reply_markup": reply_markup.model_dump(exclude_none=True) if reply_markup else None,
+            "parse_mode": parse_mode,
+            "audience": audience,
+            "filter": filter,
+            "mark_card_notification": mark_card_notification,
+            "status": "running",
+            "cursor": None,
+            "sent": 0,
+            "failed": 0,
+            "blocked": 0,
+            "created_at": now,
+            "updated_at": now,
+            **lease_fields()
+        }
+        
+        collection = await self.get_collection()
+        result = await collection.insert_one(job)
+        job["_id"] = result.inserted_id
+        return job
+    
+    async def resume_pending(self) -> int:
+        """
+        Возобновляет незавершенные рассылки с истекшей арендой и запускает
+        периодическую проверку заданий, брошенных другими процессами
+        """
+        resumed = await self._claim_expired()
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch_expired())
+        return resumed
+    
+    async def stop(self) -> None:
+        """Остановка рассылок этого процесса; их аренда освобождается для других процессов"""
+        tasks = [task for task in (self._watch_task, *self._tasks.values()) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._watch_task = None
+    
+    async def _claim_expired(self) -> int:
+        try:
+            collection = await self.get_collection()
+            resumed = 0
+            while True:
+                job = await claim_expired(collection)
+                if job is None:
+                    return resumed
+                
+                logger.info(f"Resuming broadcast {job['_id']} ({job['kind']}) after telegram_id {job.get('cursor')}")
+                self._tasks[job["_id"]] = asyncio.create_task(self._run_job(job))
+                resumed += 1
+        
+        except Exception as e:
+            logger.error(f"Error resuming broadcasts: {e}")
+            return 0
+    
+    async def _watch_expired(self) -> None:
+        while True:
+            await asyncio.sleep(LEASE_DURATION)
+            await self._claim_expired()
+    
+    def _start(self, job: Dict[str, Any]) -> asyncio.Task:
+        task = asyncio.create_task(self._run_job(job))
+        self._tasks[job["_id"]] = task
+        return task
+    
+    def _audience_filter(self, audience: str) -> Dict[str, Any]:
+        if audience == "all":
+            return {}
+        if audience == "admins":
+            return {"telegram_id": {"$in": settings.admin_ids}}
+        return {"notifications_enabled": {"$ne": False}}
+    
+    async def _run_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        collection = await self.get_collection()
+        lease = JobLease(collection, job["_id"])
+        lease.start()
+        try:
+            if not self.bot:
+                logger.error("Bot instance not set for broadcast")
+                return job
+            
+            users_collection = await user_service.get_collection()
+            audience_filter = self._audience_filter(job["audience"])
+            if job.get("filter"):
+                audience_filter = {"$and": [audience_filter, job["filter"]]}
+            markup = InlineKeyboardMarkup.model_validate(job["reply_markup"]) if job.get("reply_markup") else None
+            
+            while not lease.lost:
+                query = audience_filter
+                if job.get("cursor") is not None:
+                    query = {"$and": [audience_filter, {"telegram_id": {"$gt": job["cursor"]}}]}
+                
+                recipients = await users_collection.find(
+                    query, {"_id": 0, "telegram_id": 1}
+                ).sort("telegram_id", 1).limit(self.BATCH_SIZE).to_list(self.BATCH_SIZE)
+                
+                if not recipients:
+                    break
+                
+                chat_ids = [recipient["telegram_id"] for recipient in recipients]
+                statuses = await asyncio.gather(*(self._deliver(chat_id, job, markup) for chat_id in chat_ids))
+                
+                sent_ids = [chat_id for chat_id, status in zip(chat_ids, statuses) if status == "sent"]
+                blocked_ids = [chat_id for chat_id, status in zip(chat_ids, statuses) if status == "blocked"]
+                failed_count = len(chat_ids) - len(sent_ids) - len(blocked_ids)
+                
+                await self._apply_recipient_updates(job, sent_ids, blocked_ids)
+                
+                # Сохраняем курсор - после перезапуска продолжим со следующей пачки
+                job["cursor"] = chat_ids[-1]
+                job["sent"] += len(sent_ids)
+                job["blocked"] += len(blocked_ids)
+                job["failed"] += failed_count
+                result = await collection.update_one(
+                    lease.filter,
+                    {
+                        "$set": {"cursor": job["cursor"], "updated_at": datetime.utcnow()},
+                        "$inc": {"sent": len(sent_ids), "blocked": len(blocked_ids), "failed": failed_count}
+                    }
+                )
+                if result.matched_count == 0:
+                    lease.lost = True
+            
+            if lease.lost:
+                # Задание продолжит процесс, забравший аренду
+                logger.warning(f"Broadcast {job['_id']} was taken over by another process")
+                return job
+            
+            job["status"] = "completed"
+            await collection.update_one(
+                lease.filter,
+                {"$set": {"status": "completed", "updated_at": datetime.utcnow()}}
+            )
+            logger.info(
+                f"Broadcast {job['_id']} ({job['kind']}) completed: "
+                f"sent {job['sent']}, blocked {job['blocked']}, failed {job['failed']}"
+            )
+            return job
+        
+        except Exception as e:
+            logger.error(f"Error running broadcast {job.get('_id')}: {e}")
+            return job
+        
+        finally:
+            await lease.stop(release=True)
+            self._tasks.pop(job.get("_id"), None)
+    
+    async def _deliver(self, chat_id: int, job: Dict[str, Any], markup: Optional[InlineKeyboardMarkup]) -> str:
+        """Отправка одного сообщения. Возвращает "sent", "blocked" или "failed" """
+        kwargs = {"parse_mode": job["parse_mode"]} if job.get("parse_mode") else {}
+        
+        async with self._semaphore:
+            for _ in range(self.MAX_RETRIES + 1):
+                await self._chat_limiter.wait(chat_id)
+                await self._bucket.acquire()
+                try:
+                    await self.bot.send_message(chat_id=chat_id, text=job["text"], reply_markup=markup, **kwargs)
+                    return "sent"
+                
+                except TelegramRetryAfter as e:
+                    logger.warning(f"Flood limit hit, pausing broadcasts for {e.retry_after}s")
+                    self._bucket.pause(e.retry_after)
+                
+                except TelegramForbiddenError:
+                    return "blocked"
+                
+                except Exception as e:
+                    logger.error(f"Failed to broadcast to user {chat_id}: {e}")
+                    if "bot was blocked" in str(e).lower():
+                        return "blocked"
+                    return "failed"
+        
+        return "failed"
+    
+    async def _apply_recipient_updates(self, job: Dict[str, Any], sent_ids: List[int],
+                                       blocked_ids: List[int]) -> None:
+        """Пакетное обновление статусов получателей"""
+        try:
+            users_collection = await user_service.get_collection()
+            now = datetime.utcnow()
+            
+            if job.get("mark_card_notification") and sent_ids:
+                await users_collection.update_many(
+                    {"telegram_id": {"$in": sent_ids}},
+                    {"$set": {"last_card_notification": now, "updated_at": now}}
+                )
+            
+            # Пользователи, заблокировавшие бота, больше не получают уведомления
+            if blocked_ids:
+                await users_collection.update_many(
+                    {"telegram_id": {"$in": blocked_ids}},
+                    {"$set": {"notifications_enabled": False, "updated_at": now}}
+                )
+        
+        except Exception as e:
+            logger.error(f"Error updating broadcast recipients: {e}")
+
+
+# Глобальный экземпляр сервиса
+broadcast_service = BroadcastService()
@@ -0,0 +1,129 @@
+import random
+from typing import Optional, List, Dict, Tuple, Union
+
+from models.card import Card
+from config import settings
+
+
+# Распределения редкостей для паков (веса в процентах)
+PACK_DISTRIBUTIONS: Dict[str, Dict[str, float]] = {
+    # Базовый пак - только Common и Rare
+    "basic": {"common": 80, "rare": 20},
+    # Обычные усиленные паки
+    "boosted": {"common": 40, "rare": 25, "epic": 20, "legendary": 13, "artifact": 2},
+    # Ультра пак - еще больше шансов на редкие
+    "ultra": {"common": 20, "rare": 25, "epic": 30, "legendary": 23, "artifact": 2},
+    # Особая раздача редких карточек администратором
+    "rare_giveaway": {"epic": 50, "legendary": 35, "artifact": 15},
+}
+
+Distribution = Union[str, Dict[str, float]]
+
+
+class AliasTable:
+    """Таблица Уолкера для выборки из дискретного распределения за O(1)"""
+    
+    __slots__ = ("keys", "prob", "alias")
+    
+    def __init__(self, weights: Dict[str, float]):
+        self.keys: List[str] = [key for key, weight in weights.items() if weight > 0]
+        size = len(self.keys)
+        self.prob: List[float] = [1.0] * size
+        self.alias: List[int] = list(range(size))
+        
+        if size == 0:
+            return
+        
+        total = sum(weights[key] for key in self.keys)
+        scaled = [weights[key] * size / total for key in self.keys]
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+        
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        
+        # Остатки из-за погрешности округления получают вероятность 1
+        for i in small + large:
+            self.prob[i] = 1.0
+    
+    def __bool__(self) -> bool:
+        return bool(self.keys)
+    
+    def sample(self, rng=random) -> str:
+        """Случайный ключ с учетом весов"""
+        i = int(rng.random() * len(self.keys))
+        if rng.random() < self.prob[i]:
+            return self.keys[i]
+        return self.keys[self.alias[i]]
+
+
+class CardSampler:
+    """
+    Выборка случайных карточек по распределению редкостей без запросов к БД.
+    Массивы карточек по редкостям берутся из каталога и перестраиваются
+    только когда меняется его версия.
+    """
+    
+    def __init__(self, catalog, rng=random):
+        self.catalog = catalog
+        self.rng = rng
+        self._version: Optional[int] = None
+        self._cards_by_rarity: Dict[str, List[Card]] = {}
+        self._tables: Dict[Tuple, AliasTable] = {}
+    
+    def _refresh(self) -> None:
+        """Перестроение массивов, если каталог изменился"""
+        if self._version == self.catalog.version:
+            return
+        self._cards_by_rarity = {
+            rarity: list(cards) for rarity, cards in self.catalog.by_rarity.items() if cards
+        }
+        self._tables = {}
+        self._version = self.catalog.version
+    
+    @staticmethod
+    def resolve(distribution: Distribution) -> Dict[str, float]:
+        if isinstance(distribution, dict):
+            return distribution
+        if distribution == "global":
+            return {rarity: info["probability"] for rarity, info in settings.rarities.items()}
+        if distribution in PACK_DISTRIBUTIONS:
+            return PACK_DISTRIBUTIONS[distribution]
+        raise ValueError(f"Unknown rarity distribution: {distribution}")
+    
+    def _table(self, distribution: Distribution) -> AliasTable:
+        key = tuple(sorted(distribution.items())) if isinstance(distribution, dict) else (distribution,)
+        table = self._tables.get(key)
+        if table is None:
+            # Редкости без карточек исключаются, веса остальных нормируются
+            weights = {
+                rarity: weight for rarity, weight in self.resolve(distribution).items()
+                if rarity in self._cards_by_rarity
+            }
+            table = AliasTable(weights)
+            self._tables[key] = table
+        return table
+    
+    def draw_rarity(self, n: int = 1, distribution: Distribution = "global") -> List[str]:
+        """Выборка n редкостей по распределению"""
+        self._refresh()
+        table = self._table(distribution)
+        if not table:
+            return []
+        return [table.sample(self.rng) for _ in range(n)]
+    
+    def draw(self, n: int = 1, distribution: Distribution = "global") -> List[Card]:
+        """Выборка n карточек: редкость по распределению, карточка равновероятно внутри редкости"""
+        cards = []
+        for rarity in self.draw_rarity(n, distribution):
+            pool = self._cards_by_rarity[rarity]
+            cards.append(pool[int(self.rng.random() * len(pool))].model_copy())
+        return cards
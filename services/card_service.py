@@ -1,18 +1,89 @@
+import asyncio
 import random
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import OperationFailure, PyMongoError
 from loguru import logger
 
 from database.connection import db
 from models.card import Card, CardStats
+from services.card_sampler import CardSampler, Distribution
+from services.card_stats import CardStatsAccumulator
+from services.unit_of_work import UnitOfWork
 from config import settings
 
 
+class CardCatalog:
+    """Кэш каталога активных карточек в памяти процесса с индексами по ID, имени и редкости"""
+    
+    def __init__(self):
+        self.by_id: Dict[str, Card] = {}
+        self.by_name: Dict[str, Card] = {}
+        self.by_rarity: Dict[str, List[Card]] = {}
+        self.loaded = False
+        self.version = 0  # Увеличивается при каждом изменении каталога
+    
+    def load(self, cards: List[Card]) -> None:
+        """Полная перезагрузка каталога"""
+        self.by_id = {}
+        self.by_name = {}
+        self.by_rarity = {}
+        for card in cards:
+            if card.is_active:
+                self._index(card)
+        self.loaded = True
+        self.version += 1
+    
+    def clear(self) -> None:
+        """Сброс каталога - следующие запросы пойдут в БД до перезагрузки"""
+        self.by_id = {}
+        self.by_name = {}
+        self.by_rarity = {}
+        self.loaded = False
+        self.version += 1
+    
+    def put(self, card: Card) -> None:
+        """Добавление или замена карточки в каталоге"""
+        self._unindex(str(card.id))
+        if card.is_active:
+            self._index(card)
+        self.version += 1
+    
+    def remove(self, card_id: str) -> None:
+        """Удаление карточки из каталога"""
+        self._unindex(card_id)
+        self.version += 1
+    
+    def _index(self, card: Card) -> None:
+        self.by_id[str(card.id)] = card
+        self.by_name[card.name] = card
+        self.by_rarity.setdefault(card.rarity, []).append(card)
+    
+    def _unindex(self, card_id: str) -> None:
+        card = self.by_id.pop(card_id, None)
+        if card is None:
+            return
+        if self.by_name.get(card.name) is card:
+            del self.by_name[card.name]
+        rarity_cards = self.by_rarity.get(card.rarity, [])
+        self.by_rarity[card.rarity] = [c for c in rarity_cards if c is not card]
+
+
 class CardService:
+    WATCH_RETRY_MIN = 1.0  # Секунд до первого переподключения change stream
+    WATCH_RETRY_MAX = 60.0
+    # Период перечитывания каталога, если change streams не поддерживаются (standalone MongoDB)
+    CATALOG_REFRESH_INTERVAL = 300.0
+    CHANGE_STREAMS_UNSUPPORTED = 40573  # Код ошибки "only supported on replica sets"
+    
     def __init__(self):
         self.collection: AsyncIOMotorCollection = None
         self.stats_collection: AsyncIOMotorCollection = None
+        self.catalog = CardCatalog()
+        self.sampler = CardSampler(self.catalog)
+        self.stats = CardStatsAccumulator(self.get_collection)
+        self._watch_task: Optional[asyncio.Task] = None
     
     async def get_collection(self) -> AsyncIOMotorCollection:
         if self.collection is None:
@@ -24,6 +95,104 @@ class CardService:
             self.stats_collection = db.get_collection("card_stats")
         return self.stats_collection
     
+    async def load_catalog(self) -> None:
+        """Загрузка всех активных карточек в кэш каталога"""
+        try:
+            collection = await self.get_collection()
+            cards = []
+            async for card_data in collection.find({"is_active": True}):
+                cards.append(Card(**card_data))
+            
+            self.catalog.load(cards)
+            logger.info(f"Card catalog loaded: {len(self.catalog.by_id)} cards")
+            
+        except Exception as e:
+            self.catalog.clear()
+            logger.error(f"Error loading card catalog: {e}")
+    
+    def start_catalog_watch(self) -> None:
+        """Запуск фоновой синхронизации каталога (change stream или периодическое перечитывание)"""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch_catalog())
+    
+    async def stop_catalog_watch(self) -> None:
+        """Остановка фоновой синхронизации каталога"""
+        if self._watch_task and not self._watch_task.done():
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+        self._watch_task = None
+    
+    async def _watch_catalog(self) -> None:
+        """
+        Применение изменений коллекции карточек из других процессов к каталогу.
+        Поток перезапускается с нарастающей задержкой после любого сбоя или закрытия;
+        после переподключения каталог перечитывается целиком, чтобы не потерять
+        изменения, пропущенные без подписки. Если сервер не поддерживает change
+        streams (standalone без replica set), каталог перечитывается раз в
+        CATALOG_REFRESH_INTERVAL. Задача завершается только отменой
+        """
+        delay = self.WATCH_RETRY_MIN
+        restarted = False
+        
+        while True:
+            try:
+                collection = await self.get_collection()
+                async with collection.watch(full_document="updateLookup") as stream:
+                    logger.info("Card catalog is following the cards change stream")
+                    delay = self.WATCH_RETRY_MIN
+                    if restarted:
+                        # Подписка уже открыта: изменения во время перечитывания не потеряются
+                        await self.load_catalog()
+                    async for change in stream:
+                        self._apply_change(change)
+                
+                # Поток закрыт (invalidate) - переподключаемся
+                logger.warning("Card catalog change stream closed, reconnecting")
+            
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code == self.CHANGE_STREAMS_UNSUPPORTED:
+                    logger.info(
+                        f"Change streams are not supported by MongoDB, card catalog "
+                        f"will be reloaded every {self.CATALOG_REFRESH_INTERVAL:.0f}s"
+                    )
+                    await self._refresh_catalog()
+                    return
+                logger.warning(f"Card catalog change stream unavailable, retrying in {delay}s: {e}")
+            except PyMongoError as e:
+                logger.warning(f"Card catalog change stream unavailable, retrying in {delay}s: {e}")
+            except Exception as e:
+                logger.error(f"Card catalog change stream stopped, retrying in {delay}s: {e}")
+            
+            restarted = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.WATCH_RETRY_MAX)
+    
+    async def _refresh_catalog(self) -> None:
+        """Периодическое перечитывание каталога вместо change stream"""
+        while True:
+            await asyncio.sleep(self.CATALOG_REFRESH_INTERVAL)
+            await self.load_catalog()
+    
+    def _apply_change(self, change: Dict[str, Any]) -> None:
+        """Применение одного события change stream к каталогу"""
+        operation = change.get("operationType")
+        
+        if operation in ("insert", "update", "replace"):
+            card_data = change.get("fullDocument")
+            if card_data:
+                self.catalog.put(Card(**card_data))
+            else:
+                self.catalog.remove(str(change["documentKey"]["_id"]))
+        elif operation == "delete":
+            self.catalog.remove(str(change["documentKey"]["_id"]))
+        elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+            self.catalog.clear()
+    
     async def create_card(self, name: str, description: str, rarity: str,
                          image_url: str = None, gif_url: str = None, 
                          video_url: str = None, tags: List[str] = None,
@@ -44,6 +213,7 @@ class CardService:
             collection = await self.get_collection()
             result = await collection.insert_one(card.dict(by_alias=True, exclude={"id"}))
             card.id = result.inserted_id
+            self.catalog.put(card.model_copy())
             
             logger.info(f"Created new card: {name} ({rarity})")
             return card
@@ -54,6 +224,10 @@ class CardService:
     
     async def get_card_by_name(self, name: str) -> Optional[Card]:
         """Получение карточки по имени"""
+        if self.catalog.loaded:
+            card = self.catalog.by_name.get(name)
+            return card.model_copy() if card else None
+        
         try:
             collection = await self.get_collection()
             card_data = await collection.find_one({"name": name, "is_active": True})
@@ -68,6 +242,10 @@ class CardService:
     
     async def get_card_by_id(self, card_id: str) -> Optional[Card]:
         """Получение карточки по ID"""
+        if self.catalog.loaded:
+            card = self.catalog.by_id.get(str(card_id))
+            return card.model_copy() if card else None
+        
         try:
             from bson import ObjectId
             collection = await self.get_collection()
@@ -92,8 +270,50 @@ class CardService:
             logger.error(f"Error getting card by ID {card_id}: {e}")
             return None
     
+    async def get_cards_by_ids(self, card_ids: List[str]) -> Dict[str, Card]:
+        """Карточки по списку ID одним запросом: {card_id: Card}"""
+        if self.catalog.loaded:
+            return {
+                card_id: self.catalog.by_id[card_id].model_copy()
+                for card_id in card_ids if card_id in self.catalog.by_id
+            }
+        
+        try:
+            from bson import ObjectId
+            collection = await self.get_collection()
+            object_ids = [ObjectId(card_id) for card_id in set(card_ids) if ObjectId.is_valid(card_id)]
+            cursor = collection.find({"_id": {"$in": object_ids}, "is_active": True})
+            return {str(card_data["_id"]): Card(**card_data) async for card_data in cursor}
+            
+        except Exception as e:
+            logger.error(f"Error getting cards by ids: {e}")
+            return {}
+    
+    async def get_card_rarities(self, card_ids: List[str]) -> Dict[str, str]:
+        """Редкости карточек по списку ID одним запросом: {card_id: rarity}"""
+        if self.catalog.loaded:
+            return {
+                card_id: self.catalog.by_id[card_id].rarity
+                for card_id in card_ids if card_id in self.catalog.by_id
+            }
+        
+        try:
+            from bson import ObjectId
+            collection = await self.get_collection()
+            object_ids = [ObjectId(card_id) for card_id in set(card_ids) if ObjectId.is_valid(card_id)]
+            cursor = collection.find({"_id": {"$in": object_ids}, "is_active": True}, {"rarity": 1})
+            return {str(card_data["_id"]): card_data["rarity"] async for card_data in cursor}
+            
+        except Exception as e:
+            logger.error(f"Error getting card rarities: {e}")
+            return {}
+    
     async def get_all_cards(self, include_inactive: bool = False) -> List[Card]:
         """Получение всех карточек"""
+        if self.catalog.loaded and not include_inactive:
+            cards = sorted(self.catalog.by_id.values(), key=lambda c: c.name)
+            return [card.model_copy() for card in cards]
+        
         try:
             collection = await self.get_collection()
             
@@ -112,6 +332,9 @@ class CardService:
     
     async def get_cards_by_rarity(self, rarity: str) -> List[Card]:
         """Получение карточек по редкости"""
+        if self.catalog.loaded:
+            return [card.model_copy() for card in self.catalog.by_rarity.get(rarity, [])]
+        
         try:
             collection = await self.get_collection()
             cursor = collection.find({"rarity": rarity, "is_active": True})
@@ -136,6 +359,7 @@ class CardService:
                 {"_id": card.id},
                 {"$set": card.dict(by_alias=True, exclude={"id"})}
             )
+            self.catalog.put(card.model_copy())
             
             return result.modified_count > 0
             
@@ -151,6 +375,9 @@ class CardService:
                 {"name": card_name},
                 {"$set": {"is_active": False, "updated_at": datetime.utcnow()}}
             )
+            card = self.catalog.by_name.get(card_name)
+            if card:
+                self.catalog.remove(str(card.id))
             
             return result.modified_count > 0
             
@@ -160,6 +387,10 @@ class CardService:
     
     async def get_random_card_by_rarity(self, rarity: str) -> Optional[Card]:
         """Получение случайной карточки определенной редкости"""
+        if self.catalog.loaded:
+            cards = self.catalog.by_rarity.get(rarity)
+            return random.choice(cards).model_copy() if cards else None
+        
         cards = await self.get_cards_by_rarity(rarity)
         if cards:
             return random.choice(cards)
@@ -168,6 +399,10 @@ class CardService:
     async def get_random_card(self) -> Optional[Card]:
         """Получение случайной карточки с учетом вероятностей"""
         try:
+            if self.catalog.loaded:
+                cards = self.sampler.draw(1)
+                return cards[0] if cards else None
+            
             # Генерируем случайное число
             rand = random.uniform(0, 100)
             cumulative_prob = 0
@@ -187,26 +422,114 @@ class CardService:
             logger.error(f"Error getting random card: {e}")
             return None
     
+    async def draw_cards(self, count: int, distribution: Distribution = "global") -> List[Card]:
+        """
+        Выборка нескольких случайных карточек по распределению редкостей.
+        distribution - имя распределения ("global", "basic", "boosted", "ultra")
+        или словарь весов {редкость: вес}
+        """
+        try:
+            if self.catalog.loaded:
+                return self.sampler.draw(count, distribution)
+            
+            # Каталог недоступен - выбираем редкость локально, карточку из БД
+            weights = self.sampler.resolve(distribution)
+            rarities = random.choices(list(weights.keys()), weights=list(weights.values()), k=count)
+            cards = []
+            for rarity in rarities:
+                card = await self.get_random_card_by_rarity(rarity)
+                if card:
+                    cards.append(card)
+            return cards
+            
+        except Exception as e:
+            logger.error(f"Error drawing {count} cards from {distribution}: {e}")
+            return []
+    
     async def update_card_stats(self, card_name: str, user_count_change: int = 0,
                                owner_count_change: int = 0) -> None:
-        """Обновление статистики карточки"""
+        """Обновление статистики карточки (запись в БД происходит пакетно)"""
+        unit_of_work = UnitOfWork.current()
+        if unit_of_work:
+            unit_of_work.add_card_stats(card_name, user_count_change, owner_count_change)
+            return
+        
+        self.record_card_stats(card_name, user_count_change, owner_count_change)
+        if not self.stats.is_running:
+            # Без фонового сброса (скрипты, миграции) пишем сразу
+            await self.stats.flush()
+    
+    def record_card_stats(self, card_name: str, user_count_change: int = 0,
+                          owner_count_change: int = 0) -> None:
+        """Добавление изменения статистики в накопитель и в каталог"""
+        card = self.catalog.by_name.get(card_name)
+        self.stats.add(card.id if card else card_name, user_count_change, owner_count_change)
+        self.apply_catalog_stats(card_name, user_count_change, owner_count_change)
+    
+    async def reconcile_card_stats(self) -> int:
+        """
+        Пересчет total_owned / unique_owners всех карточек по коллекции пользователей.
+        Возвращает количество обновленных карточек
+        """
         try:
-            collection = await self.get_collection()
-            update_operations = {"$set": {"updated_at": datetime.utcnow()}}
+            from pymongo import UpdateOne
+            from services.user_service import user_service
             
-            if user_count_change != 0 or owner_count_change != 0:
-                update_operations["$inc"] = {}
-                
-                if user_count_change != 0:
-                    update_operations["$inc"]["total_owned"] = user_count_change
+            # Сначала записываем накопленные инкременты, иначе они применятся поверх пересчета
+            await self.stats.flush()
+            
+            users_collection = await user_service.get_collection()
+            pipeline = [
+                {"$project": {"cards.card_id": 1, "cards.quantity": 1}},
+                {"$unwind": "$cards"},
+                {"$match": {"cards.quantity": {"$gt": 0}}},
+                {"$group": {
+                    "_id": {"card_id": "$cards.card_id", "user": "$_id"},
+                    "quantity": {"$sum": "$cards.quantity"}
+                }},
+                {"$group": {
+                    "_id": "$_id.card_id",
+                    "total_owned": {"$sum": "$quantity"},
+                    "unique_owners": {"$sum": 1}
+                }}
+            ]
+            
+            counters = {}
+            async for item in users_collection.aggregate(pipeline, allowDiskUse=True):
+                counters[item["_id"]] = (item["total_owned"], item["unique_owners"])
+            
+            collection = await self.get_collection()
+            now = datetime.utcnow()
+            operations = []
+            async for card_data in collection.find({}, {"_id": 1, "name": 1}):
+                total_owned, unique_owners = counters.get(str(card_data["_id"]), (0, 0))
+                operations.append(UpdateOne(
+                    {"_id": card_data["_id"]},
+                    {"$set": {"total_owned": total_owned, "unique_owners": unique_owners, "updated_at": now}}
+                ))
                 
-                if owner_count_change != 0:
-                    update_operations["$inc"]["unique_owners"] = owner_count_change
+                card = self.catalog.by_id.get(str(card_data["_id"]))
+                if card:
+                    card.total_owned = total_owned
+                    card.unique_owners = unique_owners
             
-            await collection.update_one({"name": card_name}, update_operations)
+            if operations:
+                await collection.bulk_write(operations, ordered=False)
+            
+            logger.info(f"Reconciled card stats for {len(operations)} cards")
+            return len(operations)
             
         except Exception as e:
-            logger.error(f"Error updating card stats for {card_name}: {e}")
+            logger.error(f"Error reconciling card stats: {e}")
+            return 0
+    
+    def apply_catalog_stats(self, card_name: str, user_count_change: int = 0,
+                            owner_count_change: int = 0) -> None:
+        """Держит счетчики в каталоге в актуальном состоянии без перезагрузки"""
+        card = self.catalog.by_name.get(card_name)
+        if card:
+            card.total_owned += user_count_change
+            card.unique_owners += owner_count_change
     
     async def update_card(self, card: Card) -> bool:
         """Обновление карточки в базе данных"""
@@ -222,6 +545,8 @@ class CardService:
                 {"$set": card_data}
             )
             
+            self.catalog.put(card.model_copy())
+            
             if result.modified_count > 0:
                 logger.info(f"Card '{card.name}' updated successfully")
                 return True
@@ -322,18 +647,20 @@ class CardService:
             
             collection = await self.get_collection()
             
-            # Удаляем карточку у всех пользователей
+            # Удаляем карточку у всех владельцев одним запросом на стороне БД
             from services.user_service import user_service
-            users = await user_service.get_all_users()
-            
-            for user in users:
-                # Удаляем карточку из коллекции пользователя
-                user.cards = [user_card for user_card in user.cards 
-                             if user_card.card_id != str(card.id)]
-                await user_service.update_user(user)
+            users_collection = await user_service.get_collection()
+            await users_collection.update_many(
+                {"cards.card_id": str(card.id)},
+                {
+                    "$pull": {"cards": {"card_id": str(card.id)}},
+                    "$set": {"updated_at": datetime.utcnow()}
+                }
+            )
             
             # Удаляем саму карточку из БД
             result = await collection.delete_one({"name": card_name})
+            self.catalog.remove(str(card.id))
             
             if result.deleted_count > 0:
                 logger.info(f"Card '{card_name}' deleted successfully")
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime
+from typing import Optional, List, Dict, Union
+from bson import ObjectId
+from pymongo import UpdateOne
+from loguru import logger
+
+
+CardKey = Union[ObjectId, str]
+
+
+class CardStatsAccumulator:
+    """
+    Накопитель изменений total_owned / unique_owners карточек.
+    Инкременты складываются в памяти и периодически сбрасываются в БД
+    одним bulk_write с $inc по _id карточки (или по имени, если ID неизвестен).
+    """
+    
+    def __init__(self, get_collection, flush_interval: float = 30.0):
+        self._get_collection = get_collection
+        self.flush_interval = flush_interval
+        self.pending: Dict[CardKey, List[int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+    
+    @property
+    def is_running(self) -> bool:
+        """Запущен ли периодический сброс"""
+        return self._task is not None and not self._task.done()
+    
+    def add(self, key: CardKey, user_count_change: int = 0, owner_count_change: int = 0) -> None:
+        """Добавление изменения статистики карточки"""
+        if not user_count_change and not owner_count_change:
+            return
+        stats = self.pending.setdefault(key, [0, 0])
+        stats[0] += user_count_change
+        stats[1] += owner_count_change
+    
+    @staticmethod
+    def _build_operations(pending: Dict[CardKey, List[int]]) -> List[UpdateOne]:
+        now = datetime.utcnow()
+        operations = []
+        for key, (user_count_change, owner_count_change) in pending.items():
+            inc = {}
+            if user_count_change:
+                inc["total_owned"] = user_count_change
+            if owner_count_change:
+                inc["unique_owners"] = owner_count_change
+            if not inc:
+                continue
+            card_filter = {"_id": key} if isinstance(key, ObjectId) else {"name": key}
+            operations.append(UpdateOne(card_filter, {"$inc": inc, "$set": {"updated_at": now}}))
+        return operations
+    
+    async def flush(self) -> int:
+        """Запись накопленных изменений. Возвращает количество обновленных карточек"""
+        async with self._lock:
+            if not self.pending:
+                return 0
+            
+            pending, self.pending = self.pending, {}
+            operations = self._build_operations(pending)
+            if not operations:
+                return 0
+            
+            try:
+                collection = await self._get_collection()
+                await collection.bulk_write(operations, ordered=False)
+                logger.debug(f"Flushed card stats for {len(operations)} cards")
+                return len(operations)
+            
+            except Exception as e:
+                # Возвращаем изменения обратно, чтобы не потерять их
+                for key, (user_count_change, owner_count_change) in pending.items():
+                    self.add(key, user_count_change, owner_count_change)
+                logger.error(f"Error flushing card stats: {e}")
+                return 0
+    
+    def start(self) -> None:
+        """Запуск периодического сброса"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Остановка периодического сброса с финальной записью"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self.flush()
+    
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
@@ -4,6 +4,7 @@ from loguru import logger
 
 from models.user import User
 from services.user_service import user_service
+from services.achievement_rules import EVENT_COINS
 
 
 class EasterEggService:
@@ -49,6 +50,13 @@ class EasterEggService:
             # Сохраняем изменения
             await user_service.update_user(user)
             
+            # Пасхалка меняет только монеты - перепроверяем только зависящие от них достижения
+            try:
+                from handlers.achievement_handlers import check_and_notify_achievements
+                await check_and_notify_achievements(user, None, [EVENT_COINS])
+            except Exception as achievement_error:
+                logger.error(f"Error checking achievements after easter egg: {achievement_error}")
+            
             return True, f"🎉 **Пасхалка активирована!**\n\n💰 Получено: {coins} монет\n📝 {description}", coins
             
         except Exception as e:
@@ -0,0 +1,231 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime, timedelta
+from typing import Optional, List, Tuple, Set
+from bson import ObjectId
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from loguru import logger
+
+from models.event import Event
+from services.event_service import event_service
+
+
+BOUNDARY_START = "start"
+BOUNDARY_END = "end"
+BOUNDARY_ARCHIVE = "archive"
+
+# Запись кучи: (момент срабатывания, порядковый номер, тип границы, ID ивента)
+HeapEntry = Tuple[datetime, int, str, str]
+
+
+class EventScheduler:
+    """
+    Планировщик границ ивентов.
+    Начала, окончания и моменты архивации всех ивентов лежат в min-куче, фоновая
+    задача спит до ближайшей границы и обрабатывает ее: на старте ивент становится
+    видимым и анонсируется, на окончании выключается, а через ARCHIVE_GRACE после
+    окончания прогресс участников переносится в архивную коллекцию.
+    Записи кучи не удаляются при изменении ивента - перед обработкой состояние
+    ивента перечитывается из БД, устаревшие записи просто пропускаются.
+    """
+    
+    ARCHIVE_GRACE = timedelta(days=7)  # Время на получение наград после окончания
+    ANNOUNCE_WINDOW = timedelta(hours=1)  # Анонсируются только недавно начавшиеся ивенты
+    RELOAD_INTERVAL = 600.0  # Перечитывание ивентов (созданных другими процессами)
+    
+    def __init__(self):
+        self._heap: List[HeapEntry] = []
+        self._counter = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._announcements: Set[asyncio.Task] = set()
+    
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def start(self) -> None:
+        """Запуск планировщика"""
+        if not self.is_running:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """Остановка планировщика"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+    
+    def _push(self, when: datetime, kind: str, event_id: str) -> None:
+        heapq.heappush(self._heap, (when, next(self._counter), kind, event_id))
+    
+    def schedule(self, event: Event) -> None:
+        """Добавление границ ивента (после создания или изменения)"""
+        event_id = str(event.id)
+        if event.is_archived:
+            return
+        
+        if not event.is_announced:
+            self._push(event.start_date, BOUNDARY_START, event_id)
+        if event.is_active:
+            self._push(event.end_date, BOUNDARY_END, event_id)
+        self._push(event.end_date + self.ARCHIVE_GRACE, BOUNDARY_ARCHIVE, event_id)
+        
+        if self._wake is not None:
+            self._wake.set()
+    
+    async def reload(self) -> int:
+        """Перестроение кучи по всем неархивированным ивентам"""
+        try:
+            collection = await event_service.get_events_collection()
+            events_data = await collection.find({"is_archived": {"$ne": True}}).to_list(length=None)
+            
+            self._heap = []
+            for data in events_data:
+                self.schedule(Event(**data))
+            
+            # Ивенты могли создать или изменить другие процессы
+            event_service.invalidate_active_events()
+            return len(events_data)
+        
+        except Exception as e:
+            logger.error(f"Error loading event boundaries: {e}")
+            return 0
+    
+    async def _run(self) -> None:
+        await self.reload()
+        next_reload = time.monotonic() + self.RELOAD_INTERVAL
+        
+        while True:
+            try:
+                now = datetime.utcnow()
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, kind, event_id = heapq.heappop(self._heap)
+                    await self._fire(kind, event_id)
+                
+                if time.monotonic() >= next_reload:
+                    await self.reload()
+                    next_reload = time.monotonic() + self.RELOAD_INTERVAL
+                    continue
+                
+                timeout = next_reload - time.monotonic()
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - datetime.utcnow()).total_seconds())
+                
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=max(timeout, 0))
+                except asyncio.TimeoutError:
+                    pass
+            
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in event scheduler: {e}")
+                await asyncio.sleep(5)
+    
+    async def _fire(self, kind: str, event_id: str) -> None:
+        """Обработка границы, если она еще актуальна для текущего состояния ивента"""
+        # Читаем напрямую из БД, минуя кэш активных ивентов
+        collection = await event_service.get_events_collection()
+        data = await collection.find_one({"_id": ObjectId(event_id)})
+        if not data:
+            return  # Ивент удален
+        event = Event(**data)
+        if event.is_archived:
+            return
+        
+        now = datetime.utcnow()
+        if kind == BOUNDARY_START and not event.is_announced and event.start_date <= now:
+            await self._on_start(event, now)
+        elif kind == BOUNDARY_END and event.is_active and event.end_date <= now:
+            await self._on_end(event)
+        elif kind == BOUNDARY_ARCHIVE and event.end_date + self.ARCHIVE_GRACE <= now:
+            await self._on_archive(event)
+    
+    async def _refresh_caches(self, event_id: str) -> None:
+        """Сброс и прогрев кэшей ивентов после смены состояния"""
+        event_service.invalidate_active_events()
+        event_service.invalidate_leaderboard(event_id)
+        await event_service.get_active_events()
+    
+    async def _on_start(self, event: Event, now: datetime) -> None:
+        collection = await event_service.get_events_collection()
+        result = await collection.update_one(
+            {"_id": event.id, "is_announced": {"$ne": True}},
+            {"$set": {"is_announced": True, "is_hidden": False}}
+        )
+        if not result.modified_count:
+            # Уже обработано другим процессом - сбрасываем только свои кэши
+            await self._refresh_caches(str(event.id))
+            return
+        
+        await self._refresh_caches(str(event.id))
+        logger.info(f"Event {event.name} ({event.id}) started")
+        
+        # После простоя бота старые старты не анонсируются
+        if now - event.start_date <= self.ANNOUNCE_WINDOW and event.end_date > now:
+            task = asyncio.create_task(self._announce(event))
+            self._announcements.add(task)
+            task.add_done_callback(self._announcements.discard)
+    
+    async def _announce(self, event: Event) -> None:
+        from services.broadcast_service import broadcast_service
+        
+        try:
+            text = (
+                f"{event.icon} **Начался ивент: {event.name}!**\n\n"
+                f"📝 {event.description}\n\n"
+                f"⏰ До {event.end_date.strftime('%d.%m.%Y %H:%M')} UTC"
+            )
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🎪 К ивентам", callback_data="events")]
+            ])
+            
+            job = await broadcast_service.broadcast("event_start", text, reply_markup=keyboard)
+            logger.info(f"Event {event.id} announced to {job['sent']} users")
+        
+        except Exception as e:
+            logger.error(f"Error announcing event {event.id}: {e}")
+    
+    async def _on_end(self, event: Event) -> None:
+        collection = await event_service.get_events_collection()
+        await collection.update_one({"_id": event.id}, {"$set": {"is_active": False}})
+        
+        await self._refresh_caches(str(event.id))
+        logger.info(f"Event {event.name} ({event.id}) ended: {event.total_completed} completed")
+    
+    async def _on_archive(self, event: Event) -> None:
+        """Перенос прогресса ивента в архив; повторный запуск безопасен"""
+        event_id = str(event.id)
+        progress_collection = await event_service.get_progress_collection()
+        
+        await progress_collection.aggregate([
+            {"$match": {"event_id": event_id}},
+            {"$merge": {
+                "into": "user_event_progress_archive",
+                "on": "_id",
+                "whenMatched": "keepExisting",
+                "whenNotMatched": "insert"
+            }}
+        ]).to_list(length=None)
+        result = await progress_collection.delete_many({"event_id": event_id})
+        
+        collection = await event_service.get_events_collection()
+        await collection.update_one(
+            {"_id": event.id},
+            {"$set": {"is_active": False, "is_archived": True, "archived_at": datetime.utcnow()}}
+        )
+        
+        event_service.invalidate_leaderboard(event_id)
+        logger.info(f"Event {event.name} ({event.id}) archived: {result.deleted_count} progress records")
+
+
+# Глобальный экземпляр планировщика
+event_scheduler = EventScheduler()
@@ -1,6 +1,9 @@
+import asyncio
+import time
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
 from loguru import logger
 
 from database.connection import db
@@ -11,9 +14,23 @@ from models.user import User
 class EventService:
     """Сервис для работы с ивентами"""
     
+    LEADERBOARD_SIZE = 50  # Сколько мест хранится в снапшоте топа
+    LEADERBOARD_TTL = 30.0  # Секунд до перестроения снапшота
+    BACKFILL_BATCH_SIZE = 1000  # Upsert'ов прогресса в одном bulk_write
+    # Предельное время жизни кэша активных ивентов: изменения, сделанные
+    # другими процессами, становятся видны не позже чем через него
+    ACTIVE_EVENTS_MAX_TTL = timedelta(seconds=60)
+    
     def __init__(self):
         self.events_collection: AsyncIOMotorCollection = None
         self.progress_collection: AsyncIOMotorCollection = None
+        # Кэш активных ивентов действует до ближайшего начала или окончания ивента,
+        # но не дольше ACTIVE_EVENTS_MAX_TTL
+        self._active_events: Optional[List[Event]] = None
+        self._active_events_expire_at: Optional[datetime] = None
+        # Снапшоты топов ивентов: event_id -> (время построения, записи)
+        self._leaderboards: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        self._leaderboard_locks: Dict[str, asyncio.Lock] = {}
     
     async def get_events_collection(self) -> AsyncIOMotorCollection:
         if self.events_collection is None:
@@ -33,6 +50,10 @@ class EventService:
             
             result = await collection.insert_one(event.model_dump(by_alias=True))
             event.id = result.inserted_id
+            self.invalidate_active_events()
+            
+            from services.event_scheduler import event_scheduler
+            event_scheduler.schedule(event)
             
             logger.info(f"Created event: {event.name}")
             return event
@@ -41,19 +62,41 @@ class EventService:
             logger.error(f"Error creating event: {e}")
             raise
     
+    def invalidate_active_events(self) -> None:
+        """Сброс кэша активных ивентов (после создания, изменения или удаления ивента)"""
+        self._active_events = None
+        self._active_events_expire_at = None
+    
+    def _active_events_fresh(self, now: datetime) -> bool:
+        return self._active_events is not None and now < self._active_events_expire_at
+    
     async def get_active_events(self) -> List[Event]:
         """Получает все активные ивенты"""
+        now = datetime.utcnow()
+        if self._active_events_fresh(now):
+            return [event.model_copy() for event in self._active_events]
+        
         try:
             collection = await self.get_events_collection()
-            now = datetime.utcnow()
             
             events_data = await collection.find({
                 "is_active": True,
                 "start_date": {"$lte": now},
                 "end_date": {"$gte": now}
             }).to_list(length=None)
+            events = [Event(**data) for data in events_data]
             
-            return [Event(**data) for data in events_data]
+            # Ближайшая граница: окончание активного или начало следующего ивента
+            next_start = await collection.find(
+                {"is_active": True, "start_date": {"$gt": now}}, {"start_date": 1}
+            ).sort("start_date", 1).limit(1).to_list(1)
+            boundaries = [event.end_date for event in events] + [now + self.ACTIVE_EVENTS_MAX_TTL]
+            if next_start:
+                boundaries.append(next_start[0]["start_date"])
+            
+            self._active_events = events
+            self._active_events_expire_at = min(boundaries)
+            return [event.model_copy() for event in events]
             
         except Exception as e:
             logger.error(f"Error getting active events: {e}")
@@ -72,6 +115,12 @@ class EventService:
     
     async def get_event_by_id(self, event_id: str) -> Optional[Event]:
         """Получает ивент по ID"""
+        # Активные ивенты отдаются из кэша, пока он не устарел
+        if self._active_events_fresh(datetime.utcnow()):
+            for event in self._active_events:
+                if str(event.id) == event_id:
+                    return event.model_copy()
+        
         try:
             from bson import ObjectId
             collection = await self.get_events_collection()
@@ -95,6 +144,10 @@ class EventService:
                 {"_id": event.id},
                 {"$set": event.model_dump(by_alias=True, exclude={"id"})}
             )
+            self.invalidate_active_events()
+            
+            from services.event_scheduler import event_scheduler
+            event_scheduler.schedule(event)
             
             return result.modified_count > 0
             
@@ -110,6 +163,9 @@ class EventService:
             
             if ObjectId.is_valid(event_id):
                 result = await collection.delete_one({"_id": ObjectId(event_id)})
+                self.invalidate_active_events()
+                self.invalidate_leaderboard(event_id)
+                self._leaderboard_locks.pop(event_id, None)
                 return result.deleted_count > 0
             return False
             
@@ -156,17 +212,33 @@ class EventService:
         """Проверяет прогресс пользователя во всех активных ивентах"""
         try:
             active_events = await self.get_active_events()
+            if not active_events:
+                return []
+            
+            # Весь прогресс пользователя по активным ивентам - одним запросом
+            collection = await self.get_progress_collection()
+            event_ids = [str(event.id) for event in active_events]
+            progress_by_event = {}
+            async for data in collection.find({"user_id": user.telegram_id, "event_id": {"$in": event_ids}}):
+                progress_by_event[data["event_id"]] = UserEventProgress(**data)
+            
+            # Гистограмма редкостей считается один раз на все ивенты
+            rarity_counts = None
+            if any(event.target_type == "card_rarity" for event in active_events):
+                rarity_counts = await self._get_rarity_counts(user)
+            
+            now = datetime.utcnow()
             completed_events = []
+            operations = []
             
             for event in active_events:
-                # Получаем текущий прогресс
-                progress = await self.get_user_event_progress(user.telegram_id, str(event.id))
+                progress = progress_by_event.get(str(event.id))
                 
                 if progress and progress.is_completed:
                     continue  # Уже завершен
                 
                 # Вычисляем новый прогресс
-                new_progress = await self._calculate_event_progress(user, event)
+                new_progress = self._calculate_event_progress(user, event, rarity_counts)
                 
                 if progress is None:
                     # Создаем новый прогресс
@@ -176,21 +248,39 @@ class EventService:
                         current_progress=new_progress,
                         target_progress=event.target_value
                     )
+                elif progress.current_progress == new_progress and new_progress < event.target_value:
+                    continue  # Ничего не изменилось
                 else:
                     progress.current_progress = new_progress
                 
                 # Проверяем завершение
                 if new_progress >= event.target_value and not progress.is_completed:
                     progress.is_completed = True
-                    progress.completed_at = datetime.utcnow()
+                    progress.completed_at = now
                     completed_events.append(event)
-                    
-                    # Обновляем статистику ивента
-                    event.total_completed += 1
-                    await self.update_event(event)
                 
-                # Сохраняем прогресс
-                await self.update_user_progress(progress)
+                progress.last_updated = now
+                operations.append(UpdateOne(
+                    {"user_id": progress.user_id, "event_id": progress.event_id},
+                    {"$set": progress.model_dump()},
+                    upsert=True
+                ))
+            
+            # Сохраняем прогресс одной операцией
+            if operations:
+                await collection.bulk_write(operations, ordered=False)
+            
+            # Обновляем статистику завершенных ивентов
+            if completed_events:
+                events_collection = await self.get_events_collection()
+                await events_collection.bulk_write([
+                    UpdateOne({"_id": event.id}, {"$inc": {"total_completed": 1}})
+                    for event in completed_events
+                ], ordered=False)
+                for event in completed_events:
+                    event.total_completed += 1
+                    # Завершение меняет порядок в топе - снапшот строится заново
+                    self.invalidate_leaderboard(str(event.id))
             
             return completed_events
             
@@ -198,23 +288,31 @@ class EventService:
             logger.error(f"Error checking user event progress: {e}")
             return []
     
-    async def _calculate_event_progress(self, user: User, event: Event) -> int:
+    async def _get_rarity_counts(self, user: User) -> Dict[str, int]:
+        """Количество карточек пользователя по редкостям"""
+        from services.card_service import card_service
+        
+        card_rarities = await card_service.get_card_rarities(
+            [user_card.card_id for user_card in user.cards if user_card.quantity > 0]
+        )
+        
+        rarity_counts: Dict[str, int] = {}
+        for user_card in user.cards:
+            rarity = card_rarities.get(user_card.card_id)
+            if rarity and user_card.quantity > 0:
+                rarity_counts[rarity.lower()] = rarity_counts.get(rarity.lower(), 0) + user_card.quantity
+        return rarity_counts
+    
+    def _calculate_event_progress(self, user: User, event: Event,
+                                  rarity_counts: Optional[Dict[str, int]] = None) -> int:
         """Вычисляет прогресс пользователя в ивенте"""
         try:
             if event.target_type == "total_cards":
                 return user.total_cards
             
             elif event.target_type == "card_rarity":
-                from services.card_service import card_service
                 target_rarity = event.target_data.get("rarity", "common").lower()
-                
-                count = 0
-                for user_card in user.cards:
-                    if user_card.quantity > 0:
-                        card = await card_service.get_card_by_id(user_card.card_id)
-                        if card and card.rarity.lower() == target_rarity:
-                            count += user_card.quantity
-                return count
+                return (rarity_counts or {}).get(target_rarity, 0)
             
             elif event.target_type == "specific_cards":
                 target_card_ids = event.target_data.get("card_ids", [])
@@ -237,6 +335,113 @@ class EventService:
             logger.error(f"Error calculating event progress: {e}")
             return 0
     
+    def _progress_expression(self, event: Event) -> Optional[Dict[str, Any]]:
+        """Выражение агрегации над документом пользователя, повторяющее _calculate_event_progress"""
+        # Отсутствующие поля получают значения по умолчанию модели User
+        defaults = User.model_fields
+        if event.target_type in ("total_cards", "level", "coins"):
+            return {"$ifNull": [f"${event.target_type}", defaults[event.target_type].default]}
+        
+        if event.target_type in ("specific_cards", "card_rarity"):
+            # card_rarity: ID карточек нужной редкости приходят из $lookup в поле target_card_ids
+            card_ids = (
+                event.target_data.get("card_ids", [])
+                if event.target_type == "specific_cards" else "$target_card_ids"
+            )
+            return {"$sum": {"$map": {
+                "input": {"$filter": {
+                    "input": {"$ifNull": ["$cards", []]},
+                    "as": "card",
+                    "cond": {"$and": [
+                        {"$in": ["$$card.card_id", card_ids]},
+                        {"$gt": ["$$card.quantity", 0]}
+                    ]}
+                }},
+                "as": "card",
+                "in": "$$card.quantity"
+            }}}
+        
+        return None
+    
+    async def backfill_event_progress(self, event: Event) -> int:
+        """
+        Расчет прогресса всех пользователей в только что созданном ивенте.
+        Прогресс считается агрегацией на стороне БД и записывается пачками upsert'ов,
+        завершение ивента засчитывается при следующем действии пользователя
+        (чтобы он получил уведомление). Возвращает количество участников с прогрессом
+        """
+        try:
+            expression = self._progress_expression(event)
+            if expression is None:
+                return 0
+            
+            pipeline = []
+            if event.target_type == "card_rarity":
+                # Некоррелированный $lookup: список карточек редкости вычисляется один раз.
+                # Как и в живом пересчете (каталог), учитываются только активные карточки
+                rarity = event.target_data.get("rarity", "common").lower()
+                pipeline.append({"$lookup": {
+                    "from": "cards",
+                    "pipeline": [
+                        {"$match": {
+                            "is_active": True,
+                            "$expr": {"$eq": [{"$toLower": "$rarity"}, rarity]}
+                        }},
+                        {"$project": {"_id": 0, "card_id": {"$toString": "$_id"}}}
+                    ],
+                    "as": "target_cards"
+                }})
+                pipeline.append({"$set": {"target_card_ids": "$target_cards.card_id"}})
+            
+            pipeline += [
+                {"$project": {"_id": 0, "user_id": "$telegram_id", "progress": expression}},
+                {"$match": {"progress": {"$gt": 0}}}
+            ]
+            
+            from services.user_service import user_service
+            users_collection = await user_service.get_collection()
+            collection = await self.get_progress_collection()
+            event_id = str(event.id)
+            now = datetime.utcnow()
+            
+            total = 0
+            operations = []
+            async for result in users_collection.aggregate(pipeline, batchSize=self.BACKFILL_BATCH_SIZE):
+                operations.append(UpdateOne(
+                    {"user_id": result["user_id"], "event_id": event_id},
+                    {
+                        "$set": {
+                            "current_progress": result["progress"],
+                            "target_progress": event.target_value,
+                            "last_updated": now
+                        },
+                        "$setOnInsert": {
+                            "is_completed": False,
+                            "completed_at": None,
+                            "rewards_claimed": False,
+                            "progress_data": {},
+                            "started_at": now
+                        }
+                    },
+                    upsert=True
+                ))
+                if len(operations) >= self.BACKFILL_BATCH_SIZE:
+                    await collection.bulk_write(operations, ordered=False)
+                    total += len(operations)
+                    operations = []
+            
+            if operations:
+                await collection.bulk_write(operations, ordered=False)
+                total += len(operations)
+            
+            self.invalidate_leaderboard(event_id)
+            logger.info(f"Backfilled progress of event {event_id} for {total} users")
+            return total
+            
+        except Exception as e:
+            logger.error(f"Error backfilling event progress {event.id}: {e}")
+            return 0
+    
     async def claim_event_rewards(self, user: User, event_id: str) -> bool:
         """Выдает награды за завершенный ивент"""
         try:
@@ -276,36 +481,67 @@ class EventService:
             logger.error(f"Error claiming event rewards: {e}")
             return False
     
+    def invalidate_leaderboard(self, event_id: Optional[str] = None) -> None:
+        """Сброс снапшота топа ивента (всех ивентов, если event_id не указан)"""
+        if event_id is None:
+            self._leaderboards.clear()
+        else:
+            self._leaderboards.pop(event_id, None)
+    
+    async def _build_leaderboard(self, event_id: str) -> List[Dict[str, Any]]:
+        """Топ ивента одним запросом: имена подтягиваются через $lookup только с нужными полями"""
+        collection = await self.get_progress_collection()
+        
+        pipeline = [
+            {"$match": {"event_id": event_id}},
+            {"$sort": {"current_progress": -1, "last_updated": 1}},
+            {"$limit": self.LEADERBOARD_SIZE},
+            {"$lookup": {
+                "from": "users",
+                "localField": "user_id",
+                "foreignField": "telegram_id",
+                "pipeline": [{"$project": {"_id": 0, "first_name": 1}}],
+                "as": "user"
+            }},
+            {"$unwind": "$user"},
+            {"$project": {
+                "_id": 0,
+                "user_id": 1,
+                "first_name": "$user.first_name",
+                "current_progress": 1,
+                "is_completed": 1,
+                "completed_at": 1
+            }}
+        ]
+        
+        leaderboard = []
+        async for result in collection.aggregate(pipeline):
+            leaderboard.append({
+                "position": len(leaderboard) + 1,
+                "user_name": result.get("first_name") or f"User{result['user_id']}",
+                "user_id": result["user_id"],
+                "progress": result["current_progress"],
+                "is_completed": result["is_completed"],
+                "completed_at": result.get("completed_at")
+            })
+        return leaderboard
+    
     async def get_event_leaderboard(self, event_id: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Получает топ игроков по ивенту"""
+        """Получает топ игроков по ивенту из снапшота, перестраивая его раз в LEADERBOARD_TTL"""
         try:
-            collection = await self.get_progress_collection()
-            
-            pipeline = [
-                {"$match": {"event_id": event_id}},
-                {"$sort": {"current_progress": -1, "last_updated": 1}},
-                {"$limit": limit}
-            ]
-            
-            results = await collection.aggregate(pipeline).to_list(length=None)
-            
-            # Добавляем информацию о пользователях
-            from services.user_service import user_service
-            leaderboard = []
-            
-            for i, result in enumerate(results, 1):
-                user = await user_service.get_user_by_telegram_id(result["user_id"])
-                if user:
-                    leaderboard.append({
-                        "position": i,
-                        "user_name": user.first_name or f"User{user.telegram_id}",
-                        "user_id": user.telegram_id,
-                        "progress": result["current_progress"],
-                        "is_completed": result["is_completed"],
-                        "completed_at": result.get("completed_at")
-                    })
-            
-            return leaderboard
+            snapshot = self._leaderboards.get(event_id)
+            if snapshot and time.monotonic() - snapshot[0] < self.LEADERBOARD_TTL:
+                return [dict(entry) for entry in snapshot[1][:limit]]
+            
+            # Одновременные просмотры ждут одного перестроения
+            lock = self._leaderboard_locks.setdefault(event_id, asyncio.Lock())
+            async with lock:
+                snapshot = self._leaderboards.get(event_id)
+                if not snapshot or time.monotonic() - snapshot[0] >= self.LEADERBOARD_TTL:
+                    snapshot = (time.monotonic(), await self._build_leaderboard(event_id))
+                    self._leaderboards[event_id] = snapshot
+            
+            return [dict(entry) for entry in snapshot[1][:limit]]
             
         except Exception as e:
             logger.error(f"Error getting event leaderboard: {e}")
@@ -7,9 +7,15 @@ from models.user import User
 from models.card import Card
 from services.user_service import user_service
 from services.card_service import card_service
+from services.unit_of_work import UnitOfWork, UnitOfWorkAborted
+from services.achievement_rules import EVENT_CARDS, EVENT_COINS, EVENT_EXPERIENCE, EVENT_DAILY
 from config import settings
 
 
+# Изменения пользователя при получении ежедневной карточки
+DAILY_CARD_EVENTS = [EVENT_CARDS, EVENT_COINS, EVENT_EXPERIENCE, EVENT_DAILY]
+
+
 class GameService:
     """Сервис игровой логики"""
     
@@ -29,65 +35,67 @@ class GameService:
             if not card:
                 return None, False, "❌ Карточки временно недоступны"
             
-            # Добавляем карточку пользователю
-            await user_service.add_card_to_user(user, str(card.id))
-            await user_service.update_daily_card_time(user)
-            
-            # Обновляем счетчики для достижений
-            user.update_daily_streak()
-            user.increment_cards_today()
-            user.record_card_received(card.rarity)
-            user.reset_monthly_counters()
-            
-            # Обновляем статистику карточки
-            await card_service.update_card_stats(card.name, 1, 
-                                               1 if user.get_card_count(str(card.id)) == 1 else 0)
-            
-            # Бонус для новичков
-            bonus_card = False
-            if settings.newbie_bonus and not user.first_card_received:
-                user.first_card_received = True
-                await user_service.update_user(user)
+            # Все изменения сохраняются одной операцией
+            async with UnitOfWork():
+                # Добавляем карточку пользователю
+                await user_service.add_card_to_user(user, str(card.id))
+                await user_service.update_daily_card_time(user)
                 
-                # Выдаем бонусную карточку
-                bonus_card_obj = await card_service.get_random_card()
-                if bonus_card_obj:
-                    await user_service.add_card_to_user(user, str(bonus_card_obj.id))
-                    await card_service.update_card_stats(bonus_card_obj.name, 1, 
-                                                       1 if user.get_card_count(str(bonus_card_obj.id)) == 1 else 0)
-                    bonus_card = True
-            
-            # Добавляем опыт
-            exp_gained = 10
-            if card.rarity == "rare":
-                exp_gained = 25
-            elif card.rarity == "epic":
-                exp_gained = 50
-            elif card.rarity == "legendary":
-                exp_gained = 100
-            elif card.rarity == "artifact":
-                exp_gained = 250
-            
-            level_up = await user_service.add_experience(user, exp_gained)
-            
-            # Добавляем монеты за карточку
-            coins_gained = 5
-            if card.rarity == "rare":
-                coins_gained = 10
-            elif card.rarity == "epic":
-                coins_gained = 20
-            elif card.rarity == "legendary":
-                coins_gained = 50
-            elif card.rarity == "artifact":
-                coins_gained = 100
-            
-            user.coins += coins_gained
-            await user_service.update_user(user)
+                # Обновляем счетчики для достижений
+                user.update_daily_streak()
+                user.increment_cards_today()
+                user.record_card_received(card.rarity)
+                user.reset_monthly_counters()
+                
+                # Обновляем статистику карточки
+                await card_service.update_card_stats(card.name, 1, 
+                                                   1 if user.get_card_count(str(card.id)) == 1 else 0)
+                
+                # Бонус для новичков
+                bonus_card = False
+                if settings.newbie_bonus and not user.first_card_received:
+                    user.first_card_received = True
+                    await user_service.update_user(user)
+                    
+                    # Выдаем бонусную карточку
+                    bonus_card_obj = await card_service.get_random_card()
+                    if bonus_card_obj:
+                        await user_service.add_card_to_user(user, str(bonus_card_obj.id))
+                        await card_service.update_card_stats(bonus_card_obj.name, 1, 
+                                                           1 if user.get_card_count(str(bonus_card_obj.id)) == 1 else 0)
+                        bonus_card = True
+                
+                # Добавляем опыт
+                exp_gained = 10
+                if card.rarity == "rare":
+                    exp_gained = 25
+                elif card.rarity == "epic":
+                    exp_gained = 50
+                elif card.rarity == "legendary":
+                    exp_gained = 100
+                elif card.rarity == "artifact":
+                    exp_gained = 250
+                
+                level_up = await user_service.add_experience(user, exp_gained)
+                
+                # Добавляем монеты за карточку
+                coins_gained = 5
+                if card.rarity == "rare":
+                    coins_gained = 10
+                elif card.rarity == "epic":
+                    coins_gained = 20
+                elif card.rarity == "legendary":
+                    coins_gained = 50
+                elif card.rarity == "artifact":
+                    coins_gained = 100
+                
+                user.coins += coins_gained
+                await user_service.update_user(user)
             
             # Проверяем достижения после получения карточки
             try:
                 from handlers.achievement_handlers import check_and_notify_achievements
-                await check_and_notify_achievements(user, None)  # bot будет передан позже
+                await check_and_notify_achievements(user, None, DAILY_CARD_EVENTS)  # bot будет передан позже
             except Exception as achievement_error:
                 logger.error(f"Error checking achievements after daily card: {achievement_error}")
             
@@ -159,29 +167,36 @@ class GameService:
             if not target_rarity:
                 return False, f"❌ Карточки редкости '{card.rarity}' нельзя улучшить"
             
-            # Удаляем исходные карточки
-            success = await user_service.remove_card_from_user(user, str(card.id), settings.cards_for_upgrade)
-            if not success:
-                return False, "❌ Ошибка при удалении карточек"
-            
-            # Обновляем статистику исходной карточки
-            await card_service.update_card_stats(card.name, -settings.cards_for_upgrade)
-            
-            # Получаем случайную карточку новой редкости
+            # Получаем случайную карточку новой редкости до любых изменений
             new_card = await card_service.get_random_card_by_rarity(target_rarity)
             if not new_card:
-                # Возвращаем карточки обратно в случае ошибки
-                await user_service.add_card_to_user(user, str(card.id), settings.cards_for_upgrade)
                 return False, f"❌ Нет доступных карточек редкости '{target_rarity}'"
             
-            # Добавляем новую карточку
-            await user_service.add_card_to_user(user, str(new_card.id))
-            await card_service.update_card_stats(new_card.name, 1, 
-                                               1 if user.get_card_count(str(new_card.id)) == 1 else 0)
+            # Все изменения сохраняются одной операцией
+            async with UnitOfWork():
+                # Удаляем исходные карточки
+                success = await user_service.remove_card_from_user(user, str(card.id), settings.cards_for_upgrade)
+                if not success:
+                    raise UnitOfWorkAborted("❌ Ошибка при удалении карточек")
+                
+                # Обновляем статистику исходной карточки
+                await card_service.update_card_stats(card.name, -settings.cards_for_upgrade)
+                
+                # Добавляем новую карточку
+                await user_service.add_card_to_user(user, str(new_card.id))
+                await card_service.update_card_stats(new_card.name, 1, 
+                                                   1 if user.get_card_count(str(new_card.id)) == 1 else 0)
+                
+                # Добавляем бонусный опыт
+                bonus_exp = 50 + (len(settings.rarities) - list(settings.rarities.keys()).index(target_rarity)) * 25
+                level_up = await user_service.add_experience(user, bonus_exp)
             
-            # Добавляем бонусный опыт
-            bonus_exp = 50 + (len(settings.rarities) - list(settings.rarities.keys()).index(target_rarity)) * 25
-            level_up = await user_service.add_experience(user, bonus_exp)
+            # Проверяем достижения, зависящие от карточек и опыта
+            try:
+                from handlers.achievement_handlers import check_and_notify_achievements
+                await check_and_notify_achievements(user, None, [EVENT_CARDS, EVENT_EXPERIENCE])
+            except Exception as achievement_error:
+                logger.error(f"Error checking achievements after upgrade: {achievement_error}")
             
             username = user.username if user.username else "Anonymous"
             old_rarity = settings.rarities.get(card.rarity, {}).get("name", card.rarity.title())
@@ -202,6 +217,8 @@ class GameService:
             
             return True, message
             
+        except UnitOfWorkAborted as e:
+            return False, str(e)
         except Exception as e:
             logger.error(f"Error upgrading cards for user {user.telegram_id}: {e}")
             return False, "❌ Произошла ошибка при улучшении карточек"
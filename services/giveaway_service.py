@@ -0,0 +1,201 @@
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Callable, Awaitable
+from pymongo import UpdateOne
+from loguru import logger
+
+from models.user import User, UserCard
+from services.user_service import user_service
+from services.card_service import card_service
+from services.card_sampler import Distribution
+
+
+# Колбэк прогресса: (обработано пользователей, всего пользователей)
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+
+class GiveawayService:
+    """
+    Массовые раздачи на стороне БД.
+    Монеты и опыт начисляются одним update_many с пересчетом уровня в pipeline,
+    карточки выбираются локально сэмплером и записываются пачками через bulk_write.
+    """
+    
+    BATCH_SIZE = 1000
+    PROGRESS_INTERVAL = 2.0  # Не чаще одного обновления прогресса в N секунд
+    
+    @staticmethod
+    def _level_expression() -> Dict[str, Any]:
+        """Уровень по формуле User.calculate_level: 1 + int(sqrt(опыт / 50))"""
+        return {
+            "$cond": [
+                {"$lte": ["$experience", 0]},
+                1,
+                {"$max": [1, {"$add": [1, {"$floor": {"$sqrt": {"$divide": ["$experience", 50]}}}]}]}
+            ]
+        }
+    
+    @staticmethod
+    def _merge_new_cards_expression(new_cards: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Выражение конвейерного обновления: добавляет карточки, которых у пользователя
+        еще нет, а если карточку успел добавить параллельный add_card - увеличивает
+        ее количество. Проверка и запись идут одной атомарной операцией, поэтому
+        двух записей с одним card_id не появляется
+        """
+        return {"$reduce": {
+            "input": {"$literal": new_cards},
+            "initialValue": {"$ifNull": ["$cards", []]},
+            "in": {"$cond": [
+                {"$in": ["$$this.card_id", "$$value.card_id"]},
+                {"$map": {
+                    "input": "$$value",
+                    "as": "card",
+                    "in": {"$cond": [
+                        {"$eq": ["$$card.card_id", "$$this.card_id"]},
+                        {"$mergeObjects": ["$$card", {"quantity": {"$add": ["$$card.quantity", "$$this.quantity"]}}]},
+                        "$$card"
+                    ]}
+                }},
+                {"$concatArrays": ["$$value", ["$$this"]]}
+            ]}
+        }}
+    
+    async def grant_currency(self, coins: int = 0, experience: int = 0,
+                             filter: Dict[str, Any] = None) -> int:
+        """
+        Начисление монет и опыта всем пользователям по фильтру одним запросом.
+        Возвращает количество обновленных пользователей
+        """
+        if not coins and not experience:
+            return 0
+        
+        try:
+            collection = await user_service.get_collection()
+            defaults = User.model_fields
+            pipeline = [
+                {"$set": {
+                    "coins": {"$add": [{"$ifNull": ["$coins", defaults["coins"].default]}, coins]},
+                    "experience": {"$add": [{"$ifNull": ["$experience", defaults["experience"].default]}, experience]},
+                    "updated_at": "$$NOW"
+                }},
+                {"$set": {"level": self._level_expression()}}
+            ]
+            result = await collection.update_many(filter or {}, pipeline)
+            
+            logger.info(f"Giveaway granted {coins} coins and {experience} exp to {result.modified_count} users")
+            return result.modified_count
+        
+        except Exception as e:
+            logger.error(f"Error granting {coins} coins and {experience} exp: {e}")
+            return 0
+    
+    @staticmethod
+    def _build_card_operations(user_data: Dict[str, Any], card_ids: List[str],
+                               now: datetime) -> List[UpdateOne]:
+        """
+        Операции выдачи карточек одному пользователю.
+        $inc по существующим карточкам и добавление новых не могут быть в одном
+        обновлении (конфликт путей cards), поэтому это две операции
+        """
+        owned = {user_card.get("card_id") for user_card in user_data.get("cards", [])}
+        counts = Counter(card_ids)
+        
+        inc = {"total_cards": len(card_ids)}
+        array_filters = []
+        new_cards = []
+        for card_id, quantity in counts.items():
+            if card_id in owned:
+                name = f"c{len(array_filters)}"
+                inc[f"cards.$[{name}].quantity"] = quantity
+                array_filters.append({f"{name}.card_id": card_id})
+            else:
+                new_cards.append(UserCard(card_id=card_id, quantity=quantity, obtained_at=now).model_dump())
+        
+        user_filter = {"_id": user_data["_id"]}
+        operations = [UpdateOne(
+            user_filter,
+            {"$inc": inc, "$set": {"updated_at": now}},
+            array_filters=array_filters or None
+        )]
+        if new_cards:
+            cards_expression = GiveawayService._merge_new_cards_expression(new_cards)
+            operations.append(UpdateOne(user_filter, [{"$set": {"cards": cards_expression}}]))
+        return operations
+    
+    async def grant_cards(self, cards_per_user: int = 1, distribution: Distribution = "global",
+                          filter: Dict[str, Any] = None,
+                          progress: Optional[ProgressCallback] = None) -> Dict[str, int]:
+        """
+        Выдача cards_per_user случайных карточек каждому пользователю по фильтру.
+        Возвращает {"users": получили, "cards": выдано карточек}
+        """
+        result = {"users": 0, "cards": 0}
+        
+        try:
+            if not card_service.catalog.loaded:
+                await card_service.load_catalog()
+            
+            collection = await user_service.get_collection()
+            total = await user_service.count_users(filter)
+            processed = 0
+            last_progress = time.monotonic()
+            
+            async for batch in user_service.iter_users(
+                filter, {"_id": 1, "cards.card_id": 1}, batch_size=self.BATCH_SIZE
+            ):
+                now = datetime.utcnow()
+                operations = []
+                # Статистика карточек пачки: имя -> [изменение total_owned, изменение unique_owners]
+                batch_stats: Dict[str, List[int]] = {}
+                
+                for user_data in batch:
+                    cards = card_service.sampler.draw(cards_per_user, distribution)
+                    if not cards:
+                        continue
+                    
+                    operations += self._build_card_operations(user_data, [str(card.id) for card in cards], now)
+                    
+                    owned = {user_card.get("card_id") for user_card in user_data.get("cards", [])}
+                    counted = set()
+                    for card in cards:
+                        stats = batch_stats.setdefault(card.name, [0, 0])
+                        stats[0] += 1
+                        if str(card.id) not in owned and card.name not in counted:
+                            stats[1] += 1
+                            counted.add(card.name)
+                    
+                    result["users"] += 1
+                    result["cards"] += len(cards)
+                
+                if operations:
+                    await collection.bulk_write(operations, ordered=False)
+                    # Статистику учитываем только для записанных пачек
+                    for card_name, (total_change, owner_change) in batch_stats.items():
+                        card_service.record_card_stats(card_name, total_change, owner_change)
+                
+                processed += len(batch)
+                if progress and time.monotonic() - last_progress >= self.PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    await progress(processed, total)
+            
+            if progress:
+                await progress(processed, total)
+            
+            logger.info(
+                f"Giveaway granted {result['cards']} cards ({distribution}) to {result['users']} users"
+            )
+            return result
+        
+        except Exception as e:
+            logger.error(f"Error granting cards ({distribution}): {e}")
+            return result
+        
+        finally:
+            if not card_service.stats.is_running:
+                await card_service.stats.flush()
+
+
+# Глобальный экземпляр сервиса
+giveaway_service = GiveawayService()
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any
+from pymongo import ReturnDocument
+from motor.motor_asyncio import AsyncIOMotorCollection
+from loguru import logger
+
+
+# Идентификатор процесса-владельца заданий (уникален для каждого запуска)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+LEASE_DURATION = 60.0  # Секунд, на которые процесс занимает задание
+HEARTBEAT_INTERVAL = LEASE_DURATION / 3
+
+
+def lease_fields() -> Dict[str, Any]:
+    """Поля нового задания, сразу занятого этим процессом"""
+    return {"owner": WORKER_ID, "lease_until": datetime.utcnow() + timedelta(seconds=LEASE_DURATION)}
+
+
+async def claim_expired(collection: AsyncIOMotorCollection) -> Optional[Dict[str, Any]]:
+    """
+    Атомарно занимает одно задание со статусом running, аренда которого истекла
+    (владелец остановился или упал). None - свободных заданий нет
+    """
+    now = datetime.utcnow()
+    return await collection.find_one_and_update(
+        {
+            "status": "running",
+            "$or": [{"lease_until": {"$lt": now}}, {"lease_until": {"$exists": False}}]
+        },
+        {"$set": {"owner": WORKER_ID, "lease_until": now + timedelta(seconds=LEASE_DURATION)}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+class JobLease:
+    """
+    Аренда задания одним процессом бота.
+    Пока задание выполняется, heartbeat продлевает lease_until; если продлить
+    не удалось (аренду забрал другой процесс), lost становится True и
+    выполнение должно остановиться до следующего шага
+    """
+    
+    def __init__(self, collection: AsyncIOMotorCollection, job_id: Any):
+        self.collection = collection
+        self.job_id = job_id
+        self.lost = False
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def filter(self) -> Dict[str, Any]:
+        """Фильтр обновлений задания: только пока оно принадлежит этому процессу"""
+        return {"_id": self.job_id, "owner": WORKER_ID}
+    
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._heartbeat())
+    
+    async def stop(self, release: bool = False) -> None:
+        """Остановка продления; release=True - сразу отдать задание другим процессам"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        
+        if release and not self.lost:
+            try:
+                await self.collection.update_one(self.filter, {"$set": {"lease_until": datetime.utcnow()}})
+            except Exception as e:
+                logger.error(f"Error releasing job {self.job_id}: {e}")
+    
+    async def renew(self) -> bool:
+        result = await self.collection.update_one(
+            self.filter,
+            {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=LEASE_DURATION)}}
+        )
+        if result.matched_count == 0:
+            self.lost = True
+            logger.warning(f"Lost lease on job {self.job_id}")
+        return not self.lost
+    
+    async def _heartbeat(self) -> None:
+        while not self.lost:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                await self.renew()
+            except Exception as e:
+                logger.error(f"Error renewing lease on job {self.job_id}: {e}")
@@ -0,0 +1,149 @@
+import asyncio
+import time
+from typing import Optional, List, Dict, Any, Tuple
+from loguru import logger
+
+from services.user_service import user_service
+
+
+# Рейтинги: название -> поле сортировки пользователя
+BOARDS: Dict[str, str] = {
+    "experience": "experience",
+    "coins": "coins",
+    "total_cards": "total_cards",
+    "battles": "battle_progress.total_battles",
+}
+
+# Поля, которые нужны для отображения строки рейтинга
+ENTRY_PROJECTION = {
+    "_id": 0,
+    "telegram_id": 1,
+    "first_name": 1,
+    "username": 1,
+    "level": 1,
+    "experience": 1,
+    "coins": 1,
+    "total_cards": 1,
+    "battle_progress.total_battles": 1,
+}
+
+
+class LeaderboardEntry:
+    """Строка рейтинга из проекции документа пользователя (без валидации модели User)"""
+    
+    __slots__ = ("telegram_id", "first_name", "username", "level", "experience",
+                 "coins", "total_cards", "total_battles")
+    
+    def __init__(self, data: Dict[str, Any]):
+        self.telegram_id: int = data["telegram_id"]
+        self.first_name: Optional[str] = data.get("first_name")
+        self.username: Optional[str] = data.get("username")
+        self.level: int = data.get("level", 1)
+        self.experience: int = data.get("experience", 0)
+        self.coins: int = data.get("coins", 0)
+        self.total_cards: int = data.get("total_cards", 0)
+        self.total_battles: int = (data.get("battle_progress") or {}).get("total_battles", 0)
+    
+    @property
+    def display_name(self) -> str:
+        return self.first_name or self.username or f"User{self.telegram_id}"
+
+
+def _field_value(data: Dict[str, Any], field: str) -> Any:
+    """Значение поля с точкой из документа"""
+    for part in field.split("."):
+        data = (data or {}).get(part)
+    return data if data is not None else 0
+
+
+class LeaderboardService:
+    """
+    Рейтинги игроков из снапшотов в памяти.
+    Топ каждого рейтинга читается узкой проекцией по индексу (поле, telegram_id)
+    и перестраивается не чаще раза в REFRESH_INTERVAL, поэтому просмотр рейтинга
+    не зависит от числа пользователей. Место игрока вне снапшота считается
+    двумя count_documents по тому же индексу.
+    """
+    
+    SNAPSHOT_SIZE = 100
+    REFRESH_INTERVAL = 60.0
+    
+    def __init__(self):
+        # Снапшоты: рейтинг -> (время построения, строки, позиции по telegram_id)
+        self._snapshots: Dict[str, Tuple[float, List[LeaderboardEntry], Dict[int, int]]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+    
+    def invalidate(self, board: Optional[str] = None) -> None:
+        """Сброс снапшота рейтинга (всех рейтингов, если board не указан)"""
+        if board is None:
+            self._snapshots.clear()
+        else:
+            self._snapshots.pop(board, None)
+    
+    async def _build(self, board: str) -> Tuple[float, List[LeaderboardEntry], Dict[int, int]]:
+        collection = await user_service.get_collection()
+        cursor = collection.find({}, ENTRY_PROJECTION).sort(
+            [(BOARDS[board], -1), ("telegram_id", 1)]
+        ).limit(self.SNAPSHOT_SIZE)
+        
+        entries = [LeaderboardEntry(user_data) async for user_data in cursor]
+        positions = {entry.telegram_id: position for position, entry in enumerate(entries, 1)}
+        return time.monotonic(), entries, positions
+    
+    async def _get_snapshot(self, board: str) -> Tuple[float, List[LeaderboardEntry], Dict[int, int]]:
+        snapshot = self._snapshots.get(board)
+        if snapshot and time.monotonic() - snapshot[0] < self.REFRESH_INTERVAL:
+            return snapshot
+        
+        # Одновременные просмотры ждут одного перестроения
+        lock = self._locks.setdefault(board, asyncio.Lock())
+        async with lock:
+            snapshot = self._snapshots.get(board)
+            if not snapshot or time.monotonic() - snapshot[0] >= self.REFRESH_INTERVAL:
+                snapshot = await self._build(board)
+                self._snapshots[board] = snapshot
+        return snapshot
+    
+    async def get_top(self, board: str, limit: int = 10) -> List[LeaderboardEntry]:
+        """Топ рейтинга"""
+        if board not in BOARDS:
+            board = "experience"
+        
+        try:
+            _, entries, _ = await self._get_snapshot(board)
+            return entries[:limit]
+        
+        except Exception as e:
+            logger.error(f"Error getting {board} leaderboard: {e}")
+            return []
+    
+    async def get_user_rank(self, board: str, telegram_id: int) -> Optional[Tuple[int, LeaderboardEntry]]:
+        """Место игрока в рейтинге и его строка; None, если игрок не найден"""
+        if board not in BOARDS:
+            board = "experience"
+        
+        try:
+            _, entries, positions = await self._get_snapshot(board)
+            position = positions.get(telegram_id)
+            if position is not None:
+                return position, entries[position - 1]
+            
+            field = BOARDS[board]
+            collection = await user_service.get_collection()
+            user_data = await collection.find_one({"telegram_id": telegram_id}, ENTRY_PROJECTION)
+            if not user_data:
+                return None
+            
+            # Порядок как в снапшоте: по полю убыванию, при равенстве - по telegram_id
+            value = _field_value(user_data, field)
+            above = await collection.count_documents({field: {"$gt": value}})
+            tied = await collection.count_documents({field: value, "telegram_id": {"$lt": telegram_id}})
+            return above + tied + 1, LeaderboardEntry(user_data)
+        
+        except Exception as e:
+            logger.error(f"Error getting {board} rank for user {telegram_id}: {e}")
+            return None
+
+
+# Глобальный экземпляр сервиса
+leaderboard_service = LeaderboardService()
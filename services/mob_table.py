@@ -0,0 +1,123 @@
+import random
+from array import array
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+
+from models.card import Mob
+
+
+# Версия таблицы мобов. Любое изменение баланса (формул, сида, имен) -
+# новая версия: сохраненная в БД таблица текущей версии имеет приоритет над кодом
+MOB_TABLE_VERSION = 1
+MOB_TABLE_SEED = 50  # Сид разброса силы и наград
+MOB_LEVELS = 50
+
+MOB_NAMES = [
+    "Гоблин", "Орк", "Тролль", "Дракон", "Демон", "Вампир", "Оборотень", "Зомби",
+    "Скелет", "Призрак", "Элементаль", "Гигант", "Циклоп", "Минотавр", "Химера",
+    "Гарпия", "Кентавр", "Пегас", "Единорог", "Феникс", "Грифон", "Василиск",
+    "Кракен", "Левиафан", "Бегемот", "Кракен", "Медуза", "Сирена", "Русалка",
+    "Тритон", "Нереида", "Океанид", "Наяда", "Дриада", "Нимфа", "Фея", "Эльф",
+    "Дварф", "Халфлинг", "Гном", "Кобольд", "Гнолл", "Бугай", "Огр", "Эттин",
+    "Фомор", "Титан", "Бог", "Архидемон", "Древний", "Примитив"
+]
+
+
+def _difficulty(level: int) -> str:
+    if level <= 10:
+        return "easy"
+    if level <= 25:
+        return "normal"
+    if level <= 40:
+        return "hard"
+    return "boss"
+
+
+DIFFICULTY_MULTIPLIERS = {"easy": 0.7, "normal": 1.0, "hard": 1.6, "boss": 2.5}
+
+
+class MobTable:
+    """
+    Компактная таблица мобов: характеристики уровней хранятся в массивах,
+    объекты Mob создаются только при обращении и кэшируются.
+    """
+    
+    __slots__ = ("version", "seed", "names", "power", "health",
+                 "experience_reward", "coin_reward", "_mobs")
+    
+    def __init__(self, version: int, seed: int, names: List[str], power: List[int], health: List[int],
+                 experience_reward: List[int], coin_reward: List[int]):
+        self.version = version
+        self.seed = seed
+        self.names = names
+        self.power = array("l", power)
+        self.health = array("l", health)
+        self.experience_reward = array("l", experience_reward)
+        self.coin_reward = array("l", coin_reward)
+        self._mobs: Dict[int, Mob] = {}
+    
+    def __len__(self) -> int:
+        return len(self.power)
+    
+    @classmethod
+    def generate(cls, version: int = MOB_TABLE_VERSION, seed: int = MOB_TABLE_SEED) -> "MobTable":
+        """Детерминированная генерация: при одинаковом сиде таблица одинакова во всех процессах"""
+        rng = random.Random(seed)
+        names, power, health, experience_reward, coin_reward = [], [], [], [], []
+        
+        for level in range(1, MOB_LEVELS + 1):
+            # Сила растет экспоненциально, на уровнях 30-50 - быстрее
+            if level <= 30:
+                base_power = int(level * 80 + (level ** 1.5) * 10) + rng.randint(-30, 30)
+            else:
+                base_power = int(level * 120 + (level ** 2) * 15) + rng.randint(-50, 50)
+            
+            mob_power = int(base_power * DIFFICULTY_MULTIPLIERS[_difficulty(level)])
+            names.append(MOB_NAMES[level - 1])
+            power.append(mob_power)
+            health.append(mob_power * 2)
+            experience_reward.append(level * 2 + rng.randint(5, 15))
+            coin_reward.append(level + rng.randint(1, 5))
+        
+        return cls(version, seed, names, power, health, experience_reward, coin_reward)
+    
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "MobTable":
+        return cls(
+            document["_id"], document["seed"], document["names"], document["power"],
+            document["health"], document["experience_reward"], document["coin_reward"]
+        )
+    
+    def to_document(self) -> Dict[str, Any]:
+        return {
+            "_id": self.version,
+            "seed": self.seed,
+            "names": self.names,
+            "power": self.power.tolist(),
+            "health": self.health.tolist(),
+            "experience_reward": self.experience_reward.tolist(),
+            "coin_reward": self.coin_reward.tolist(),
+            "created_at": datetime.utcnow()
+        }
+    
+    def get(self, level: int) -> Optional[Mob]:
+        """Моб уровня level (1..len)"""
+        if not 1 <= level <= len(self):
+            return None
+        
+        mob = self._mobs.get(level)
+        if mob is None:
+            index = level - 1
+            name = self.names[index]
+            mob = Mob(
+                name=f"{name} Уровня {level}",
+                description=f"Могучий {name.lower()} {level} уровня",
+                level=level,
+                power=self.power[index],
+                health=self.health[index],
+                experience_reward=self.experience_reward[index],
+                coin_reward=self.coin_reward[index],
+                difficulty=_difficulty(level)
+            )
+            self._mobs[level] = mob
+        return mob
@@ -1,3 +1,4 @@
+import heapq
 from datetime import datetime
 from typing import Optional, List, Tuple
 from loguru import logger
@@ -237,18 +238,34 @@ class NFTService:
     async def get_nft_leaderboard(self) -> List[Tuple[User, int]]:
         """Получает рейтинг игроков по количеству NFT"""
         try:
-            all_users = await user_service.get_all_users()
-            nft_leaderboard = []
-            
-            for user in all_users:
-                nft_count = len([nft for nft in user.nfts if nft.is_active])
-                if nft_count > 0:
-                    nft_leaderboard.append((user, nft_count))
+            # Считаем NFT по частичным документам и держим в куче только топ-10
+            top = []
+            async for batch in user_service.iter_users(
+                {"nfts.is_active": True}, {"_id": 0, "telegram_id": 1, "nfts.is_active": 1}
+            ):
+                for user_data in batch:
+                    nft_count = sum(1 for nft in user_data.get("nfts", []) if nft.get("is_active"))
+                    if nft_count <= 0:
+                        continue
+                    entry = (nft_count, -user_data["telegram_id"])
+                    if len(top) < 10:
+                        heapq.heappush(top, entry)
+                    elif entry > top[0]:
+                        heapq.heapreplace(top, entry)
+            
+            # Полные модели загружаются только для лидеров
+            users = {user.telegram_id: user for user in await user_service.get_users_by_ids(
+                [-telegram_id for _, telegram_id in top]
+            )}
             
             # Сортируем по количеству NFT (убывание)
-            nft_leaderboard.sort(key=lambda x: x[1], reverse=True)
+            nft_leaderboard = []
+            for nft_count, telegram_id in sorted(top, reverse=True):
+                user = users.get(-telegram_id)
+                if user:
+                    nft_leaderboard.append((user, nft_count))
             
-            return nft_leaderboard[:10]  # Топ-10
+            return nft_leaderboard
             
         except Exception as e:
             logger.error(f"Error getting NFT leaderboard: {e}")
@@ -1,4 +1,3 @@
-from datetime import datetime, timedelta
 from typing import List, Optional
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
@@ -6,7 +5,7 @@ from loguru import logger
 
 from models.user import User
 from models.card import Card
-from services.user_service import user_service
+from services.broadcast_service import broadcast_service
 
 
 class NotificationService:
@@ -18,6 +17,7 @@ class NotificationService:
     def set_bot(self, bot: Bot):
         """Устанавливает экземпляр бота"""
         self.bot = bot
+        broadcast_service.set_bot(bot)
     
     async def notify_new_card(self, card: Card) -> int:
         """
@@ -29,10 +29,6 @@ class NotificationService:
             return 0
         
         try:
-            # Получаем всех пользователей с включенными уведомлениями
-            users = await user_service.get_all_users()
-            active_users = [user for user in users if user.notifications_enabled]
-            
             notification_text = (
                 f"🆕 **Новая карточка добавлена!**\n\n"
                 f"{card.get_rarity_emoji()} **{card.name}**\n\n"
@@ -50,31 +46,16 @@ class NotificationService:
                 [InlineKeyboardButton(text="📚 Все карточки", callback_data="my_cards")]
             ])
             
-            sent_count = 0
-            
-            for user in active_users:
-                try:
-                    await self.bot.send_message(
-                        chat_id=user.telegram_id,
-                        text=notification_text,
-                        reply_markup=keyboard
-                    )
-                    
-                    # Обновляем время последнего уведомления
-                    user.last_card_notification = datetime.utcnow()
-                    await user_service.update_user(user)
-                    
-                    sent_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"Failed to send notification to user {user.telegram_id}: {e}")
-                    # Если пользователь заблокировал бота, отключаем уведомления
-                    if "bot was blocked" in str(e).lower():
-                        user.notifications_enabled = False
-                        await user_service.update_user(user)
+            # Время последнего уведомления и отключение заблокировавших бота обновляются пакетно
+            job = await broadcast_service.broadcast(
+                "new_card",
+                notification_text,
+                reply_markup=keyboard,
+                mark_card_notification=True
+            )
             
-            logger.info(f"Sent new card notification to {sent_count} users")
-            return sent_count
+            logger.info(f"Sent new card notification to {job['sent']} users")
+            return job["sent"]
             
         except Exception as e:
             logger.error(f"Error sending new card notifications: {e}")
@@ -150,31 +131,14 @@ class NotificationService:
             return 0
         
         try:
-            if admin_only:
-                from config import settings
-                users = await user_service.get_users_by_ids(settings.admin_ids)
-            else:
-                users = await user_service.get_all_users()
-                users = [user for user in users if user.notifications_enabled]
-            
-            sent_count = 0
-            
-            for user in users:
-                try:
-                    await self.bot.send_message(
-                        chat_id=user.telegram_id,
-                        text=message
-                    )
-                    sent_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"Failed to broadcast to user {user.telegram_id}: {e}")
-                    if "bot was blocked" in str(e).lower():
-                        user.notifications_enabled = False
-                        await user_service.update_user(user)
+            job = await broadcast_service.broadcast(
+                "message",
+                message,
+                audience="admins" if admin_only else "subscribed"
+            )
             
-            logger.info(f"Broadcast sent to {sent_count} users")
-            return sent_count
+            logger.info(f"Broadcast sent to {job['sent']} users")
+            return job["sent"]
             
         except Exception as e:
             logger.error(f"Error in broadcast: {e}")
@@ -0,0 +1,99 @@
+from contextvars import ContextVar
+from typing import Optional, List, Dict
+from loguru import logger
+
+from models.user import User
+
+
+_current: ContextVar[Optional["UnitOfWork"]] = ContextVar("unit_of_work", default=None)
+
+
+class UnitOfWorkAborted(Exception):
+    """Отмена единицы работы: накопленные изменения не сохраняются, текст - сообщение для игрока"""
+
+
+class UnitOfWork:
+    """
+    Сбор всех изменений пользователей и статистики карточек одного игрового действия.
+    Пока контекст активен, update_user и update_card_stats ничего не пишут в БД -
+    при выходе пользователи сохраняются одним bulk_write, а статистика карточек
+    передается в накопитель CardService.
+        
+        async with UnitOfWork():
+            await user_service.add_card_to_user(user, card_id)
+            await card_service.update_card_stats(card.name, 1, 1)
+            await user_service.add_experience(user, 10)
+    
+    Выход из контекста без исключения (в том числе return) сохраняет все накопленное,
+    любое исключение - отбрасывает; для отмены действия поднимайте UnitOfWorkAborted.
+    Запись пользователей - один упорядоченный bulk_write без транзакции, статистика
+    карточек пишется накопителем отдельно
+    """
+    
+    def __init__(self):
+        self.users: List[User] = []
+        self.card_stats: Dict[str, List[int]] = {}
+        self._token = None
+        self._outer: Optional["UnitOfWork"] = None
+    
+    @staticmethod
+    def current() -> Optional["UnitOfWork"]:
+        """Активная единица работы в текущем контексте"""
+        return _current.get()
+    
+    def track_user(self, user: User) -> None:
+        """Регистрация пользователя, изменения которого нужно сохранить"""
+        if not any(tracked is user for tracked in self.users):
+            self.users.append(user)
+    
+    def add_card_stats(self, card_name: str, user_count_change: int = 0,
+                       owner_count_change: int = 0) -> None:
+        """Накопление изменений статистики карточки"""
+        stats = self.card_stats.setdefault(card_name, [0, 0])
+        stats[0] += user_count_change
+        stats[1] += owner_count_change
+    
+    async def __aenter__(self) -> "UnitOfWork":
+        # Вложенный контекст присоединяется к внешнему
+        self._outer = _current.get()
+        if self._outer is None:
+            self._token = _current.set(self)
+        return self._outer or self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        if self._outer is not None:
+            return False
+        
+        _current.reset(self._token)
+        self._token = None
+        if exc_type is None:
+            await self.commit()
+        else:
+            logger.warning(f"Unit of work discarded after error: {exc}")
+        return False
+    
+    async def commit(self) -> None:
+        """Сохранение накопленных изменений"""
+        from services.card_service import card_service
+        from services.user_service import user_service
+        
+        user_operations = []
+        for user in self.users:
+            user_operations += user.get_update_operations()
+        
+        if user_operations:
+            users_collection = await user_service.get_collection()
+            await users_collection.bulk_write(user_operations, ordered=True)
+        
+        for user in self.users:
+            user.mark_clean()
+        for card_name, (user_count_change, owner_count_change) in self.card_stats.items():
+            card_service.record_card_stats(card_name, user_count_change, owner_count_change)
+        if self.card_stats and not card_service.stats.is_running:
+            await card_service.stats.flush()
+        
+        logger.debug(
+            f"Unit of work committed: {len(user_operations)} user ops, {len(self.card_stats)} card stats"
+        )
+        self.users = []
+        self.card_stats = {}
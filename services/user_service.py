@@ -1,10 +1,11 @@
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 from motor.motor_asyncio import AsyncIOMotorCollection
 from loguru import logger
 
 from database.connection import db
 from models.user import User, UserCard
+from services.unit_of_work import UnitOfWork
 from config import settings
 
 
@@ -45,8 +46,9 @@ class UserService:
             )
             
             collection = await self.get_collection()
-            result = await collection.insert_one(user.dict(by_alias=True, exclude={"id"}))
+            result = await collection.insert_one(user.to_document())
             user.id = result.inserted_id
+            user.mark_clean()
             
             logger.info(f"Created new user: {telegram_id} ({username})")
             return user
@@ -56,26 +58,23 @@ class UserService:
             raise
     
     async def update_user(self, user: User) -> bool:
-        """Обновление пользователя"""
+        """Обновление пользователя - сохраняются только изменившиеся поля"""
+        unit_of_work = UnitOfWork.current()
+        if unit_of_work:
+            # Сохранится одной операцией при завершении действия
+            unit_of_work.track_user(user)
+            return True
+        
         try:
-            user.updated_at = datetime.utcnow()
-            collection = await self.get_collection()
+            operations = user.get_update_operations()
+            if not operations:
+                return False
             
-            # Логируем данные перед сохранением - используем model_dump для Pydantic v2
-            try:
-                user_dict = user.model_dump(by_alias=True, exclude={"id"})
-            except AttributeError:
-                # Fallback для Pydantic v1
-                user_dict = user.dict(by_alias=True, exclude={"id"})
-                
-            logger.info(f"Saving user {user.telegram_id} with cards: {user_dict.get('cards', [])}")
-            
-            result = await collection.update_one(
-                {"telegram_id": user.telegram_id},
-                {"$set": user_dict}
-            )
+            collection = await self.get_collection()
+            result = await collection.bulk_write(operations, ordered=True)
+            user.mark_clean()
             
-            logger.info(f"Update result - modified_count: {result.modified_count}")
+            logger.debug(f"Saved user {user.telegram_id}: {len(operations)} ops, modified_count: {result.modified_count}")
             return result.modified_count > 0
             
         except Exception as e:
@@ -140,45 +139,6 @@ class UserService:
         await self.update_user(user)
         return level_up
     
-    async def get_leaderboard(self, limit: int = 10, sort_by: str = "experience") -> List[User]:
-        """Получение таблицы лидеров"""
-        try:
-            collection = await self.get_collection()
-            
-            sort_field = sort_by
-            if sort_by not in ["experience", "level", "total_cards", "coins"]:
-                sort_field = "experience"
-            
-            cursor = collection.find({}).sort(sort_field, -1).limit(limit)
-            users = []
-            
-            async for user_data in cursor:
-                users.append(User(**user_data))
-            
-            return users
-            
-        except Exception as e:
-            logger.error(f"Error getting leaderboard: {e}")
-            return []
-    
-    async def get_battle_leaderboard(self, limit: int = 10) -> List[User]:
-        """Получение таблицы лидеров по боям"""
-        try:
-            collection = await self.get_collection()
-            
-            # Сортируем по количеству боев
-            cursor = collection.find({}).sort("battle_progress.total_battles", -1).limit(limit)
-            users = []
-            
-            async for user_data in cursor:
-                users.append(User(**user_data))
-            
-            return users
-            
-        except Exception as e:
-            logger.error(f"Error getting battle leaderboard: {e}")
-            return []
-    
     async def get_user_stats(self) -> Dict[str, Any]:
         """Получение статистики пользователей"""
         try:
@@ -222,6 +182,37 @@ class UserService:
             logger.error(f"Error getting all users: {e}")
             return []
     
+    async def count_users(self, filter: Dict[str, Any] = None) -> int:
+        """Количество пользователей по фильтру"""
+        try:
+            collection = await self.get_collection()
+            return await collection.count_documents(filter or {})
+            
+        except Exception as e:
+            logger.error(f"Error counting users: {e}")
+            return 0
+    
+    async def iter_users(self, filter: Dict[str, Any] = None, projection: Dict[str, Any] = None,
+                         batch_size: int = 500) -> AsyncIterator[List[Any]]:
+        """
+        Потоковый обход пользователей пачками по batch_size.
+        Без projection отдает модели User, с projection - сырые документы
+        (частичные документы нельзя превращать в User: при сохранении
+        недостающие поля перезаписались бы значениями по умолчанию)
+        """
+        collection = await self.get_collection()
+        cursor = collection.find(filter or {}, projection).sort("_id", 1).batch_size(batch_size)
+        
+        batch = []
+        async for user_data in cursor:
+            batch.append(user_data if projection else User(**user_data))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        
+        if batch:
+            yield batch
+    
     async def get_users_by_ids(self, telegram_ids: List[int]) -> List[User]:
         """Получение пользователей по списку Telegram ID"""
         try:
@@ -0,0 +1,83 @@
+import asyncio
+import signal
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import setup_application
+from loguru import logger
+
+from config import settings
+from middleware.update_scheduler import update_scheduler
+
+
+def create_app(dispatcher: Dispatcher, bot: Bot) -> web.Application:
+    """
+    aiohttp-приложение: прием апдейтов на webhook_path и проверка здоровья для балансировщика.
+    Апдейт передается планировщику и подтверждается сразу; если у планировщика
+    нет места, Telegram получает 503 и повторит доставку позже
+    """
+    
+    async def handle_update(request: web.Request) -> web.Response:
+        if settings.webhook_secret and \
+                request.headers.get("X-Telegram-Bot-Api-Secret-Token") != settings.webhook_secret:
+            return web.Response(status=401)
+        
+        update = Update.model_validate(await request.json(), context={"bot": bot})
+        if not await update_scheduler.submit(dispatcher, bot, update):
+            logger.warning(f"Update scheduler is full, rejecting update {update.update_id}")
+            return web.Response(status=503)
+        
+        return web.Response()
+    
+    async def handle_health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", **update_scheduler.get_stats()})
+    
+    async def on_startup(app: web.Application) -> None:
+        await bot.set_webhook(
+            url=settings.webhook_url.rstrip("/") + settings.webhook_path,
+            secret_token=settings.webhook_secret or None,
+            allowed_updates=dispatcher.resolve_used_update_types()
+        )
+        logger.info(f"Webhook set to {settings.webhook_url}{settings.webhook_path}")
+    
+    app = web.Application()
+    app.router.add_post(settings.webhook_path, handle_update)
+    app.router.add_get("/health", handle_health)
+    app.on_startup.append(on_startup)
+    
+    # Запуск и остановка диспетчера (on_startup / on_shutdown бота) вместе с приложением;
+    # on_shutdown бота дожидается обработки принятых апдейтов
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot) -> None:
+    """Запуск бота в режиме вебхука до SIGTERM / SIGINT"""
+    app = create_app(dispatcher, bot)
+    
+    # Как и start_polling, останавливаемся по сигналу штатно: без обработчика SIGTERM
+    # (docker stop) убивает процесс, и cleanup с on_shutdown бота не выполняются
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:  # Windows
+            pass
+    
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.webhook_host, settings.webhook_port)
+    await site.start()
+    logger.info(f"Webhook server listening on {settings.webhook_host}:{settings.webhook_port}")
+    
+    try:
+        await stop_event.wait()
+        logger.info("Stopping webhook server")
+    finally:
+        await runner.cleanup()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.remove_signal_handler(sig)
+            except NotImplementedError:
+                pass